@@ -5,8 +5,9 @@ import jwt
 from pydantic import BaseModel, field_validator
 from typing import Union, Optional
 from fastapi import Header
-from db_helper import db_helper
+from db_helper import db_helper, prepared_statements
 from fastapi import HTTPException
+from authorization.acl_cache import acl_cache
 
 class ACL(BaseModel):
     is_admin: bool
@@ -26,41 +27,64 @@ class User(BaseModel):
     token: str
     acl: ACL
 
-def get_user_acl(cur, token):
+def get_email(token):
     encoded_token = token.split(" ")[1]
     # Verification is performed by kong (reverse proxy), 
     # therefore token is not verified for a second time so that the secret is only stored there.
     result = jwt.decode(encoded_token, options={"verify_signature": False})
-    return query_acl(cur, result["email"]), result["email"]
+    return result["email"]
+
+async def get_cached_acl(email):
+    acl_json = await acl_cache.get(email)
+    if acl_json is None:
+        return None
+    return ACL.model_validate_json(acl_json)
+
+async def cache_acl(email, acl):
+    await acl_cache.set(email, acl.model_dump_json())
+
+async def invalidate_user_acl(email: Optional[str] = None):
+    """Call after the privileges of a user (or of all users when email is None) changed."""
+    await acl_cache.invalidate(email)
 
 async def get_current_user(authorization: Union[str, None] = Header(None)):
     if not authorization:
         raise HTTPException(401, "authorization header missing.")
-    with db_helper.get_resource() as (cur, _):
+    try:
+        email = get_email(authorization)
+        acl = await get_cached_acl(email)
+    except Exception as e:
+        logging.exception("Error while retrieving user ACL")
+        raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
+    if acl is not None:
+        return User(email=email, token=authorization, acl=acl)
+
+    async with db_helper.get_async_resource() as (cur, _):
         try:
-            result, email = get_user_acl(cur, authorization)
-            return User(
-                email=email,
-                token=authorization,
-                acl=result
-            )
+            acl = await query_acl(cur, email)
         except HTTPException as e:
             logging.warning(f"HTTPException while retrieving user ACL: {e.detail}")
             raise e
         except Exception as e:
             logging.exception("Error while retrieving user ACL")
             raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
+    await cache_acl(email, acl)
+    return User(
+        email=email,
+        token=authorization,
+        acl=acl
+    )
 
-def query_acl(cur, email):
-    stmt = """
+query_acl_stmt = prepared_statements.register("query_acl", """
     SELECT user_id, type_of_organisation, 
     privileges, data_owner_of_municipalities, data_owner_of_operators
     FROM user_account 
     JOIN organisation USING(organisation_id) 
     WHERE user_id = %s;
-    """
+    """)
 
-    cur.execute(stmt, (email,))
+async def query_acl(cur, email):
+    await query_acl_stmt.execute_async(cur, (email,))
     if cur.rowcount < 1:
         raise HTTPException(status_code=403, detail="User is not known in ACL")
     
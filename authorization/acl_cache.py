@@ -0,0 +1,130 @@
+from collections import OrderedDict
+import logging
+import os
+import threading
+import time
+
+from redis_helper import redis_helper
+
+
+class ACLCache:
+    """LRU cache with a TTL for the ACL of a user, keyed by the email in the token.
+
+    Optionally the ACLs are shared between workers through redis, a miss in the
+    local cache is then looked up in redis before it goes to the database.
+    """
+    redis_key_prefix = "policy_api:acl:"
+
+    def __init__(self, ttl=30.0, max_size=1000, use_redis=False, redis_ttl=60):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.use_redis = use_redis
+        self.redis_ttl = redis_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._redis_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    async def get(self, email):
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None:
+                expires_at, acl_json = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(email)
+                    self._hits += 1
+                    return acl_json
+                del self._entries[email]
+
+        acl_json = await self._get_from_redis(email)
+        with self._lock:
+            if acl_json is None:
+                self._misses += 1
+                return None
+            self._redis_hits += 1
+        self._set_local(email, acl_json)
+        return acl_json
+
+    async def set(self, email, acl_json):
+        if self.ttl <= 0:
+            return
+        self._set_local(email, acl_json)
+        if self.use_redis:
+            try:
+                async with redis_helper.get_async_resource() as r:
+                    await r.set(self.redis_key_prefix + email, acl_json, ex=self.redis_ttl)
+            except Exception:
+                logging.exception("Error while storing user ACL in redis")
+
+    async def invalidate(self, email=None):
+        """Drops the ACL of one user, or of all users when no email is given.
+
+        Call this after the privileges or organisation of a user changed. Other
+        workers keep their local copy until it expires after ttl seconds.
+        """
+        with self._lock:
+            if email is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(email, None)
+            self._invalidations += 1
+
+        if self.use_redis:
+            try:
+                async with redis_helper.get_async_resource() as r:
+                    if email is None:
+                        keys = [key async for key in r.scan_iter(match=self.redis_key_prefix + "*")]
+                        if keys:
+                            await r.delete(*keys)
+                    else:
+                        await r.delete(self.redis_key_prefix + email)
+            except Exception:
+                logging.exception("Error while invalidating user ACL in redis")
+
+    def _set_local(self, email, acl_json):
+        with self._lock:
+            self._entries[email] = (time.monotonic() + self.ttl, acl_json)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    async def _get_from_redis(self, email):
+        if not self.use_redis:
+            return None
+        try:
+            async with redis_helper.get_async_resource() as r:
+                return await r.get(self.redis_key_prefix + email)
+        except Exception:
+            # Redis is only a cache, fall back to the database.
+            logging.exception("Error while retrieving user ACL from redis")
+            return None
+
+    def get_metrics(self):
+        with self._lock:
+            lookups = self._hits + self._redis_hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "redis": self.use_redis,
+                "hits": self._hits,
+                "redis_hits": self._redis_hits,
+                "misses": self._misses,
+                "hit_ratio": (self._hits + self._redis_hits) / lookups if lookups else None,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+
+acl_cache = ACLCache(
+    ttl=float(os.getenv("ACL_CACHE_TTL", 30)),
+    max_size=int(os.getenv("ACL_CACHE_MAX_SIZE", 1000)),
+    use_redis=os.getenv("ACL_CACHE_REDIS", "false").lower() == "true",
+    redis_ttl=int(os.getenv("ACL_CACHE_REDIS_TTL", 60)),
+)
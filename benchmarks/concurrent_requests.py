@@ -0,0 +1,85 @@
+"""
+Fires concurrent requests at the read endpoints of a running policy api and reports the throughput.
+
+Run it once against a deployment of the previous release and once against the current one to compare, e.g.:
+
+    uv run python -m benchmarks.concurrent_requests --base-url http://localhost:8000 --municipality GM0518 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date, timedelta
+
+import httpx
+
+
+def get_endpoints(municipality: str, operator: str):
+    end_date = date.today()
+    start_date = end_date - timedelta(days=30)
+    return {
+        "/geographies": {"municipality": municipality},
+        "/policies": {"municipality": municipality},
+        "/public/zones": {"municipality": municipality},
+        "/admin/zones": {"municipality": municipality},
+        "/stops": {"municipality": municipality},
+        "/public/service_area": {"municipalities": municipality, "operators": operator},
+        "/kpi_overview_operators": {"municipality": municipality, "start_date": start_date.isoformat(), "end_date": end_date.isoformat()},
+    }
+
+
+async def run_endpoint(client: httpx.AsyncClient, path: str, params: dict, concurrency: int, number_of_requests: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def do_request():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path, params=params)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(do_request() for _ in range(number_of_requests)))
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "endpoint": path,
+        "requests": number_of_requests,
+        "errors": errors,
+        "throughput": number_of_requests / duration,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def main(args):
+    headers = {}
+    if args.token:
+        headers["authorization"] = f"Bearer {args.token}"
+    endpoints = get_endpoints(args.municipality, args.operator)
+    if args.endpoint:
+        endpoints = {path: params for path, params in endpoints.items() if path in args.endpoint}
+
+    async with httpx.AsyncClient(base_url=args.base_url, headers=headers, timeout=120) as client:
+        print(f"{'endpoint':<28} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for path, params in endpoints.items():
+            result = await run_endpoint(client, path, params, args.concurrency, args.requests)
+            print(f"{result['endpoint']:<28} {result['requests']:>8} {result['errors']:>6} "
+                  f"{result['throughput']:>8.1f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--municipality", default="GM0518")
+    parser.add_argument("--operator", default="check")
+    parser.add_argument("--token", help="JWT, required for /admin/zones and /kpi_overview_operators")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--endpoint", action="append", help="only benchmark this endpoint, can be repeated")
+    asyncio.run(main(parser.parse_args()))
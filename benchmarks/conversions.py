@@ -0,0 +1,182 @@
+"""
+Microbenchmarks of the pure python conversions of query rows to response models, on synthetic rows
+shaped like the rows the queries return. The conversions that build the response from trusted rows
+(see trusted_rows) are measured next to the validating conversions. Doesn't need a database:
+
+    uv run python -m benchmarks.conversions --rows 1000
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+from geojson_pydantic import FeatureCollection
+from pydantic_core import to_json
+
+from kpi.get_operator_modality_overview import convert_stats_to_kpi_values
+from mds.geography import convert_geography_row, convert_geography_row_trusted
+from mds.policy import convert_policy_row, convert_policy_row_trusted
+from service_areas.get_service_areas import convert_service_area_row_trusted
+from service_areas.service_area import ServiceArea
+from zones import zone
+
+
+def make_polygon(index: int):
+    x = 4.0 + (index % 1000) * 0.0002
+    y = 52.0 + (index // 1000) * 0.0002
+    return {
+        "type": "Polygon",
+        "coordinates": [[[x, y], [x + 0.0008, y], [x + 0.0008, y + 0.0005], [x, y + 0.0005], [x, y]]],
+    }
+
+
+def make_zone_rows(number_of_rows: int):
+    now = datetime.now(timezone.utc)
+    rows = []
+    for index in range(number_of_rows):
+        polygon = make_polygon(index)
+        is_stop = index % 3 == 0
+        rows.append({
+            "geography_id": uuid.uuid4(),
+            "internal_id": f"bench-{index}",
+            "name": f"Benchmark zone {index}",
+            "description": "Synthetic zone for benchmarks",
+            "geography_type": "stop" if is_stop else "no_parking",
+            "effective_date": now - timedelta(days=60),
+            "published_date": now - timedelta(days=61),
+            "propose_retirement": False,
+            "published_retire_date": None,
+            "retire_date": None,
+            "prev_geographies": [],
+            "zone_id": index,
+            "municipality": "GM9001",
+            "affected_modalities": ["bicycle", "moped", "cargo_bicycle"],
+            "area": {"type": "Feature", "geometry": polygon, "properties": {}},
+            "created_at": now,
+            "modified_at": now,
+            "created_by": "benchmark@example.com",
+            "last_modified_by": "benchmark@example.com",
+            "phase": "active",
+            "stop_id": uuid.uuid4() if is_stop else None,
+            "location": {"type": "Feature", "geometry": {"type": "Point", "coordinates": polygon["coordinates"][0][0]}, "properties": {}},
+            "status": {"control_automatic": True, "is_installed": True, "is_renting": True, "is_returning": True} if is_stop else None,
+            "capacity": {"combined": 20} if is_stop else None,
+            "is_virtual": False if is_stop else None,
+            # Columns of the geographies and policies queries.
+            "geojson": json.dumps(polygon),
+        })
+    return rows
+
+
+def make_stats_rows(number_of_rows: int):
+    rows = []
+    indicators = ["vehicle_cap", "number_of_wrongly_parked_vehicles", "usage_ratio", "minimal_number_of_available_vehicles"]
+    days = 365
+    start_date = date.today() - timedelta(days=days)
+    # Same ordering as the query: system_id, vehicle_type, geometry_ref, indicator, date.
+    for index in range(number_of_rows):
+        series, day = divmod(index, days)
+        rows.append({
+            "date": start_date + timedelta(days=day),
+            "geometry_ref": "cbs:GM9001",
+            "system_id": f"operator{series // (len(indicators) * 2)}",
+            "vehicle_type": ["bicycle:human", "moped:electric"][(series // len(indicators)) % 2],
+            "indicator": indicators[series % len(indicators)],
+            "value": index % 500,
+            "threshold": 400,
+            "complies": index % 500 <= 400,
+        })
+    return rows
+
+
+def make_service_area_rows(number_of_rows: int):
+    now = datetime.now(timezone.utc)
+    return [({
+        "service_area_version_id": index,
+        "municipality": "GM9001",
+        "operator": "check",
+        "valid_from": now,
+    }, {
+        "type": "FeatureCollection",
+        "features": [{"type": "Feature", "geometry": make_polygon(index), "properties": {"geom_hash": str(index)}}],
+    }) for index in range(number_of_rows)]
+
+
+def convert_service_area(service_area, feature_collection):
+    return ServiceArea(
+        service_area_version_id=service_area["service_area_version_id"],
+        municipality=service_area["municipality"],
+        operator=service_area["operator"],
+        valid_from=service_area["valid_from"],
+        geometries=FeatureCollection.model_validate(feature_collection),
+    )
+
+
+def get_benchmarks(number_of_rows: int):
+    zone_rows = make_zone_rows(number_of_rows)
+    stats_rows = make_stats_rows(number_of_rows)
+    service_area_rows = make_service_area_rows(number_of_rows)
+    # "(trusted)" benchmarks are compared with the benchmark of the same name, "response" includes the serialisation.
+    return {
+        "zone.convert_zones": lambda: zone.convert_zones(zone_rows, include_private_data=True),
+        "zone.convert_zones (trusted)": lambda: zone.convert_zone_rows_trusted(zone_rows, include_private_data=True),
+        "zones response": lambda: jsonable_encoder(zone.convert_zones(zone_rows, include_private_data=True)),
+        "zones response (trusted)": lambda: to_json(zone.convert_zone_rows_trusted(zone_rows, include_private_data=True)),
+        "mds.geography.convert_geography_row": lambda: [convert_geography_row(row) for row in zone_rows],
+        "mds.geography.convert_geography_row (trusted)": lambda: [convert_geography_row_trusted(row) for row in zone_rows],
+        "mds.policy.convert_policy_row": lambda: [convert_policy_row(row) for row in zone_rows],
+        "mds.policy.convert_policy_row (trusted)": lambda: [convert_policy_row_trusted(row) for row in zone_rows],
+        "service_areas response": lambda: jsonable_encoder([convert_service_area(*row) for row in service_area_rows]),
+        "service_areas response (trusted)": lambda: to_json([convert_service_area_row_trusted(*row) for row in service_area_rows]),
+        "kpi.convert_stats_to_kpi_values": lambda: convert_stats_to_kpi_values({}, stats_rows),
+    }
+
+
+def measure(function, repeat: int):
+    durations = []
+    # convert_zones prints every row, the formatting is measured but the output is discarded.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            durations.append(time.perf_counter() - start)
+    return durations
+
+
+def run(number_of_rows: int, repeat: int):
+    results = []
+    for name, function in get_benchmarks(number_of_rows).items():
+        durations = measure(function, repeat)
+        results.append({
+            "name": name,
+            "rows": number_of_rows,
+            "repeat": repeat,
+            "best_ms": min(durations) * 1000,
+            "median_ms": statistics.median(durations) * 1000,
+            "per_row_us": min(durations) / number_of_rows * 1_000_000,
+        })
+    return results
+
+
+def print_results(results):
+    by_name = {result["name"]: result for result in results}
+    print(f"{'conversion':<48} {'rows':>6} {'best ms':>9} {'median ms':>10} {'us/row':>8} {'speed-up':>9}")
+    for result in results:
+        speed_up = ""
+        validated = by_name.get(result["name"].removesuffix(" (trusted)"))
+        if result["name"].endswith(" (trusted)") and validated is not None:
+            speed_up = f"{validated['best_ms'] / result['best_ms']:.1f}x"
+        print(f"{result['name']:<48} {result['rows']:>6} {result['best_ms']:>9.1f} {result['median_ms']:>10.1f} {result['per_row_us']:>8.1f} {speed_up:>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    print_results(run(args.rows, args.repeat))
@@ -0,0 +1,60 @@
+"""
+Profiles the imports of the api with `python -X importtime` and reports the slowest packages, so that
+changes that slow down worker startup (and autoscaling cold starts) are easy to spot:
+
+    uv run python -m benchmarks.import_time --top 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from startup_report import lazy_packages
+
+
+def profile_imports(module: str):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env={**os.environ, "DB_NAME": os.getenv("DB_NAME", "benchmark")})
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative_time, name = line[len("import time:"):].split("|")
+        imports.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            "self_us": int(self_time),
+            "cumulative_us": int(cumulative_time),
+        })
+    return imports
+
+
+def get_package_totals(imports):
+    # The self time of every module summed per top-level package.
+    totals = {}
+    for imported in imports:
+        package = imported["module"].split(".")[0]
+        totals[package] = totals.get(package, 0) + imported["self_us"]
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def main(args):
+    imports = profile_imports(args.module)
+    total_us = sum(imported["self_us"] for imported in imports)
+    print(f"import {args.module}: {total_us / 1e6:.2f}s, {len(imports)} modules")
+    print(f"{'package':<32} {'self ms':>8}")
+    for package, self_us in get_package_totals(imports)[:args.top]:
+        print(f"{package:<32} {self_us / 1000:>8.1f}")
+
+    loaded_lazy_packages = {imported["module"] for imported in imports} & set(lazy_packages)
+    if loaded_lazy_packages:
+        print(f"Loaded at startup, but only needed by the export and import routes: {', '.join(sorted(loaded_lazy_packages))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    main(parser.parse_args())
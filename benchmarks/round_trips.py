@@ -0,0 +1,65 @@
+"""
+Counts the database round trips per request of the query modules, with and without read-only autocommit sessions.
+
+Needs the same DB_* (and REDIS_URL) environment variables as the api:
+
+    uv run python -m benchmarks.round_trips --municipality GM0518 --operator check
+"""
+import argparse
+import asyncio
+
+from db_helper import db_helper
+from mds import geographies, policies
+from operators import get_operators
+from service_areas import get_service_areas
+from zones import get_zones, zone
+from modalities import Modality
+
+all_phases = [phase for phase in zone.Phase]
+all_modalities = [Modality.bicycle, Modality.car, Modality.moped, Modality.cargo_bicycle]
+
+
+def get_requests(municipality: str, operator: str):
+    return {
+        "mds.geographies.get_geographies": lambda: geographies.get_geographies(municipality),
+        "mds.policies.get_policies": lambda: policies.get_policies(municipality),
+        "zones.get_zones.get_private_zones": lambda: get_zones.get_private_zones(municipality, [], all_phases, all_modalities),
+        "zones.get_zones.get_public_zones": lambda: get_zones.get_public_zones(municipality, [], all_phases, all_modalities),
+        "service_areas.get_service_areas": lambda: get_service_areas.get_service_areas([municipality], [operator]),
+        "operators.get_operators": lambda: get_operators.get_operators(),
+    }
+
+
+def count_round_trips():
+    return sum(metrics["round_trips"] for metrics in db_helper.get_pool_metrics().values() if isinstance(metrics, dict))
+
+
+async def measure(request, repeat: int):
+    before = count_round_trips()
+    for _ in range(repeat):
+        result = request()
+        if asyncio.iscoroutine(result):
+            await result
+    return (count_round_trips() - before) / repeat
+
+
+async def main(args):
+    requests = get_requests(args.municipality, args.operator)
+    results = {}
+    for readonly_sessions in (False, True):
+        db_helper.readonly_sessions = readonly_sessions
+        for name, request in requests.items():
+            results.setdefault(name, {})[readonly_sessions] = await measure(request, args.repeat)
+
+    print(f"{'request':<38} {'transaction':>12} {'read-only':>10}")
+    for name, counts in results.items():
+        print(f"{name:<38} {counts[False]:>12.1f} {counts[True]:>10.1f}")
+    db_helper.shutdown_connection_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--municipality", default="GM0518")
+    parser.add_argument("--operator", default="check")
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,113 @@
+-- Tables (and the columns) the api reads and writes, for a local benchmark database only.
+-- The real schema is managed outside this repository, keep this in line with the queries of the api.
+CREATE EXTENSION IF NOT EXISTS postgis;
+
+CREATE TABLE IF NOT EXISTS zones (
+    zone_id SERIAL PRIMARY KEY,
+    area geometry(Geometry, 4326) NOT NULL,
+    name TEXT,
+    municipality TEXT,
+    zone_type TEXT
+);
+CREATE INDEX IF NOT EXISTS zones_area_idx ON zones USING GIST (area);
+CREATE INDEX IF NOT EXISTS zones_municipality_idx ON zones (municipality, zone_type);
+
+CREATE TABLE IF NOT EXISTS geographies (
+    geography_id UUID PRIMARY KEY,
+    internal_id TEXT,
+    zone_id INTEGER REFERENCES zones (zone_id),
+    name TEXT,
+    description TEXT,
+    geography_type TEXT,
+    effective_date TIMESTAMPTZ,
+    published_date TIMESTAMPTZ,
+    retire_date TIMESTAMPTZ,
+    published_retire_date TIMESTAMPTZ,
+    propose_retirement BOOLEAN DEFAULT false,
+    prev_geographies UUID[],
+    created_at TIMESTAMPTZ,
+    modified_at TIMESTAMPTZ,
+    created_by TEXT,
+    last_modified_by TEXT,
+    affected_modalities TEXT[]
+);
+CREATE INDEX IF NOT EXISTS geographies_zone_id_idx ON geographies (zone_id);
+
+CREATE TABLE IF NOT EXISTS stops (
+    stop_id UUID PRIMARY KEY,
+    name TEXT,
+    location geometry(Point, 4326),
+    status JSONB,
+    capacity JSONB,
+    geography_id UUID REFERENCES geographies (geography_id),
+    is_virtual BOOLEAN
+);
+CREATE INDEX IF NOT EXISTS stops_geography_id_idx ON stops (geography_id);
+
+CREATE TABLE IF NOT EXISTS service_area_geometry (
+    geom_hash TEXT PRIMARY KEY,
+    geom geometry(Geometry, 4326)
+);
+
+CREATE TABLE IF NOT EXISTS service_area (
+    service_area_version_id SERIAL PRIMARY KEY,
+    municipality TEXT,
+    operator TEXT,
+    valid_from TIMESTAMPTZ,
+    valid_until TIMESTAMPTZ,
+    service_area_geometries TEXT[]
+);
+CREATE INDEX IF NOT EXISTS service_area_municipality_operator_idx ON service_area (municipality, operator);
+
+CREATE TABLE IF NOT EXISTS day_statistics (
+    date DATE,
+    geometry_ref TEXT,
+    system_id TEXT,
+    vehicle_type TEXT,
+    indicator INTEGER,
+    value NUMERIC
+);
+CREATE INDEX IF NOT EXISTS day_statistics_geometry_ref_date_idx ON day_statistics (geometry_ref, date);
+
+CREATE TABLE IF NOT EXISTS moment_statistics (
+    date DATE,
+    measurement_moment INTEGER,
+    geometry_ref TEXT,
+    system_id TEXT,
+    vehicle_type TEXT,
+    indicator INTEGER,
+    value NUMERIC
+);
+CREATE INDEX IF NOT EXISTS moment_statistics_geometry_ref_date_idx ON moment_statistics (geometry_ref, date);
+
+CREATE TABLE IF NOT EXISTS geometry_operator_modality_limit (
+    geometry_operator_modality_limit_id SERIAL PRIMARY KEY,
+    geometry_ref TEXT,
+    operator TEXT,
+    form_factor TEXT,
+    propulsion_type TEXT,
+    effective_date DATE,
+    limits JSONB
+);
+
+CREATE TABLE IF NOT EXISTS organisation (
+    organisation_id SERIAL PRIMARY KEY,
+    name TEXT,
+    type_of_organisation TEXT,
+    data_owner_of_municipalities TEXT[],
+    data_owner_of_operators TEXT[]
+);
+
+CREATE TABLE IF NOT EXISTS user_account (
+    user_id TEXT PRIMARY KEY,
+    organisation_id INTEGER REFERENCES organisation (organisation_id),
+    privileges TEXT[]
+);
+
+CREATE TABLE IF NOT EXISTS operators (
+    system_id TEXT PRIMARY KEY,
+    name TEXT,
+    color TEXT,
+    operator_url TEXT,
+    logo_url TEXT
+);
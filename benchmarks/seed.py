@@ -0,0 +1,263 @@
+"""
+Seeds a local PostGIS and redis with synthetic data for the benchmarks: municipalities with thousands of
+zones in all phases, stops with realtime data in redis, service area versions, a year of day_statistics
+and moment_statistics and an admin user.
+
+Uses the same DB_* and REDIS_URL environment variables as the api. Only run it against a database
+that is used for benchmarks, the DB_NAME has to contain "bench" (or pass --force):
+
+    DB_NAME=policy_api_bench uv run python -m benchmarks.seed --reset --zones-per-municipality 5000
+"""
+import argparse
+import json
+import os
+import pathlib
+import time
+
+import jwt
+
+from db_helper import db_helper
+from redis_helper import redis_helper
+
+schema_file = pathlib.Path(__file__).parent / "schema.sql"
+migrations_dir = pathlib.Path(__file__).parent.parent / "migrations"
+
+operators = ["check", "cykl", "felyx", "gosharing"]
+vehicle_types = ["bicycle:human", "moped:electric"]
+benchmark_email = "benchmark@example.com"
+
+
+def get_municipalities(number_of_municipalities: int):
+    # GM9xxx codes don't exist, so the synthetic data can't be mistaken for real municipalities.
+    return [f"GM{9001 + index}" for index in range(number_of_municipalities)]
+
+
+def get_municipality_origin(index: int):
+    return 4.0 + index * 0.3, 52.0
+
+
+def create_benchmark_token():
+    # The api doesn't verify the signature (that is done by the reverse proxy), any secret will do.
+    return jwt.encode({"email": benchmark_email}, "benchmark", algorithm="HS256")
+
+
+def reset(cur):
+    cur.execute("""
+        TRUNCATE stops, geographies, zones, service_area, service_area_geometry, day_statistics, moment_statistics,
+        geometry_operator_modality_limit, user_account, organisation, operators RESTART IDENTITY CASCADE;
+    """)
+
+
+def reset_redis(r):
+    stop_ids = r.smembers("all_stops")
+    keys = ["stop:" + stop_id.decode() for stop_id in stop_ids] + list(r.scan_iter(match="stops_per_municipality:*"))
+    for index in range(0, len(keys), 1000):
+        r.delete(*keys[index:index + 1000])
+    r.delete("all_stops")
+
+
+def seed_users_and_operators(cur):
+    cur.execute("""
+        INSERT INTO organisation (name, type_of_organisation, data_owner_of_municipalities, data_owner_of_operators)
+        VALUES ('Benchmark', 'ADMIN', '{}', '{}')
+        RETURNING organisation_id
+    """)
+    organisation_id = cur.fetchone()["organisation_id"]
+    cur.execute("""
+        INSERT INTO user_account (user_id, organisation_id, privileges)
+        VALUES (%s, %s, ARRAY['MICROHUB_EDIT', 'ORGANISATION_ADMIN'])
+        ON CONFLICT (user_id) DO UPDATE SET organisation_id = EXCLUDED.organisation_id
+    """, (benchmark_email, organisation_id))
+    for operator in operators:
+        cur.execute("""
+            INSERT INTO operators (system_id, name, color, operator_url, logo_url)
+            VALUES (%s, %s, '#15aeef', 'https://example.com', 'https://example.com/logo.png')
+            ON CONFLICT (system_id) DO NOTHING
+        """, (operator, operator.capitalize()))
+
+
+def seed_zones(cur, municipality: str, origin, number_of_zones: int):
+    x, y = origin
+    cur.execute("""
+        INSERT INTO zones (area, name, municipality, zone_type)
+        VALUES (ST_MakeEnvelope(%(x)s, %(y)s, %(x)s + 0.25, %(y)s + 0.25, 4326), %(municipality)s, %(municipality)s, 'municipality')
+    """, {"x": x, "y": y, "municipality": municipality})
+
+    # zone_id % 6 spreads the zones over the phases: concept, committed_concept, published, active,
+    # retirement_concept and archived.
+    cur.execute("""
+        WITH new_zones AS (
+            INSERT INTO zones (area, name, municipality, zone_type)
+            SELECT ST_MakeEnvelope(x, y, x + 0.0008, y + 0.0005, 4326), 'Benchmark zone ' || i, %(municipality)s, 'custom'
+            FROM (
+                SELECT i, %(x)s + 0.005 + random() * 0.24 AS x, %(y)s + 0.005 + random() * 0.24 AS y
+                FROM generate_series(1, %(number_of_zones)s) AS i
+            ) AS points
+            RETURNING zone_id, name
+        )
+        INSERT INTO geographies
+        (geography_id, internal_id, zone_id, name, description, geography_type, effective_date, published_date,
+        retire_date, published_retire_date, propose_retirement, prev_geographies, created_at, modified_at,
+        created_by, last_modified_by, affected_modalities)
+        SELECT gen_random_uuid(), 'bench-' || zone_id, zone_id, name, 'Synthetic zone for benchmarks',
+        (ARRAY['stop', 'no_parking', 'monitoring'])[1 + zone_id %% 3],
+        CASE zone_id %% 6
+            WHEN 0 THEN NULL
+            WHEN 1 THEN NOW() + interval '2 days'
+            WHEN 2 THEN NOW() + interval '1 day'
+            ELSE NOW() - interval '60 days'
+        END,
+        CASE zone_id %% 6
+            WHEN 0 THEN NULL
+            WHEN 1 THEN NOW() + interval '1 day'
+            WHEN 2 THEN NOW() - interval '1 day'
+            ELSE NOW() - interval '61 days'
+        END,
+        CASE WHEN zone_id %% 6 = 5 THEN NOW() - interval '10 days' END,
+        CASE WHEN zone_id %% 6 = 5 THEN NOW() - interval '11 days' END,
+        zone_id %% 6 IN (4, 5),
+        '{}', NOW(), NOW(), %(email)s, %(email)s,
+        ARRAY['bicycle', 'moped', 'cargo_bicycle']
+        FROM new_zones;
+    """, {"x": x, "y": y, "municipality": municipality, "number_of_zones": number_of_zones, "email": benchmark_email})
+
+
+def seed_stops(cur, redis_pipeline, municipality: str):
+    cur.execute("""
+        INSERT INTO stops (stop_id, name, location, status, capacity, geography_id, is_virtual)
+        SELECT gen_random_uuid(), geographies.name, ST_Centroid(zones.area),
+        '{"control_automatic": true, "is_installed": true, "is_renting": true, "is_returning": true}',
+        '{"combined": 20}', geography_id, false
+        FROM geographies
+        JOIN zones USING (zone_id)
+        WHERE zones.municipality = %s AND geography_type = 'stop'
+        RETURNING stop_id, name, ST_AsGeoJSON(location) AS location, status, capacity, geography_id
+    """, (municipality,))
+    now = int(time.time() * 1000)
+    stops = cur.fetchall()
+    for index, stop in enumerate(stops):
+        available = index % 21
+        redis_pipeline.set("stop:" + str(stop["stop_id"]), json.dumps({
+            "stop_id": str(stop["stop_id"]),
+            "name": stop["name"],
+            "last_reported": now,
+            "location": {"type": "Feature", "geometry": json.loads(stop["location"]), "properties": {}},
+            "status": stop["status"],
+            "capacity": stop["capacity"],
+            "num_vehicles_available": {"combined": available},
+            "num_vehicles_disabled": {"combined": index % 3},
+            "num_places_available": {"combined": 20 - available},
+            "geography_id": str(stop["geography_id"]),
+        }))
+        redis_pipeline.sadd("all_stops", str(stop["stop_id"]))
+        redis_pipeline.sadd("stops_per_municipality:" + municipality, str(stop["stop_id"]))
+    return len(stops)
+
+
+def seed_service_areas(cur, municipality: str, origin, number_of_versions: int, geometries_per_version: int):
+    x, y = origin
+    for operator in operators:
+        cur.execute("""
+            INSERT INTO service_area_geometry (geom_hash, geom)
+            SELECT md5(%(municipality)s || %(operator)s || i), ST_MakeEnvelope(x, y, x + 0.02, y + 0.02, 4326)
+            FROM (
+                SELECT i, %(x)s + random() * 0.23 AS x, %(y)s + random() * 0.23 AS y
+                FROM generate_series(1, %(number_of_versions)s + %(geometries_per_version)s) AS i
+            ) AS points
+            ON CONFLICT (geom_hash) DO NOTHING
+        """, {"x": x, "y": y, "municipality": municipality, "operator": operator,
+              "number_of_versions": number_of_versions, "geometries_per_version": geometries_per_version})
+        # Every version replaces one geometry of the previous version, like a small change in a service area.
+        cur.execute("""
+            INSERT INTO service_area (municipality, operator, valid_from, valid_until, service_area_geometries)
+            SELECT %(municipality)s, %(operator)s,
+            NOW() - (%(number_of_versions)s - v + 1) * interval '7 days',
+            CASE WHEN v = %(number_of_versions)s THEN NULL ELSE NOW() - (%(number_of_versions)s - v) * interval '7 days' END,
+            ARRAY(SELECT md5(%(municipality)s || %(operator)s || i) FROM generate_series(v, v + %(geometries_per_version)s - 1) AS i)
+            FROM generate_series(1, %(number_of_versions)s) AS v
+        """, {"municipality": municipality, "operator": operator,
+              "number_of_versions": number_of_versions, "geometries_per_version": geometries_per_version})
+
+
+def seed_statistics(cur, municipality: str, days: int):
+    params = {"geometry_ref": f"cbs:{municipality}", "operators": operators, "vehicle_types": vehicle_types, "days": days}
+    cur.execute("""
+        INSERT INTO day_statistics (date, geometry_ref, system_id, vehicle_type, indicator, value)
+        SELECT day::date, %(geometry_ref)s, operator, vehicle_type, indicator, round((random() * 500)::numeric, 1)
+        FROM generate_series(NOW() - %(days)s * interval '1 day', NOW(), interval '1 day') AS day,
+        unnest(%(operators)s) AS operator,
+        unnest(%(vehicle_types)s) AS vehicle_type,
+        unnest(ARRAY[1, 6, 10, 11]) AS indicator
+    """, params)
+    cur.execute("""
+        INSERT INTO moment_statistics (date, measurement_moment, geometry_ref, system_id, vehicle_type, indicator, value)
+        SELECT day::date, measurement_moment, %(geometry_ref)s, operator, vehicle_type, indicator,
+        CASE WHEN indicator = 1 THEN 500 ELSE round((random() * 100)::numeric, 1) END
+        FROM generate_series(NOW() - %(days)s * interval '1 day', NOW(), interval '1 day') AS day,
+        unnest(ARRAY[0, 6, 12, 18]) AS measurement_moment,
+        unnest(%(operators)s) AS operator,
+        unnest(%(vehicle_types)s) AS vehicle_type,
+        unnest(ARRAY[1, 2, 3, 4, 5, 7, 8]) AS indicator
+    """, params)
+    for operator in operators:
+        for vehicle_type in vehicle_types:
+            form_factor, propulsion_type = vehicle_type.split(":")
+            cur.execute("""
+                INSERT INTO geometry_operator_modality_limit (geometry_ref, operator, form_factor, propulsion_type, effective_date, limits)
+                VALUES (%s, %s, %s, %s, NOW() - %s * interval '1 day', %s)
+            """, (f"cbs:{municipality}", operator, form_factor, propulsion_type, days // 2, json.dumps({
+                "vehicle_cap": 400,
+                "number_of_wrongly_parked_vehicles": 50,
+                "percentage_parked_longer_then_24_hours": 30,
+                "percentage_parked_longer_then_3_days": 10,
+            })))
+
+
+def seed(args):
+    municipalities = get_municipalities(args.municipalities)
+    with db_helper.get_resource() as (cur, conn):
+        try:
+            cur.execute(schema_file.read_text())
+            for migration in sorted(migrations_dir.glob("*.sql")):
+                cur.execute(migration.read_text())
+            if args.reset:
+                reset(cur)
+            seed_users_and_operators(cur)
+            with redis_helper.get_resource() as r:
+                if args.reset:
+                    reset_redis(r)
+                redis_pipeline = r.pipeline(transaction=False)
+                redis_pipeline.set("stops_last_updated", int(time.time()))
+                for index, municipality in enumerate(municipalities):
+                    origin = get_municipality_origin(index)
+                    seed_zones(cur, municipality, origin, args.zones_per_municipality)
+                    number_of_stops = seed_stops(cur, redis_pipeline, municipality)
+                    seed_service_areas(cur, municipality, origin, args.service_area_versions, args.geometries_per_version)
+                    seed_statistics(cur, municipality, args.days)
+                    print(f"{municipality}: {args.zones_per_municipality} zones, {number_of_stops} stops")
+                conn.commit()
+                redis_pipeline.execute()
+            cur.execute("ANALYZE;")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return municipalities
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--municipalities", type=int, default=3)
+    parser.add_argument("--zones-per-municipality", type=int, default=3000)
+    parser.add_argument("--service-area-versions", type=int, default=10)
+    parser.add_argument("--geometries-per-version", type=int, default=40)
+    parser.add_argument("--days", type=int, default=365, help="days of day_statistics and moment_statistics")
+    parser.add_argument("--reset", action="store_true", help="empty the tables first")
+    parser.add_argument("--force", action="store_true", help="seed even when DB_NAME doesn't contain 'bench'")
+    args = parser.parse_args()
+    if "bench" not in os.getenv("DB_NAME", "") and not args.force:
+        parser.error("DB_NAME doesn't look like a benchmark database, pass --force to seed it anyway.")
+    municipalities = seed(args)
+    print(f"Seeded {', '.join(municipalities)}, token of the admin user {benchmark_email}:")
+    print(create_benchmark_token())
+    db_helper.shutdown_connection_pool()
@@ -0,0 +1,98 @@
+"""
+Runs the endpoint benchmarks against a running api and the conversion microbenchmarks and writes all
+results to a JSON file, so that releases can be compared.
+
+Seed a benchmark database first (see benchmarks.seed) and start the api on it, then:
+
+    uv run python -m benchmarks.suite --base-url http://localhost:8000 --output benchmark_results.json
+
+Compare two result files with --compare previous.json.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks import conversions
+from benchmarks.concurrent_requests import get_endpoints, run_endpoint
+from benchmarks.seed import create_benchmark_token, get_municipalities
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_endpoints(args):
+    headers = {"authorization": f"Bearer {args.token or create_benchmark_token()}"}
+    endpoints = get_endpoints(args.municipality, args.operator)
+    results = []
+    async with httpx.AsyncClient(base_url=args.base_url, headers=headers, timeout=120) as client:
+        for path, params in endpoints.items():
+            # Warm up the pools and caches of the api before measuring.
+            await run_endpoint(client, path, params, args.concurrency, args.concurrency)
+            result = await run_endpoint(client, path, params, args.concurrency, args.requests)
+            result["concurrency"] = args.concurrency
+            results.append(result)
+            print(f"{result['endpoint']:<28} {result['errors']:>6} errors {result['throughput']:>8.1f} req/s "
+                  f"p50 {result['p50_ms']:>8.1f} ms p95 {result['p95_ms']:>8.1f} ms")
+    return results
+
+
+def compare(results, previous):
+    previous_endpoints = {result["endpoint"]: result for result in previous.get("endpoints", [])}
+    for result in results.get("endpoints", []):
+        if result["endpoint"] in previous_endpoints:
+            before = previous_endpoints[result["endpoint"]]
+            print(f"{result['endpoint']:<38} p50 {before['p50_ms']:>8.1f} -> {result['p50_ms']:>8.1f} ms, "
+                  f"{before['throughput']:>8.1f} -> {result['throughput']:>8.1f} req/s")
+    previous_conversions = {result["name"]: result for result in previous.get("conversions", [])}
+    for result in results.get("conversions", []):
+        if result["name"] in previous_conversions:
+            before = previous_conversions[result["name"]]
+            print(f"{result['name']:<38} {before['per_row_us']:>8.1f} -> {result['per_row_us']:>8.1f} us/row")
+
+
+def main(args):
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "parameters": vars(args),
+    }
+    if not args.skip_endpoints:
+        results["endpoints"] = asyncio.run(run_endpoints(args))
+    if not args.skip_conversions:
+        results["conversions"] = conversions.run(args.rows, args.repeat)
+        conversions.print_results(results["conversions"])
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--municipality", default=get_municipalities(1)[0])
+    parser.add_argument("--operator", default="check")
+    parser.add_argument("--token", help="JWT, defaults to a token of the user created by benchmarks.seed")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=1000, help="rows per conversion microbenchmark")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--skip-endpoints", action="store_true")
+    parser.add_argument("--skip-conversions", action="store_true")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="result file of a previous run")
+    main(parser.parse_args())
@@ -0,0 +1,40 @@
+"""
+Compares the size and the duration of the national zone listing per level of detail of the areas. Seed a
+benchmark database first, the seed applies the migrations that store the simplified areas:
+
+    DB_NAME=policy_api_bench uv run python -m benchmarks.seed --reset --municipalities 342 --zones-per-municipality 1000 --days 30
+    DB_NAME=policy_api_bench uv run python -m benchmarks.zone_detail
+"""
+import argparse
+import statistics
+import time
+
+from db_helper import db_helper
+from zones import get_zones, zone as zone_mod
+from zones.zone_detail import levels
+
+
+def measure(cur, level, repeat: int):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        zone_rows = get_zones.query_zones(cur, municipality=None, geography_types=[], phases=[zone_mod.Phase.active],
+            affected_modalities=["bicycle", "car", "moped", "cargo_bicycle"], level=level)
+        body = "[" + get_zones.serialise_zones(zone_mod.convert_zone_rows_trusted(zone_rows, include_private_data=False)) + "]"
+        durations.append(time.perf_counter() - start)
+    return len(zone_rows), len(body.encode()), durations
+
+
+def main(args):
+    with db_helper.get_resource(readonly=True) as (cur, conn):
+        print(f"{'level':<8} {'zones':>8} {'MB':>8} {'best ms':>9} {'median ms':>10}")
+        for level in levels:
+            number_of_zones, size, durations = measure(cur, level, args.repeat)
+            print(f"{level:<8} {number_of_zones:>8} {size / 1_000_000:>8.2f} {min(durations) * 1000:>9.1f} {statistics.median(durations) * 1000:>10.1f}")
+    db_helper.shutdown_connection_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,89 @@
+"""
+Compares the phase filter of query_zones on the materialised phase with the CASE expression it replaced,
+at the scale of all municipalities of the Netherlands. Seed a benchmark database at national scale first:
+
+    DB_NAME=policy_api_bench uv run python -m benchmarks.seed --reset --municipalities 342 --zones-per-municipality 1000 --days 30
+    DB_NAME=policy_api_bench uv run python -m benchmarks.zone_phase --explain
+"""
+import argparse
+import statistics
+import time
+
+from db_helper import db_helper
+from zones.zone_phase import phase_filter
+from benchmarks.seed import get_municipalities
+
+# The filter on the phase before it was materialised, evaluated for every geography in an outer query.
+case_phase_stmt = """
+    SELECT geography_id
+    FROM (
+        SELECT geographies.geography_id,
+        CASE
+            WHEN (published_date IS NULL) THEN 'concept'
+            WHEN (propose_retirement = true AND published_retire_date IS NULL) THEN 'retirement_concept'
+            WHEN NOW() < published_date AND NOW() < effective_date THEN 'committed_concept'
+            WHEN propose_retirement = true AND NOW() < published_retire_date AND NOW() < retire_date THEN 'committed_retirement_concept'
+            WHEN NOW() > published_date AND NOW() < effective_date THEN 'published'
+            WHEN propose_retirement = true AND NOW() > published_retire_date AND NOW() < retire_date THEN 'published_retirement'
+            WHEN (NOW() > effective_date AND (NOW() < retire_date OR retire_date IS NULL)) THEN 'active'
+            WHEN (NOW() > retire_date) THEN 'archived'
+            ELSE 'error'
+        END as phase
+        FROM geographies
+        JOIN zones
+        USING (zone_id)
+        WHERE ((true = %s) or (zones.municipality = %s))
+    ) as all_zones
+    WHERE phase = ANY(%s)
+"""
+
+materialised_phase_stmt = """
+    SELECT geographies.geography_id
+    FROM geographies
+    JOIN zones
+    USING (zone_id)
+    WHERE ((true = %s) or (zones.municipality = %s))
+    AND
+    """ + phase_filter
+
+
+def get_cases(municipality):
+    phases = ["committed_concept", "published"]
+    return {
+        "case, national": (case_phase_stmt, (True, None, phases)),
+        "materialised, national": (materialised_phase_stmt, (True, None, phases, phases)),
+        f"case, {municipality}": (case_phase_stmt, (False, municipality, phases)),
+        f"materialised, {municipality}": (materialised_phase_stmt, (False, municipality, phases, phases)),
+    }
+
+
+def measure(cur, stmt, params, repeat: int):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cur.execute(stmt, params)
+        rows = cur.fetchall()
+        durations.append(time.perf_counter() - start)
+    return len(rows), durations
+
+
+def main(args):
+    with db_helper.get_resource(readonly=True) as (cur, conn):
+        cur.execute("SELECT count(*) AS count FROM geographies")
+        print(f"{cur.fetchone()['count']} geographies")
+        print(f"{'query':<38} {'rows':>8} {'best ms':>9} {'median ms':>10}")
+        for name, (stmt, params) in get_cases(args.municipality).items():
+            number_of_rows, durations = measure(cur, stmt, params, args.repeat)
+            print(f"{name:<38} {number_of_rows:>8} {min(durations) * 1000:>9.1f} {statistics.median(durations) * 1000:>10.1f}")
+            if args.explain:
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + stmt, params)
+                print("\n".join(row["QUERY PLAN"] for row in cur.fetchall()))
+    db_helper.shutdown_connection_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--municipality", default=get_municipalities(1)[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--explain", action="store_true", help="print the query plans")
+    main(parser.parse_args())
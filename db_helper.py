@@ -1,46 +1,859 @@
 from psycopg2 import pool
 from psycopg2.extras import RealDictCursor, register_uuid
 import psycopg2.extras
-from contextlib import contextmanager
+import psycopg2.extensions
+import psycopg2.errors
+from contextlib import contextmanager, asynccontextmanager
+import asyncio
+import logging
+import threading
+import time
 import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import record_db_query
 
 register_uuid()
+
+
+async def wait_for_connection(conn):
+    # psycopg2 async connections have to be polled until they are ready,
+    # the socket is registered with the event loop so no thread is blocked while waiting.
+    loop = asyncio.get_running_loop()
+    while True:
+        state = conn.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            return
+        waiter = loop.create_future()
+        if state == psycopg2.extensions.POLL_READ:
+            loop.add_reader(conn.fileno(), waiter.set_result, None)
+            try:
+                await waiter
+            finally:
+                loop.remove_reader(conn.fileno())
+        elif state == psycopg2.extensions.POLL_WRITE:
+            loop.add_writer(conn.fileno(), waiter.set_result, None)
+            try:
+                await waiter
+            finally:
+                loop.remove_writer(conn.fileno())
+        else:
+            raise psycopg2.OperationalError(f"Unexpected poll state {state}")
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    """Counts the round trips to the server, including the implicit BEGIN and the COMMIT or ROLLBACK that ends it."""
+    round_trips = 0
+    # Names of the statements that are prepared on this server session.
+    prepared = None
+
+    def _count_transaction_end(self):
+        if not self.closed and self.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            self.round_trips += 2
+
+    def commit(self):
+        self._count_transaction_end()
+        super().commit()
+
+    def rollback(self):
+        self._count_transaction_end()
+        super().rollback()
+
+
+class CountingCursor(RealDictCursor):
+    def execute(self, query, vars=None):
+        self.connection.round_trips += 1
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            # On an async connection the query is still running, AsyncCursor records it.
+            if not self.connection.async_:
+                duration = time.perf_counter() - start
+                record_db_query(duration)
+                slow_query_log.check(self, query, vars, duration)
+
+
+class AsyncCursor:
+    """Wraps a CountingCursor on an async psycopg2 connection, execute has to be awaited."""
+    def __init__(self, cursor, conn):
+        self._cursor = cursor
+        self._conn = conn
+
+    @property
+    def connection(self):
+        return self._conn
+
+    async def execute(self, stmt, params=None):
+        start = time.perf_counter()
+        try:
+            self._cursor.execute(stmt, params)
+            await wait_for_connection(self._conn)
+        finally:
+            duration = time.perf_counter() - start
+            record_db_query(duration)
+        slow_query_log.check(self._cursor, stmt, params, duration)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        if not self._conn.closed and not self._conn.isexecuting():
+            self._cursor.close()
+
+
+def fetch_in_batches(cur, stmt, params, batch_size, name="batches"):
+    """Runs stmt in a server-side cursor and yields its rows batch_size at a time.
+
+    The cursor lives in a transaction, close the generator to end it early.
+    """
+    conn = cur.connection
+    if conn.autocommit:
+        cur.execute("BEGIN")
+    try:
+        cur.execute(f"DECLARE {name} NO SCROLL CURSOR FOR " + stmt, params)
+        while True:
+            cur.execute(f"FETCH FORWARD {int(batch_size)} FROM {name}")
+            rows = cur.fetchall()
+            if not rows:
+                return
+            yield rows
+    finally:
+        if not conn.closed and conn.autocommit:
+            cur.execute("ROLLBACK")
+        elif not conn.closed:
+            conn.rollback()
+
+
+async def fetch_in_batches_async(cur, stmt, params, batch_size, name="batches"):
+    # Async connections are always in autocommit mode and can't create named cursors, DECLARE one instead.
+    conn = cur.connection
+    await cur.execute("BEGIN")
+    try:
+        await cur.execute(f"DECLARE {name} NO SCROLL CURSOR FOR " + stmt, params)
+        while True:
+            await cur.execute(f"FETCH FORWARD {int(batch_size)} FROM {name}")
+            rows = cur.fetchall()
+            if not rows:
+                return
+            yield rows
+    finally:
+        # A cancelled request leaves the connection busy, the pool discards it.
+        if not conn.closed and not conn.isexecuting():
+            await cur.execute("ROLLBACK")
+
+
+email_pattern = re.compile(r"[^@\s]+@[^@\s]+")
+
+
+def redact_param(value):
+    if isinstance(value, str):
+        if email_pattern.search(value):
+            return "<redacted>"
+        if len(value) > 100:
+            return value[:100] + f"...<{len(value)} chars>"
+        return value
+    if isinstance(value, (list, tuple, set)):
+        return [redact_param(item) for item in value]
+    if isinstance(value, dict):
+        return {key: redact_param(item) for key, item in value.items()}
+    return value
+
+
+def find_caller():
+    # The first frame outside the database plumbing is the query module that issued the statement.
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module not in ("db_helper", "contextlib") and not module.startswith("asyncio"):
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+class SlowQueryLog:
+    """Logs statements that take longer than threshold seconds.
+
+    With explain=True the plan of a slow SELECT is captured with EXPLAIN (ANALYZE, BUFFERS) on a separate
+    read-only connection in a background thread, so the request that ran the query isn't delayed.
+    """
+    max_pending_explains = 4
+
+    def __init__(self, threshold=1.0, explain=False):
+        self.threshold = threshold
+        self.explain = explain
+        self.explain_conn_str = None
+        self._explain_executor = None
+        self._pending_explains = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("slow_query")
+
+    def check(self, cursor, query, params, duration):
+        if self.threshold < 0 or duration < self.threshold:
+            return
+        query_text = query.decode() if isinstance(query, bytes) else str(query)
+        self.logger.warning("slow query %.3fs in %s, %s rows: %s params=%s",
+            duration, find_caller(), cursor.rowcount, " ".join(query_text.split()), redact_param(params))
+        if self.explain and self.explain_conn_str is not None:
+            self.schedule_explain(query_text, cursor.query)
+
+    def schedule_explain(self, query_text, executed_query):
+        if executed_query is None or not self._is_select(query_text):
+            # EXPLAIN ANALYZE executes the statement, never do that for statements that write.
+            return
+        with self._lock:
+            if self._pending_explains >= self.max_pending_explains:
+                return
+            self._pending_explains += 1
+            if self._explain_executor is None:
+                self._explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+        self._explain_executor.submit(self._explain, query_text, executed_query)
+
+    def _is_select(self, query_text):
+        words = query_text.split(None, 2)
+        if not words:
+            return False
+        if words[0].upper() == "EXECUTE":
+            statement = prepared_statements.statements.get(words[1].split("(")[0]) if len(words) > 1 else None
+            return statement is not None and self._is_select(statement.prepare_stmt.split(" AS ", 1)[1])
+        return words[0].upper() in ("SELECT", "WITH")
+
+    def _explain(self, query_text, executed_query):
+        try:
+            # Read-only, so a data-modifying CTE fails instead of being executed a second time.
+            conn = psycopg2.connect(self.explain_conn_str, options=readonly_session_options)
+            try:
+                with conn.cursor() as cur:
+                    words = query_text.split(None, 2)
+                    if words[0].upper() == "EXECUTE":
+                        cur.execute(prepared_statements.statements[words[1].split("(")[0]].prepare_stmt)
+                    cur.execute(b"EXPLAIN (ANALYZE, BUFFERS) " + executed_query)
+                    plan = "\n".join(row[0] for row in cur.fetchall())
+                conn.rollback()
+            finally:
+                conn.close()
+            self.logger.warning("plan of slow query %s\n%s", " ".join(query_text.split())[:200], plan)
+        except Exception:
+            self.logger.exception("Error while explaining slow query")
+        finally:
+            with self._lock:
+                self._pending_explains -= 1
+
+
+class PreparedStatement:
+    """A statement that is prepared once per connection and after that executed by name.
+
+    The statement is written with %s placeholders like any other query.
+    """
+    def __init__(self, name, stmt):
+        if "%(" in stmt:
+            raise ValueError(f"Prepared statement {name} can only use positional %s placeholders.")
+        parts = stmt.split("%s")
+        self.name = name
+        self.stmt = stmt
+        self.number_of_params = len(parts) - 1
+        self.prepare_stmt = f"PREPARE {name} AS " + "".join(
+            part + (f"${index + 1}" if index < self.number_of_params else "") for index, part in enumerate(parts)
+        )
+        self.execute_stmt = f"EXECUTE {name}"
+        if self.number_of_params > 0:
+            self.execute_stmt += " (" + ", ".join(["%s"] * self.number_of_params) + ")"
+
+    def _needs_prepare(self, conn):
+        if conn.prepared is None:
+            conn.prepared = set()
+        return self.name not in conn.prepared
+
+    def _can_retry(self, conn, error):
+        # The server lost the statement (e.g. DISCARD ALL), prepare again. Within a transaction that is
+        # impossible because the error aborted it.
+        return isinstance(error, psycopg2.errors.InvalidSqlStatementName) and conn.autocommit
+
+    def prepare(self, cur):
+        conn = cur.connection
+        if self._needs_prepare(conn):
+            cur.execute(self.prepare_stmt)
+            conn.prepared.add(self.name)
+
+    async def prepare_async(self, cur):
+        conn = cur.connection
+        if self._needs_prepare(conn):
+            await cur.execute(self.prepare_stmt)
+            conn.prepared.add(self.name)
+
+    def execute(self, cur, params):
+        conn = cur.connection
+        self.prepare(cur)
+        try:
+            cur.execute(self.execute_stmt, params)
+        except psycopg2.Error as e:
+            if not self._can_retry(conn, e):
+                raise
+            cur.execute(self.prepare_stmt)
+            cur.execute(self.execute_stmt, params)
+
+    async def execute_async(self, cur, params):
+        conn = cur.connection
+        await self.prepare_async(cur)
+        try:
+            await cur.execute(self.execute_stmt, params)
+        except psycopg2.Error as e:
+            if not self._can_retry(conn, e):
+                raise
+            await cur.execute(self.prepare_stmt)
+            await cur.execute(self.execute_stmt, params)
+
+
+class PreparedStatementRegistry:
+    def __init__(self):
+        self.statements = {}
+
+    def register(self, name, stmt):
+        if name in self.statements:
+            raise ValueError(f"Prepared statement {name} is already registered.")
+        self.statements[name] = PreparedStatement(name, stmt)
+        return self.statements[name]
+
+
+prepared_statements = PreparedStatementRegistry()
+
+
+class PoolTimeoutError(Exception):
+    """No database connection became available within the configured timeout."""
+
+
+class PoolMetrics:
+    """Counters to size the connection pool on, shared between threads."""
+    def __init__(self, minconn, maxconn):
+        self._lock = threading.Lock()
+        self._checked_out_at = {}
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.checkout_duration_total = 0.0
+        self.checkout_duration_max = 0.0
+        self.round_trips = 0
+
+    def start_waiting(self, max_waiting):
+        with self._lock:
+            if self.waiting >= max_waiting:
+                self.rejected += 1
+                raise PoolTimeoutError(f"More than {max_waiting} requests are waiting for a database connection.")
+            self.waiting += 1
+
+    def stop_waiting(self, wait_time, acquired):
+        with self._lock:
+            self.waiting -= 1
+            self.wait_time_total += wait_time
+            self.wait_time_max = max(self.wait_time_max, wait_time)
+            if not acquired:
+                self.timeouts += 1
+
+    def checked_out(self, conn):
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self._checked_out_at[id(conn)] = time.perf_counter()
+
+    def checked_in(self, conn):
+        with self._lock:
+            self.in_use -= 1
+            self.round_trips += conn.round_trips
+            conn.round_trips = 0
+            checked_out_at = self._checked_out_at.pop(id(conn), None)
+            if checked_out_at is not None:
+                duration = time.perf_counter() - checked_out_at
+                self.checkout_duration_total += duration
+                self.checkout_duration_max = max(self.checkout_duration_max, duration)
+
+    def as_dict(self, idle):
+        with self._lock:
+            # Every wait is recorded, also the ones that ended in a timeout.
+            waits = self.checkouts + self.timeouts
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "in_use": self.in_use,
+                "idle": idle,
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "wait_time_avg_ms": self.wait_time_total / waits * 1000 if waits else 0.0,
+                "wait_time_max_ms": self.wait_time_max * 1000,
+                "checkout_duration_avg_ms": self.checkout_duration_total / self.checkouts * 1000 if self.checkouts else 0.0,
+                "checkout_duration_max_ms": self.checkout_duration_max * 1000,
+                "round_trips": self.round_trips,
+                "round_trips_per_checkout": self.round_trips / self.checkouts if self.checkouts else 0.0,
+            }
+
+
+class BoundedThreadedConnectionPool(pool.ThreadedConnectionPool):
+    """ThreadedConnectionPool that lets callers wait up to timeout seconds for a connection instead of raising PoolError.
+
+    With autocommit=True connections don't open a transaction, so no BEGIN and no ROLLBACK on return to the pool.
+    """
+    def __init__(self, minconn, maxconn, timeout, max_waiting, *args, autocommit=False, **kwargs):
+        self.autocommit = autocommit
+        super().__init__(minconn, maxconn, *args, connection_factory=CountingConnection, **kwargs)
+        # psycopg2 closes every returned connection once minconn connections are idle,
+        # keep up to maxconn connections open instead of reconnecting under load.
+        self.minconn = maxconn
+        self.timeout = timeout
+        self.max_waiting = max_waiting
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self.metrics = PoolMetrics(minconn, maxconn)
+
+    def _connect(self, key=None):
+        conn = super()._connect(key)
+        conn.autocommit = self.autocommit
+        return conn
+
+    def getconn(self, key=None):
+        self.metrics.start_waiting(self.max_waiting)
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        self.metrics.stop_waiting(time.perf_counter() - start, acquired)
+        if not acquired:
+            raise PoolTimeoutError(f"No database connection available within {self.timeout} seconds.")
+        try:
+            conn = super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+        self.metrics.checked_out(conn)
+        return conn
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            # The pool would roll back an open transaction too, but might close the connection instead. Rolling
+            # back here counts the end of the transaction once, through CountingConnection.rollback.
+            if not conn.closed and conn.info.transaction_status in (psycopg2.extensions.TRANSACTION_STATUS_INTRANS, psycopg2.extensions.TRANSACTION_STATUS_INERROR):
+                conn.rollback()
+            super().putconn(conn, key, close)
+        finally:
+            self.metrics.checked_in(conn)
+            self._slots.release()
+
+    def get_metrics(self):
+        return self.metrics.as_dict(idle=len(self._pool))
+
+
+class AsyncConnectionPool:
+    """asyncio pool of psycopg2 async connections, connections are always in autocommit mode."""
+    def __init__(self, minconn, maxconn, timeout, max_waiting, conn_str, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_waiting = max_waiting
+        self.conn_str = conn_str
+        self.connect_kwargs = connect_kwargs
+        self._idle = []
+        self._opened = 0
+        self._slots = asyncio.Semaphore(maxconn)
+        self.metrics = PoolMetrics(minconn, maxconn)
+
+    async def _connect(self):
+        self._opened += 1
+        try:
+            conn = psycopg2.connect(self.conn_str, async_=True, connection_factory=CountingConnection, **self.connect_kwargs)
+            await wait_for_connection(conn)
+            return conn
+        except Exception:
+            self._opened -= 1
+            raise
+
+    async def open(self):
+        while self._opened < self.minconn:
+            self._idle.append(await self._connect())
+
+    async def getconn(self):
+        self.metrics.start_waiting(self.max_waiting)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.metrics.stop_waiting(time.perf_counter() - start, acquired=False)
+            raise PoolTimeoutError(f"No database connection available within {self.timeout} seconds.")
+        except BaseException:
+            self.metrics.stop_waiting(time.perf_counter() - start, acquired=True)
+            raise
+        self.metrics.stop_waiting(time.perf_counter() - start, acquired=True)
+
+        try:
+            conn = await self._get_idle_or_connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        self.metrics.checked_out(conn)
+        return conn
+
+    async def _get_idle_or_connect(self):
+        while self._idle:
+            conn = self._idle.pop()
+            if not conn.closed:
+                return conn
+            self._opened -= 1
+        return await self._connect()
+
+    def putconn(self, conn):
+        self.metrics.checked_in(conn)
+        # A connection that is closed, still busy (e.g. the request was cancelled) or left in a transaction can't be reused.
+        if conn.closed or conn.isexecuting() or conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            self._discard(conn)
+        else:
+            self._idle.append(conn)
+        self._slots.release()
+
+    def _discard(self, conn):
+        if not conn.closed:
+            conn.close()
+        self._opened -= 1
+
+    def closeall(self):
+        while self._idle:
+            self._discard(self._idle.pop())
+
+    def get_metrics(self):
+        return self.metrics.as_dict(idle=len(self._idle))
+
+
+class ReplicaStatus:
+    """Keeps track of whether the read replica is reachable and how far it lags behind the primary."""
+    def __init__(self, max_lag, lag_check_interval=5.0, retry_interval=30.0):
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.retry_interval = retry_interval
+        self.lag = None
+        self._lag_checked_at = None
+        self._unavailable_until = 0.0
+
+    def is_reachable(self):
+        return time.monotonic() >= self._unavailable_until
+
+    def mark_unavailable(self):
+        logging.warning(f"Read replica unavailable, falling back to primary for {self.retry_interval} seconds.")
+        self._unavailable_until = time.monotonic() + self.retry_interval
+        self._lag_checked_at = None
+
+    def needs_lag_check(self):
+        return self._lag_checked_at is None or time.monotonic() - self._lag_checked_at >= self.lag_check_interval
+
+    def record_lag(self, lag):
+        if lag is not None and lag > self.max_lag:
+            logging.warning(f"Read replica lags {lag:.1f} seconds behind (max {self.max_lag}), falling back to primary.")
+        self.lag = lag
+        self._lag_checked_at = time.monotonic()
+
+    def is_lag_acceptable(self):
+        return self.lag is None or self.lag <= self.max_lag
+
+
+# When everything that is received is also replayed the replica is up to date, even when there were no recent writes.
+replication_lag_stmt = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END AS lag
+"""
+
+
+# Read-only sessions run in autocommit mode, the server rejects writes.
+readonly_session_options = "-c default_transaction_read_only=on"
+
+
 class DBHelper:
-    def __init__(self, conn_str):
+    def __init__(self, conn_str, min_size=2, max_size=10, timeout=5.0, max_waiting=100, replica_conn_str=None, replica_max_lag=30.0, readonly_sessions=True):
         self._connection_pool = None
+        self._async_connection_pool = None
+        self._readonly_connection_pool = None
+        self._readonly_async_connection_pool = None
+        self._replica_connection_pool = None
+        self._replica_async_connection_pool = None
         self.conn_str = conn_str
+        self.replica_conn_str = replica_conn_str
+        self.replica_status = ReplicaStatus(max_lag=replica_max_lag)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_waiting = max_waiting
+        self.readonly_sessions = readonly_sessions
 
     def initialize_connection_pool(self):
-        self._connection_pool = pool.ThreadedConnectionPool(2, 10 , self.conn_str)
+        self._connection_pool = BoundedThreadedConnectionPool(self.min_size, self.max_size, self.timeout, self.max_waiting, self.conn_str)
 
-    @contextmanager
-    def get_resource(self):
+    def initialize_async_connection_pool(self):
+        self._async_connection_pool = AsyncConnectionPool(self.min_size, self.max_size, self.timeout, self.max_waiting, self.conn_str)
+
+    def initialize_readonly_connection_pool(self):
+        self._readonly_connection_pool = BoundedThreadedConnectionPool(self.min_size, self.max_size, self.timeout, self.max_waiting, self.conn_str,
+                                                                       autocommit=True, options=readonly_session_options)
+
+    def initialize_readonly_async_connection_pool(self):
+        self._readonly_async_connection_pool = AsyncConnectionPool(self.min_size, self.max_size, self.timeout, self.max_waiting, self.conn_str,
+                                                                   options=readonly_session_options)
+
+    def initialize_replica_connection_pool(self):
+        self._replica_connection_pool = BoundedThreadedConnectionPool(self.min_size, self.max_size, self.timeout, self.max_waiting, self.replica_conn_str,
+                                                                      autocommit=True, options=readonly_session_options)
+
+    def initialize_replica_async_connection_pool(self):
+        self._replica_async_connection_pool = AsyncConnectionPool(self.min_size, self.max_size, self.timeout, self.max_waiting, self.replica_conn_str,
+                                                                  options=readonly_session_options)
+
+    def _get_primary_pool(self, readonly):
+        if readonly and self.readonly_sessions:
+            if self._readonly_connection_pool is None:
+                self.initialize_readonly_connection_pool()
+            return self._readonly_connection_pool
         if self._connection_pool is None:
             self.initialize_connection_pool()
+        return self._connection_pool
+
+    def _get_primary_async_pool(self, readonly):
+        if readonly and self.readonly_sessions:
+            if self._readonly_async_connection_pool is None:
+                self.initialize_readonly_async_connection_pool()
+            return self._readonly_async_connection_pool
+        if self._async_connection_pool is None:
+            self.initialize_async_connection_pool()
+        return self._async_connection_pool
+
+    def _getconn_replica(self):
+        # Returns None when the replica can't be used, the caller should fall back to the primary.
+        if self.replica_conn_str is None or not self.replica_status.is_reachable():
+            return None
+        try:
+            if self._replica_connection_pool is None:
+                self.initialize_replica_connection_pool()
+            conn = self._replica_connection_pool.getconn()
+        except psycopg2.OperationalError:
+            self.replica_status.mark_unavailable()
+            return None
+        except PoolTimeoutError:
+            # The replica is busy but reachable, only this request goes to the primary.
+            return None
+
+        if self.replica_status.needs_lag_check():
+            try:
+                with conn.cursor(cursor_factory=CountingCursor) as cur:
+                    cur.execute(replication_lag_stmt)
+                    self.replica_status.record_lag(cur.fetchone()["lag"])
+            except psycopg2.Error:
+                self._replica_connection_pool.putconn(conn, close=True)
+                self.replica_status.mark_unavailable()
+                return None
+
+        if not self.replica_status.is_lag_acceptable():
+            self._replica_connection_pool.putconn(conn)
+            return None
+        return conn
+
+    async def _getconn_replica_async(self):
+        if self.replica_conn_str is None or not self.replica_status.is_reachable():
+            return None
+        if self._replica_async_connection_pool is None:
+            self.initialize_replica_async_connection_pool()
+        try:
+            conn = await self._replica_async_connection_pool.getconn()
+        except psycopg2.OperationalError:
+            self.replica_status.mark_unavailable()
+            return None
+        except PoolTimeoutError:
+            return None
+
+        if self.replica_status.needs_lag_check():
+            cursor = AsyncCursor(conn.cursor(cursor_factory=CountingCursor), conn)
+            try:
+                await cursor.execute(replication_lag_stmt)
+                self.replica_status.record_lag(cursor.fetchone()["lag"])
+            except psycopg2.Error:
+                conn.close()
+                self._replica_async_connection_pool.putconn(conn)
+                self.replica_status.mark_unavailable()
+                return None
+            finally:
+                cursor.close()
+
+        if not self.replica_status.is_lag_acceptable():
+            self._replica_async_connection_pool.putconn(conn)
+            return None
+        return conn
+
+    @contextmanager
+    def get_resource(self, readonly=False):
+        """Borrow a cursor and connection.
+
+        With readonly=True the connection comes from the read replica when it's usable, it is an autocommit
+        read-only session so SELECTs don't pay for a BEGIN and ROLLBACK.
+        """
+        conn = self._getconn_replica() if readonly else None
+        connection_pool = self._replica_connection_pool
+        if conn is None:
+            connection_pool = self._get_primary_pool(readonly)
+            conn = connection_pool.getconn()
+        cursor = conn.cursor(cursor_factory=CountingCursor)
 
-        conn = self._connection_pool.getconn()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
         try:
             yield cursor, conn
         finally:
             cursor.close()
-            self._connection_pool.putconn(conn)
+            connection_pool.putconn(conn)
+
+    @asynccontextmanager
+    async def get_async_resource(self, readonly=False):
+        conn = await self._getconn_replica_async() if readonly else None
+        connection_pool = self._replica_async_connection_pool
+        if conn is None:
+            connection_pool = self._get_primary_async_pool(readonly)
+            conn = await connection_pool.getconn()
+        cursor = AsyncCursor(conn.cursor(cursor_factory=CountingCursor), conn)
+
+        try:
+            yield cursor, conn
+        finally:
+            cursor.close()
+            connection_pool.putconn(conn)
+
+    def open_connection_pools(self):
+        """Creates the sync pools, which open their connections right away instead of on the first requests."""
+        self._get_primary_pool(readonly=False)
+        self._get_primary_pool(readonly=True)
+        if self.replica_conn_str is not None and self._replica_connection_pool is None:
+            try:
+                self.initialize_replica_connection_pool()
+            except psycopg2.OperationalError:
+                self.replica_status.mark_unavailable()
+
+    async def open_async_connection_pools(self):
+        await self._get_primary_async_pool(readonly=False).open()
+        await self._get_primary_async_pool(readonly=True).open()
+        if self.replica_conn_str is not None:
+            if self._replica_async_connection_pool is None:
+                self.initialize_replica_async_connection_pool()
+            try:
+                await self._replica_async_connection_pool.open()
+            except psycopg2.OperationalError:
+                self.replica_status.mark_unavailable()
+
+    def get_open_pools(self):
+        return [connection_pool for connection_pool in (self._connection_pool, self._readonly_connection_pool, self._replica_connection_pool)
+                if connection_pool is not None]
+
+    def get_open_async_pools(self):
+        return [connection_pool for connection_pool in (self._async_connection_pool, self._readonly_async_connection_pool, self._replica_async_connection_pool)
+                if connection_pool is not None]
+
+    def prepare_statements(self, statements):
+        """Prepares the statements on the open connections of the sync pools, returns the errors."""
+        errors = []
+        for connection_pool in self.get_open_pools():
+            conns = [connection_pool.getconn() for _ in range(self.min_size)]
+            try:
+                for conn in conns:
+                    with conn.cursor(cursor_factory=CountingCursor) as cur:
+                        for statement in statements:
+                            try:
+                                statement.prepare(cur)
+                                if not conn.autocommit:
+                                    conn.commit()
+                            except psycopg2.Error as e:
+                                conn.rollback()
+                                errors.append(f"{statement.name}: {e}")
+            finally:
+                for conn in conns:
+                    connection_pool.putconn(conn)
+        return errors
+
+    async def prepare_statements_async(self, statements):
+        errors = []
+        for connection_pool in self.get_open_async_pools():
+            conns = [await connection_pool.getconn() for _ in range(self.min_size)]
+            try:
+                for conn in conns:
+                    cursor = AsyncCursor(conn.cursor(cursor_factory=CountingCursor), conn)
+                    try:
+                        for statement in statements:
+                            try:
+                                await statement.prepare_async(cursor)
+                            except psycopg2.Error as e:
+                                errors.append(f"{statement.name}: {e}")
+                    finally:
+                        cursor.close()
+            finally:
+                for conn in conns:
+                    connection_pool.putconn(conn)
+        return errors
+
+    def get_pool_metrics(self):
+        return {
+            "sync": self._connection_pool.get_metrics() if self._connection_pool is not None else None,
+            "async": self._async_connection_pool.get_metrics() if self._async_connection_pool is not None else None,
+            "readonly_sync": self._readonly_connection_pool.get_metrics() if self._readonly_connection_pool is not None else None,
+            "readonly_async": self._readonly_async_connection_pool.get_metrics() if self._readonly_async_connection_pool is not None else None,
+            "replica_sync": self._replica_connection_pool.get_metrics() if self._replica_connection_pool is not None else None,
+            "replica_async": self._replica_async_connection_pool.get_metrics() if self._replica_async_connection_pool is not None else None,
+            "replica_lag_seconds": self.replica_status.lag,
+            "replica_reachable": self.replica_status.is_reachable() if self.replica_conn_str is not None else None,
+        }
 
     def shutdown_connection_pool(self):
-        if self._connection_pool is not None:
-            self._connection_pool.closeall()
+        for connection_pool in (self._connection_pool, self._async_connection_pool,
+                                self._readonly_connection_pool, self._readonly_async_connection_pool,
+                                self._replica_connection_pool, self._replica_async_connection_pool):
+            if connection_pool is not None:
+                connection_pool.closeall()
+
+def create_conn_str(host_env, port_env):
+    conn_str = f"dbname={os.getenv('DB_NAME')}"
+
+    if host_env in os.environ:
+        conn_str += " host={} ".format(os.environ[host_env])
+    if "DB_USER" in os.environ:
+        conn_str += " user={}".format(os.environ['DB_USER'])
+    if "DB_PASSWORD" in os.environ:
+        conn_str += " password={}".format(os.environ['DB_PASSWORD'])
+    if port_env in os.environ:
+        conn_str += " port={}".format(os.environ[port_env])
+    return conn_str
 
 # Init normal db
-conn_str = f"dbname={os.getenv('DB_NAME')}"
-
-if "DB_HOST" in os.environ:
-    conn_str += " host={} ".format(os.environ['DB_HOST'])
-if "DB_USER" in os.environ:
-    conn_str += " user={}".format(os.environ['DB_USER'])
-if "DB_PASSWORD" in os.environ:
-    conn_str += " password={}".format(os.environ['DB_PASSWORD'])
-if "DB_PORT" in os.environ:
-    conn_str += " port={}".format(os.environ['DB_PORT'])
-
-db_helper = DBHelper(conn_str)
+conn_str = create_conn_str("DB_HOST", "DB_PORT")
+
+# Optional read replica, used by get_resource(readonly=True)
+replica_conn_str = None
+if "DB_REPLICA_HOST" in os.environ:
+    replica_conn_str = create_conn_str("DB_REPLICA_HOST", "DB_REPLICA_PORT" if "DB_REPLICA_PORT" in os.environ else "DB_PORT")
+
+db_helper = DBHelper(
+    conn_str,
+    min_size=int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+    max_size=int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+    timeout=float(os.getenv("DB_POOL_TIMEOUT", 5)),
+    max_waiting=int(os.getenv("DB_POOL_MAX_WAITING", 100)),
+    replica_conn_str=replica_conn_str,
+    replica_max_lag=float(os.getenv("DB_REPLICA_MAX_LAG", 30)),
+    readonly_sessions=os.getenv("DB_READONLY_SESSIONS", "true").lower() == "true"
+)
+
+# Statements slower than DB_SLOW_QUERY_THRESHOLD seconds are logged, a negative value disables the log.
+slow_query_log = SlowQueryLog(
+    threshold=float(os.getenv("DB_SLOW_QUERY_THRESHOLD", 1)),
+    explain=os.getenv("DB_SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+)
+slow_query_log.explain_conn_str = replica_conn_str or conn_str
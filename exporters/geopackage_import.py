@@ -5,6 +5,8 @@ from zones import edit_zone, get_zones
 from zones import create_zone
 from zones import zone
 from zones.create_zone import check_if_user_has_access
+from zones.public_zones_cache import public_zones_cache
+from mds.feed_cache import feed_cache
 
 from fastapi import UploadFile, HTTPException
 from authorization import access_control
@@ -229,6 +231,9 @@ def edit_zones(to_edit_zones, zone_dict, user):
             conn.rollback()
             print(e)
             raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
+    if result:
+        public_zones_cache.invalidate([zone.municipality for zone in result])
+        feed_cache.invalidate()
     return result, errors
 
 def process_uploaded_zones(z: list[zone.Zone], zone_dict, current_user: access_control.User):
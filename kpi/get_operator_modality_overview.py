@@ -25,7 +25,7 @@ def check_is_user_authorized_to_view_kpi(municipality: Optional[str], system_id:
     
     return False
 
-def get_operator_modality_kpi_overview(start_date: date, end_date: date, municipality: Optional[str], system_id: Optional[str], form_factor: Optional[Modality], propulsion_type: Optional[PropulsionType], current_user: access_control.User) -> KPIReport:
+async def get_operator_modality_kpi_overview(start_date: date, end_date: date, municipality: Optional[str], system_id: Optional[str], form_factor: Optional[Modality], propulsion_type: Optional[PropulsionType], current_user: access_control.User) -> KPIReport:
     if municipality is None and system_id is None:
         raise HTTPException(status_code=400, detail="Either municipality or system_id must be provided.")
     
@@ -36,11 +36,11 @@ def get_operator_modality_kpi_overview(start_date: date, end_date: date, municip
         raise HTTPException(status_code=400, detail="If propulsion_type is provided, form_factor must also be provided.")
 
     all_stats: dict[str, list[GeometryModalityOperatorKPI]] = {}
-    with db_helper.get_resource() as (cur, conn):
+    async with db_helper.get_async_resource(readonly=True) as (cur, conn):
         try:
-            day_stats_res = query_day_stats(cur, municipality, system_id, form_factor, propulsion_type, start_date, end_date)
+            day_stats_res = await query_day_stats(cur, municipality, system_id, form_factor, propulsion_type, start_date, end_date)
             all_stats = convert_stats_to_kpi_values(all_stats, day_stats_res)
-            query_moment_stats_res = query_moment_stats(cur, municipality, system_id, form_factor, propulsion_type, start_date, end_date)
+            query_moment_stats_res = await query_moment_stats(cur, municipality, system_id, form_factor, propulsion_type, start_date, end_date)
             all_stats = convert_stats_to_kpi_values(all_stats, query_moment_stats_res)
 
             return KPIReport(
@@ -48,7 +48,6 @@ def get_operator_modality_kpi_overview(start_date: date, end_date: date, municip
                 municipality_modality_operators=list(all_stats.values())
             )
         except Exception as e:
-            conn.rollback()
             traceback.print_exc()
             print(e)
             raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
@@ -101,7 +100,7 @@ def convert_stats_to_kpi_values(all_stats: dict[str, list[GeometryModalityOperat
     return all_stats
 
 
-def query_moment_stats(cur, municipality: Optional[str], system_id: Optional[str], form_factor: Optional[Modality], propulsion_type: Optional[PropulsionType], start_date: date, end_date: date):
+async def query_moment_stats(cur, municipality: Optional[str], system_id: Optional[str], form_factor: Optional[Modality], propulsion_type: Optional[PropulsionType], start_date: date, end_date: date):
     stmt = """
        WITH limits_with_range AS (
             SELECT
@@ -214,7 +213,7 @@ def query_moment_stats(cur, municipality: Optional[str], system_id: Optional[str
 
     """
     municipality_cbs = f'cbs:{municipality}' if municipality else None
-    cur.execute(stmt, {
+    await cur.execute(stmt, {
         'system_id': system_id, 
         'municipality_cbs': municipality_cbs,
         'form_factor_like': f'{form_factor.value}:%' if form_factor and propulsion_type is None else None,
@@ -224,7 +223,7 @@ def query_moment_stats(cur, municipality: Optional[str], system_id: Optional[str
     })
     return cur.fetchall()
 
-def query_day_stats(cur, municipality: Optional[str], system_id: Optional[str], form_factor: Optional[Modality], propulsion_type: Optional[PropulsionType], start_date: date, end_date: date):
+async def query_day_stats(cur, municipality: Optional[str], system_id: Optional[str], form_factor: Optional[Modality], propulsion_type: Optional[PropulsionType], start_date: date, end_date: date):
     stmt = """
     WITH limits_with_range AS (
         SELECT
@@ -326,7 +325,7 @@ def query_day_stats(cur, municipality: Optional[str], system_id: Optional[str],
         s.date;
     """
     municipality_cbs = f'cbs:{municipality}' if municipality else None
-    cur.execute(stmt, {
+    await cur.execute(stmt, {
         'system_id': system_id, 
         'municipality_cbs': municipality_cbs,
         'form_factor_like': f'{form_factor.value}:%' if form_factor and propulsion_type is None else None,
@@ -1,17 +1,29 @@
+import time
+import_started = time.perf_counter()
+
 from tempfile import NamedTemporaryFile
 from typing import List, Union
 from uuid import UUID
 from typing import Annotated
-from fastapi import FastAPI, Depends, Query, UploadFile, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Depends, Header, Path, Query, UploadFile, HTTPException
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse, Response
 
 from kpi import get_operator_modality_overview
-from zones import create_zone, zone, get_zones, delete_zone, edit_zone, publish_zones, make_concept, propose_retirement
-from db_helper import db_helper
+from zones import create_zone, zone, get_zones, delete_zone, edit_zone, publish_zones, make_concept, propose_retirement, zone_phase, zone_detail, zone_tiles
+from db_helper import db_helper, PoolTimeoutError
+from redis_helper import redis_helper
+from metrics import MetricsMiddleware, render_metrics
+from startup_report import get_startup_report, format_startup_report
+import warm_up
+from contextlib import asynccontextmanager
+import asyncio
 from mds import geographies, geography, stops, stop, policies
-from exporters import kml_export, geopackage_export, geopackage_import, export_request
+from exporters import export_request
 from fastapi.middleware.gzip import GZipMiddleware
 from authorization import access_control
+from authorization.acl_cache import acl_cache
+from zones.public_zones_cache import public_zones_cache
+import response_formats
 from service_areas import get_available_operators, get_service_areas, get_service_area_history, get_service_area_delta, generate_service_area
 from datetime import date
 from modalities import Modality, PropulsionType
@@ -27,8 +39,39 @@ import logging
 
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logging.info(format_startup_report(get_startup_report(import_started)))
+    retry_task = None
+    try:
+        ready = await asyncio.wait_for(warm_up.warm_up(), warm_up.warm_up_timeout)
+    except asyncio.TimeoutError:
+        logging.warning(f"Warm-up didn't finish within {warm_up.warm_up_timeout} seconds")
+        ready = False
+    if not ready:
+        # Serve anyway, /ready keeps reporting 503 until a retry succeeds.
+        retry_task = asyncio.create_task(warm_up.warm_up_until_ready())
+    else:
+        logging.info(f"Warm-up finished in {warm_up.warm_up_state.duration}s: {warm_up.warm_up_state.steps}")
+    refresh_task = asyncio.create_task(zone_phase.refresh_zone_phases_periodically(zone_phase.refresh_interval))
+
+    yield
+
+    if retry_task is not None:
+        retry_task.cancel()
+    refresh_task.cancel()
+    db_helper.shutdown_connection_pool()
+    redis_helper.close()
+    await redis_helper.close_async()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(PoolTimeoutError)
+def pool_timeout_handler(request, exc: PoolTimeoutError):
+    logging.warning(f"DB pool saturated on {request.url.path}: {exc}")
+    return JSONResponse(status_code=503, content={"detail": "Too busy, try again later."}, headers={"Retry-After": "1"})
 
 # /admin endpoints
 @app.post("/admin/zone", status_code=201)
@@ -71,27 +114,57 @@ def delete_zones_route(delete_request: delete_zone.DeleteZonesRequest, current_u
 
 @app.get("/admin/zones")
 def get_zones_private(
+    response: Response,
     municipality: Union[str, None] = None, 
     geography_types: list[zone.GeographyType] = Query(default=[]),
     phases: Annotated[list[zone.Phase], Query()] = [zone.Phase.active, zone.Phase.retirement_concept, zone.Phase.published_retirement, zone.Phase.committed_retire_concept],
-    affected_modalities: Annotated[list[Modality], Query()] = [Modality.bicycle, Modality.car, Modality.moped, Modality.cargo_bicycle]
+    affected_modalities: Annotated[list[Modality], Query()] = [Modality.bicycle, Modality.car, Modality.moped, Modality.cargo_bicycle],
+    bbox: Annotated[Union[str, None], Query(description="min_lon,min_lat,max_lon,max_lat")] = None,
+    limit: Annotated[Union[int, None], Query(ge=1, le=10000)] = None,
+    cursor: Annotated[Union[UUID, None], Query(description="X-Next-Cursor header of the previous page")] = None,
+    zoom: Annotated[Union[int, None], Query(ge=0, le=24)] = None,
+    tolerance: Annotated[Union[float, None], Query(ge=0, description="simplification tolerance in degrees")] = None,
+    accept: Annotated[Union[str, None], Header(description="application/flatgeobuf for FlatGeobuf")] = None
 ):
     if len(phases) == 0:
         raise HTTPException(status_code=400, detail="At least one phase in query parameter phases should be specified.")
-    return get_zones.get_private_zones(municipality=municipality, geography_types=geography_types, phases=phases, affected_modalities=affected_modalities)
+    return response_formats.vary_on_accept(get_zones.get_private_zones(municipality=municipality, geography_types=geography_types, phases=phases, affected_modalities=affected_modalities,
+        bbox=get_zones.parse_bbox(bbox), limit=limit, cursor=cursor, level=zone_detail.get_level(zoom, tolerance),
+        response_format=response_formats.get_response_format(accept)), response)
 
 @app.get("/public/zones")
-def get_zones_public(
+async def get_zones_public(
+    response: Response,
+    municipality: Union[str, None] = None, 
+    geography_types: list[zone.GeographyType] = Query(default=[]),
+    phases: Annotated[list[zone.Phase], Query()] = [zone.Phase.active, zone.Phase.retirement_concept, zone.Phase.published_retirement, zone.Phase.committed_retire_concept],
+    affected_modalities: Annotated[list[Modality], Query()] = [Modality.bicycle, Modality.car, Modality.moped, Modality.cargo_bicycle],
+    bbox: Annotated[Union[str, None], Query(description="min_lon,min_lat,max_lon,max_lat")] = None,
+    limit: Annotated[Union[int, None], Query(ge=1, le=10000)] = None,
+    cursor: Annotated[Union[UUID, None], Query(description="X-Next-Cursor header of the previous page")] = None,
+    zoom: Annotated[Union[int, None], Query(ge=0, le=24)] = None,
+    tolerance: Annotated[Union[float, None], Query(ge=0, description="simplification tolerance in degrees")] = None,
+    accept: Annotated[Union[str, None], Header(description="application/flatgeobuf for FlatGeobuf, application/topo+json for TopoJSON")] = None
+):
+    return response_formats.vary_on_accept(await get_zones.get_public_zones(municipality=municipality, geography_types=geography_types, phases=phases, affected_modalities=affected_modalities,
+        bbox=get_zones.parse_bbox(bbox), limit=limit, cursor=cursor, level=zone_detail.get_level(zoom, tolerance),
+        response_format=response_formats.get_response_format(accept)), response)
+
+@app.get("/public/zones/tiles/{z}/{x}/{y}.mvt")
+async def get_zone_tile_route(
+    z: Annotated[int, Path(ge=0, le=22)],
+    x: Annotated[int, Path(ge=0)],
+    y: Annotated[int, Path(ge=0)],
     municipality: Union[str, None] = None, 
     geography_types: list[zone.GeographyType] = Query(default=[]),
     phases: Annotated[list[zone.Phase], Query()] = [zone.Phase.active, zone.Phase.retirement_concept, zone.Phase.published_retirement, zone.Phase.committed_retire_concept],
     affected_modalities: Annotated[list[Modality], Query()] = [Modality.bicycle, Modality.car, Modality.moped, Modality.cargo_bicycle]
 ):
-    return get_zones.get_public_zones(municipality=municipality, geography_types=geography_types, phases=phases, affected_modalities=affected_modalities)
+    return await zone_tiles.get_zone_tile(z, x, y, municipality=municipality, geography_types=geography_types, phases=phases, affected_modalities=affected_modalities)
 
 @app.get("/public/service_area")
-def get_service_area(municipalities: list[str] = Query(), operators: list[str] = Query()):
-    return get_service_areas.get_service_areas(municipalities=municipalities, operators=operators)
+async def get_service_area(municipalities: list[str] = Query(), operators: list[str] = Query()):
+    return await get_service_areas.get_service_areas(municipalities=municipalities, operators=operators)
 
 @app.get("/public/service_area/available_operators")
 def get_operators_with_service_area_route(municipalities: list[str] = Query()):
@@ -112,24 +185,34 @@ def get_zones_public_route(service_area_version_id: int):
 
 # MDS - endpoints.
 @app.get("/geographies", response_model=geographies.MDSGeographies)
-def get_geographies_route(municipality: Union[str, None] = None):
-    return geographies.get_geographies(municipality)
+async def get_geographies_route(
+    response: Response,
+    municipality: Union[str, None] = None,
+    zoom: Annotated[Union[int, None], Query(ge=0, le=24)] = None,
+    tolerance: Annotated[Union[float, None], Query(ge=0, description="simplification tolerance in degrees")] = None,
+    accept: Annotated[Union[str, None], Header(description="application/flatgeobuf for FlatGeobuf, application/topo+json for TopoJSON")] = None
+):
+    return response_formats.vary_on_accept(await geographies.get_geographies(municipality, zone_detail.get_level(zoom, tolerance), response_formats.get_response_format(accept)), response)
 
 @app.get("/geographies/{geography_uuid}", response_model=geography.MDSGeography)
-def get_geography_route(geography_uuid: UUID):
-    return geography.get_geography(geography_uuid)
+def get_geography_route(
+    geography_uuid: UUID,
+    zoom: Annotated[Union[int, None], Query(ge=0, le=24)] = None,
+    tolerance: Annotated[Union[float, None], Query(ge=0, description="simplification tolerance in degrees")] = None
+):
+    return geography.get_geography(geography_uuid, zone_detail.get_level(zoom, tolerance))
 
 @app.get("/stops", response_model=stop.MDSStops)
-def get_stops_route(municipality: Union[str, None] = None):
-    return stops.get_stops(municipality)
+async def get_stops_route(municipality: Union[str, None] = None):
+    return await stops.get_stops(municipality)
 
 @app.get("/stops/{stop_uuid}", response_model=stop.MDSStops)
-def get_stop_route(stop_uuid: UUID):
-    return stop.get_stop(stop_uuid)
+async def get_stop_route(stop_uuid: UUID):
+    return await stop.get_stop(stop_uuid)
 
 @app.get("/policies", response_model=policies.MDSPolicies, response_model_exclude_none=True)
-def get_policies_route(municipality: Union[str, None] = None):
-    return policies.get_policies(municipality)
+async def get_policies_route(municipality: Union[str, None] = None):
+    return await policies.get_policies(municipality)
 
 @app.get("/policies/{policy_uuid}", response_model=policies.MDSPolicies, response_model_exclude_none=True)
 def get_policy_route(policy_uuid: UUID):
@@ -144,6 +227,8 @@ def generate_service_area_route(
 
 @app.post("/kml/export")
 def get_kml_route(export_request: export_request.ExportRequest):
+    # The export and import stacks (simplekml, fudgeo, shapely) are imported on first use to keep worker startup fast.
+    from exporters import kml_export
     result, zip_file_name = kml_export.export(export_request)
     return StreamingResponse(
             iter([result.getvalue()]), 
@@ -153,6 +238,7 @@ def get_kml_route(export_request: export_request.ExportRequest):
 
 @app.post("/gpkg/export")
 def export_gkpg_route(export_request: export_request.ExportRequest):
+    from exporters import geopackage_export
     result, zip_file_name = geopackage_export.export(export_request)
     return StreamingResponse(
             iter([result.getvalue()]), 
@@ -172,6 +258,7 @@ async def export_gpkg_route(file: UploadFile, municipality: str, current_user: a
             raise HTTPException(status_code=500, detail='Error on geopackage')
         finally:
             file.file.close()
+        from exporters import geopackage_import
         return geopackage_import.gpkg_import(temp.name, municipality, current_user)
     except Exception:
         logging.exception("Error during geopackage import")
@@ -209,14 +296,41 @@ def get_geometry_operator_modality_limit_history_route(
     )
 
 @app.get("/kpi_overview_operators", response_model=KPIReport, response_model_exclude_none=True)
-def get_kpi_overview_operators_route(
+async def get_kpi_overview_operators_route(
     start_date: date, end_date: date, 
     municipality: str | None = None, system_id: str | None = None, form_factor: Modality | None = None,
     propulsion_type: PropulsionType | None = None,
     current_user: access_control.User = Depends(access_control.get_current_user)) -> KPIReport:
-    return get_operator_modality_overview.get_operator_modality_kpi_overview(start_date=start_date, end_date=end_date, municipality=municipality, system_id=system_id, form_factor=form_factor, propulsion_type=propulsion_type, current_user=current_user)
+    return await get_operator_modality_overview.get_operator_modality_kpi_overview(start_date=start_date, end_date=end_date, municipality=municipality, system_id=system_id, form_factor=form_factor, propulsion_type=propulsion_type, current_user=current_user)
 
 
-@app.on_event("shutdown")
-def shutdown_event():
-    db_helper.shutdown_connection_pool()
+@app.get("/ready")
+def get_ready_route():
+    status_code = 200 if warm_up.warm_up_state.is_ready else 503
+    return JSONResponse(warm_up.warm_up_state.as_dict(), status_code=status_code)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics_route():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/db_pool")
+def get_db_pool_metrics_route():
+    return db_helper.get_pool_metrics()
+
+@app.get("/metrics/redis_pool")
+def get_redis_pool_metrics_route():
+    return redis_helper.get_pool_metrics()
+
+@app.get("/metrics/acl_cache")
+def get_acl_cache_metrics_route():
+    return acl_cache.get_metrics()
+
+@app.get("/metrics/public_zones_cache")
+def get_public_zones_cache_metrics_route():
+    return public_zones_cache.get_metrics()
+
+@app.post("/admin/acl_cache/invalidate", status_code=204)
+async def invalidate_acl_cache_route(email: str | None = None, current_user: access_control.User = Depends(access_control.get_current_user)):
+    if not current_user.acl.is_admin:
+        raise HTTPException(status_code=403, detail="This user is not allowed to invalidate the ACL cache.")
+    await access_control.invalidate_user_acl(email)
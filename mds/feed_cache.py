@@ -0,0 +1,67 @@
+import asyncio
+import os
+import weakref
+import time
+
+
+class FeedCache:
+    """Keeps the built MDS feeds per municipality for ttl seconds, so that they can be built before the first request.
+
+    The cache is per worker. invalidate only drops the feeds of the worker that changed the zones, the
+    other workers serve their feeds until these expire, so a feed is at most ttl seconds stale.
+    """
+    def __init__(self, ttl=30.0):
+        self.ttl = ttl
+        self._entries = {}
+        # A lock only lives while a request holds or waits for it.
+        self._locks = weakref.WeakValueDictionary()
+        # Raised by invalidate, a build that started before an invalidation doesn't store its feed.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_build(self, key, build):
+        if self.ttl <= 0:
+            return await build()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        # Concurrent requests for an expired feed wait for one build instead of all querying the database.
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        async with lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+            feed = await build()
+            if generation == self._generation:
+                self._store(key, feed)
+            return feed
+
+    async def prebuild(self, key, build):
+        if self.ttl <= 0:
+            return
+        generation = self._generation
+        feed = await build()
+        if generation == self._generation:
+            self._store(key, feed)
+
+    def _store(self, key, feed):
+        # Expired feeds are dropped instead of only replaced, feeds that aren't requested anymore don't stay in memory.
+        now = time.monotonic()
+        for expired_key in [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[expired_key]
+        self._entries[key] = (now + self.ttl, feed)
+
+    def invalidate(self):
+        self._generation += 1
+        self._entries.clear()
+
+
+feed_cache = FeedCache(ttl=float(os.getenv("MDS_FEED_CACHE_TTL", 30)))
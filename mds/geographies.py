@@ -1,40 +1,126 @@
-from db_helper import db_helper
+from db_helper import db_helper, prepared_statements
 from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
 import time
 
 from pydantic import BaseModel
 from typing import List
-from mds.geography import Geography, convert_geography_row
+from mds.geography import Geography, convert_geography_row, convert_geography_row_trusted
+from pydantic_core import to_json
+from trusted_rows import validate_rows, get_trusted_response
+from mds.feed_cache import feed_cache
+from zones.zone_detail import area_at_level, area_geojson, get_area_geojson_params, default_level, levels
+import response_formats
+from response_formats import FlatGeobufResponse, TopoJSONResponse
+import topology
 
 class MDSGeographies(BaseModel):
     version: str = "1.2.0"
     updated: int
     geographies: List[Geography]
 
-def get_geographies(municipality: str):
-    with db_helper.get_resource() as (cur, _):
+async def get_geographies(municipality: str, level=default_level, response_format=response_formats.geojson):
+    if response_format == response_formats.flatgeobuf:
+        # The database builds the file as one value, the file of every geography in the country would be
+        # held in memory (and in the feed cache).
+        if municipality == None:
+            raise HTTPException(status_code=400, detail="FlatGeobuf responses are only available per municipality, add municipality.")
+        feed = await feed_cache.get_or_build(("geographies_flatgeobuf", municipality, level), lambda: build_geographies_flatgeobuf(municipality, level))
+        return FlatGeobufResponse(feed)
+    if response_format == response_formats.topojson:
+        # The topology of every geography in the country is too big to build within a request.
+        if municipality == None:
+            raise HTTPException(status_code=400, detail="TopoJSON responses are only available per municipality, add municipality.")
+        feed = await feed_cache.get_or_build(("geographies_topojson", municipality, level), lambda: build_geographies_topojson(municipality, level))
+        return TopoJSONResponse(feed)
+    feed = await feed_cache.get_or_build(("geographies", municipality, level), lambda: build_geographies(municipality, level))
+    return get_trusted_response(feed)
+
+async def build_geographies(municipality: str, level=default_level):
+    async with db_helper.get_async_resource(readonly=True) as (cur, _):
         try:
-            result = query_geographies(cur, municipality)
+            result = await query_geographies(cur, municipality, level)
             print(len(result), "geographies found")
             return generate_geographies_response(result=result)
         except Exception as e:
             print(e)
             raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
 
-def query_geographies(cur, municipality: str):
-    stmt = """
+query_geographies_stmt = prepared_statements.register("query_geographies", """
         SELECT geography_id, zone_id, geographies.name, description, 
-        effective_date, published_date, retire_date, published_retire_date, ST_AsGeoJSON(area) as geojson
+        effective_date, published_date, retire_date, published_retire_date, """ + area_geojson + """ as geojson
         FROM geographies
         JOIN zones
         USING(zone_id)
         WHERE NOW() >= published_date
         AND ((true = %s) or  municipality = %s)
-    """
-    cur.execute(stmt, (municipality == None, municipality))
+    """)
+
+async def query_geographies(cur, municipality: str, level=default_level):
+    await query_geographies_stmt.execute_async(cur, (*get_area_geojson_params(level), municipality == None, municipality))
     return cur.fetchall()
 
+async def build_geographies_topojson(municipality: str, level=default_level):
+    async with db_helper.get_async_resource(readonly=True) as (cur, _):
+        try:
+            result = await query_geographies(cur, municipality, level)
+        except Exception as e:
+            print(e)
+            raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
+    # Encoding the topology takes a while, it doesn't block the event loop.
+    return await run_in_threadpool(encode_geographies_topojson, result, level)
+
+def encode_geographies_topojson(result, level):
+    # The geographies of the feed without their geography_json are the properties of the geometries.
+    features = []
+    for geography in map(convert_geography_row_trusted, result):
+        features.append((geography.pop("geography_json")["features"][0]["geometry"], geography, geography["geography_id"]))
+    return to_json(topology.build_topology("geographies", features, scale=10 ** -levels[level][1]))
+
+async def build_geographies_flatgeobuf(municipality: str, level=default_level):
+    async with db_helper.get_async_resource(readonly=True) as (cur, _):
+        try:
+            await query_geographies_flatgeobuf_stmt.execute_async(cur, (level, municipality == None, municipality))
+            return cur.fetchone()["flatgeobuf"]
+        except Exception as e:
+            print(e)
+            raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
+
+# The published geographies as FlatGeobuf with a spatial index, built by the database. ST_Multi makes all
+# geometries MultiPolygons, a FlatGeobuf file has one geometry type.
+query_geographies_flatgeobuf_stmt = prepared_statements.register("query_geographies_flatgeobuf", """
+        SELECT ST_AsFlatGeobuf(geography_rows, true, 'geom') as flatgeobuf
+        FROM (
+            SELECT ST_Multi(""" + area_at_level + """) as geom,
+            geography_id::text, zone_id, geographies.name, description,
+            effective_date, published_date, retire_date, published_retire_date
+            FROM geographies
+            JOIN zones
+            USING(zone_id)
+            WHERE NOW() >= published_date
+            AND ((true = %s) or  municipality = %s)
+        ) as geography_rows
+    """)
+
+async def query_published_municipalities(cur):
+    stmt = """
+        SELECT DISTINCT municipality
+        FROM geographies
+        JOIN zones
+        USING(zone_id)
+        WHERE NOW() >= published_date
+    """
+    await cur.execute(stmt)
+    return [row["municipality"] for row in cur.fetchall()]
+
 def generate_geographies_response(result):
+    # Without validation the feed is cached serialised.
+    if not validate_rows:
+        return to_json({
+            "version": "1.2.0",
+            "updated": time.time_ns() // 1_000_000,
+            "geographies": list(map(convert_geography_row_trusted, result))
+        })
     return MDSGeographies(
         updated=time.time_ns() // 1_000_000,
         geographies=list(map(convert_geography_row, result))
@@ -1,4 +1,5 @@
 from db_helper import db_helper
+from trusted_rows import validate_rows, TrustedJSONResponse
 from fastapi import HTTPException
 import json
 from datetime import timezone, datetime
@@ -7,6 +8,7 @@ from pydantic import BaseModel
 from typing import Optional, List
 from geojson_pydantic import FeatureCollection, Feature, geometries
 from uuid import UUID
+from zones.zone_detail import area_geojson, get_area_geojson_params, default_level
 
 
 class Geography(BaseModel):
@@ -22,10 +24,10 @@ class MDSGeography(BaseModel):
     version: str = "1.2.0"
     geographies: Geography
 
-def get_geography(geography_uuid):
-    with db_helper.get_resource() as (cur, _):
+def get_geography(geography_uuid, level=default_level):
+    with db_helper.get_resource(readonly=True) as (cur, _):
         try:
-            result = query_geography(cur, geography_uuid)
+            result = query_geography(cur, geography_uuid, level)
             return generate_geography_response(result=result)
         except HTTPException as e:
             raise e
@@ -33,22 +35,27 @@ def get_geography(geography_uuid):
             print(e)
             raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
 
-def query_geography(cur, geography_uuid):
+def query_geography(cur, geography_uuid, level=default_level):
     stmt = """
         SELECT geography_id, zone_id, geographies.name, description, 
-        effective_date, published_date, retire_date, published_retire_date, ST_AsGeoJSON(area) as geojson
+        effective_date, published_date, retire_date, published_retire_date, """ + area_geojson + """ as geojson
         FROM geographies
         JOIN zones
         USING(zone_id)
         WHERE NOW() >= published_date AND geography_id = %s
     """
-    cur.execute(stmt, (str(geography_uuid),))
+    cur.execute(stmt, (*get_area_geojson_params(level), str(geography_uuid)))
     return cur.fetchone()
 
 def generate_geography_response(result):
     if result == None:
         raise HTTPException(status_code=404, detail="No geography found with this uuid.")
 
+    if not validate_rows:
+        return TrustedJSONResponse({
+            "version": "1.2.0",
+            "geographies": convert_geography_row_trusted(result)
+        })
     return MDSGeography(
         geographies=convert_geography_row(result)
     )
@@ -68,6 +75,22 @@ def convert_geography_row(row):
         retire_data=convert_datetime_to_millis(retire_date)
     )
 
+def convert_geography_row_trusted(row):
+    # Builds the same JSON as convert_geography_row without validating the row, see trusted_rows.
+    return {
+        "name": row["name"],
+        "description": row["description"],
+        "geography_id": row["geography_id"],
+        "geography_json": {
+            "type": "FeatureCollection",
+            "features": [{"type": "Feature", "geometry": json.loads(row["geojson"]), "properties": {}}]
+        },
+        "effective_date": convert_datetime_to_millis(row["effective_date"]),
+        "published_date": convert_datetime_to_millis(row["published_date"]),
+        # convert_geography_row passes the retire date as retire_data, which the model ignores.
+        "retire_date": None
+    }
+
 def convert_datetime_to_millis(dt):
     if dt == None:
         return None
@@ -1,12 +1,15 @@
 from sre_constants import OP_IGNORE
-from db_helper import db_helper
+from db_helper import db_helper, prepared_statements
 from fastapi import HTTPException
 import time
 from datetime import datetime, timezone
 
 from pydantic import BaseModel
 from typing import List
-from mds.policy import Policy, convert_policy_row
+from mds.policy import Policy, convert_policy_row, convert_policy_row_trusted
+from pydantic_core import to_json
+from trusted_rows import validate_rows, get_trusted_response
+from mds.feed_cache import feed_cache
 
 class PoliciesData(BaseModel):
     policies: List[Policy]
@@ -21,27 +24,30 @@ class MDSPolicies(BaseModel):
             datetime: lambda v: int(v.replace(tzinfo=timezone.utc).timestamp() * 1000),
         }
 
-def get_policies(municipality):
-    with db_helper.get_resource() as (cur, _):
+async def get_policies(municipality):
+    feed = await feed_cache.get_or_build(("policies", municipality), lambda: build_policies(municipality))
+    return get_trusted_response(feed)
+
+async def build_policies(municipality):
+    async with db_helper.get_async_resource(readonly=True) as (cur, _):
         try:
-            result = query_policies(cur, municipality)
+            result = await query_policies(cur, municipality)
             return generate_policies_response(result=result)
         except Exception as e:
             print(e)
             raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
 
 def get_policy(policy_uuid):
-    with db_helper.get_resource() as (cur, _):
+    with db_helper.get_resource(readonly=True) as (cur, _):
         try:
             result = query_policy(cur, policy_uuid)
-            return generate_policies_response(result=result)
+            return get_trusted_response(generate_policies_response(result=result))
         except Exception as e:
             print(e)
             raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
 
 
-def query_policies(cur, municipality):
-    stmt = """
+query_policies_stmt = prepared_statements.register("query_policies", """
         SELECT geography_id, zone_id, geographies.name, description, 
         effective_date, published_date, retire_date, published_retire_date, ST_AsGeoJSON(area) as geojson, affected_modalities
         FROM geographies
@@ -51,8 +57,10 @@ def query_policies(cur, municipality):
         AND ((true = %s) or  municipality = %s)
         AND geography_type = 'no_parking'
         ORDER BY effective_date
-    """
-    cur.execute(stmt, (municipality == None, municipality))
+    """)
+
+async def query_policies(cur, municipality):
+    await query_policies_stmt.execute_async(cur, (municipality == None, municipality))
     return cur.fetchall()
 
 def query_policy(cur, policy_id):
@@ -66,6 +74,13 @@ def query_policy(cur, policy_id):
     return cur.fetchall()
 
 def generate_policies_response(result):
+    # Without validation the feed is cached serialised.
+    if not validate_rows:
+        return to_json({
+            "version": "1.2.0",
+            "updated": time.time_ns() // 1_000_000,
+            "data": {"policies": list(map(convert_policy_row_trusted, result))}
+        })
     data = PoliciesData(policies = list(map(convert_policy_row, result)))
     return MDSPolicies(
         updated=time.time_ns() // 1_000_000,
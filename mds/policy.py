@@ -33,6 +33,35 @@ class Policy(BaseModel):
             datetime: lambda v: int(v.replace(tzinfo=timezone.utc).timestamp() * 1000),
         }
 
+def convert_policy_row_trusted(zone):
+    # Builds the same JSON as convert_policy_row (the route excludes None fields), without validating the row, see trusted_rows.
+    policy = {
+        "policy_id": zone["geography_id"],
+        "start_date": convert_datetime_to_millis(zone["effective_date"]),
+        "end_date": convert_datetime_to_millis(zone["retire_date"]),
+        "published_date": convert_datetime_to_millis(zone["published_date"]),
+        "name": "This policy disallow parking",
+        "description": "Parking is not allowed in this geography",
+        "rules": [{
+            "name": "Disallow parking",
+            "rule_id": uuid1(),
+            "rule_type": "count",
+            "geographies": [zone["geography_id"]],
+            "states": {"available": None, "reserved": None, "non_operational": None},
+            "rule_units": "devices",
+            "maximum": 0,
+            "vehicle_types": zone["affected_modalities"]
+        }]
+    }
+    if policy["end_date"] is None:
+        del policy["end_date"]
+    return policy
+
+def convert_datetime_to_millis(dt):
+    if dt is None:
+        return None
+    return int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
 def convert_policy_row(zone):
     return Policy(
         policy_id=zone["geography_id"],
@@ -36,16 +36,16 @@ class MDSStops(BaseModel):
     last_updated: int
     ttl: int = 30
 
-def get_stop(stop_uuid):
+async def get_stop(stop_uuid):
     last_updated = 0
     stops = []
-    with redis_helper.get_resource() as r:
-        stop = r.get("stop:" + str(stop_uuid))
+    async with redis_helper.get_async_resource() as r:
+        stop = await r.get("stop:" + str(stop_uuid))
         if stop == None:
             raise HTTPException(status_code=404, detail="stop_id doesn't exists.")
         stop_dict = json.loads(stop)
         stops.append(MDSStop(**stop_dict))
-        last_updated = r.get("stops_last_updated")
+        last_updated = await r.get("stops_last_updated")
 
     return MDSStops(
         last_updated=last_updated,
@@ -14,24 +14,35 @@ from typing import Dict
 from redis_helper import redis_helper
 from mds.stop import MDSStop, MDSStops, MDSStopData
 
-def get_stops(municipality):
+lua_script_to_get_stops = """
+local stops = redis.call('SMEMBERS', KEYS[1])
+local result = {}
+for index, stop_id in ipairs(stops) do
+result[index] = redis.call('GET', 'stop:' .. stop_id)
+end
+return result"""
+get_stops_script = None
+
+async def register_stops_script():
+    """Loads the script into redis, so that the first request can call it by its hash."""
+    global get_stops_script
+    async with redis_helper.get_async_resource() as r:
+        get_stops_script = r.register_script(lua_script_to_get_stops)
+        await r.script_load(lua_script_to_get_stops)
+
+async def get_stops(municipality):
     key = "all_stops"
     if municipality != None:
         key = "stops_per_municipality:" + municipality
 
     results = []
     last_updated = 0
-    with redis_helper.get_resource() as r:
-        lua_script_to_get_stops = """
-        local stops = redis.call('SMEMBERS', KEYS[1])
-        local result = {}
-        for index, stop_id in ipairs(stops) do
-        result[index] = redis.call('GET', 'stop:' .. stop_id)
-        end
-        return result"""
-        get_stops = r.register_script(lua_script_to_get_stops)
-        last_updated = r.get("stops_last_updated")
-        result = get_stops(keys=[key])
+    async with redis_helper.get_async_resource() as r:
+        get_stops = get_stops_script
+        if get_stops is None:
+            get_stops = r.register_script(lua_script_to_get_stops)
+        last_updated = await r.get("stops_last_updated")
+        result = await get_stops(keys=[key], client=r)
         for stop in result:
             stop_dict = json.loads(stop)
             results.append(MDSStop(**stop_dict))
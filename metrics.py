@@ -0,0 +1,138 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+
+class RequestStats:
+    """Work done on behalf of one request, filled by db_helper and redis_helper."""
+    __slots__ = ("db_queries", "db_time", "redis_commands", "redis_time")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.redis_commands = 0
+        self.redis_time = 0.0
+
+
+# Sync routes run in the threadpool with a copy of the context, they share the RequestStats object with the middleware.
+request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def record_db_query(duration):
+    stats = request_stats.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_time += duration
+
+
+def record_redis_commands(number_of_commands, duration):
+    stats = request_stats.get()
+    if stats is not None:
+        stats.redis_commands += number_of_commands
+        stats.redis_time += duration
+
+
+class Histogram:
+    def __init__(self, name, description, labelnames, buckets):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = sorted(buckets)
+        self._lock = threading.Lock()
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._values = {}
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(labels)
+            if values is None:
+                values = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            values[index] += 1
+            values[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(values)) for labels, values in self._values.items()]
+        for labels, values in sorted(items):
+            label_str = ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(self.labelnames, labels))
+            cumulative = 0
+            for bucket, count in zip(self.buckets + ["+Inf"], values[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_str},le="{bucket}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_str}}} {values[-1]}")
+            lines.append(f"{self.name}_count{{{label_str}}} {cumulative}")
+        return lines
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+latency_buckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+count_buckets = [0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+request_duration = Histogram("http_request_duration_seconds", "Request latency per route.",
+    ("method", "route", "status"), latency_buckets)
+response_size = Histogram("http_response_size_bytes", "Size of the response body per route.",
+    ("method", "route"), [100, 1000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000])
+request_db_queries = Histogram("http_request_db_queries", "Database queries issued per request.",
+    ("method", "route"), count_buckets)
+request_db_duration = Histogram("http_request_db_duration_seconds", "Time spent in database queries per request.",
+    ("method", "route"), latency_buckets)
+request_redis_commands = Histogram("http_request_redis_commands", "Redis commands issued per request.",
+    ("method", "route"), count_buckets)
+request_redis_duration = Histogram("http_request_redis_duration_seconds", "Time spent in redis commands per request.",
+    ("method", "route"), latency_buckets)
+
+histograms = [request_duration, response_size, request_db_queries, request_db_duration, request_redis_commands, request_redis_duration]
+
+
+def render_metrics():
+    lines = []
+    for histogram in histograms:
+        lines.extend(histogram.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Records latency, response size and the db and redis work per route."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            request_stats.reset(token)
+            # The route template instead of the path, so that ids don't end up in the labels.
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            labels = (scope["method"], route_path)
+            request_duration.observe(labels + (str(status),), duration)
+            response_size.observe(labels, size)
+            request_db_queries.observe(labels, stats.db_queries)
+            request_db_duration.observe(labels, stats.db_time)
+            request_redis_commands.observe(labels, stats.redis_commands)
+            request_redis_duration.observe(labels, stats.redis_time)
@@ -0,0 +1,60 @@
+-- Derives the phase of a zone in one place and stores it, with the moment it changes, on geographies.
+--
+-- The phase depends on the time, so it can't be a generated column. Instead a trigger stores the phase
+-- at the moment of writing in geographies.phase and the moment of the next transition in
+-- geographies.phase_until. Rows whose phase_until has passed are stale until they are refreshed, the
+-- queries evaluate zone_phase() for those rows only, all other rows are found through the index on phase.
+
+CREATE OR REPLACE FUNCTION zone_phase(
+    published_date TIMESTAMPTZ, effective_date TIMESTAMPTZ, propose_retirement BOOLEAN,
+    published_retire_date TIMESTAMPTZ, retire_date TIMESTAMPTZ, at TIMESTAMPTZ
+) RETURNS TEXT
+LANGUAGE SQL IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE
+        WHEN (published_date IS NULL) THEN 'concept'
+        WHEN (propose_retirement = true AND published_retire_date IS NULL) THEN 'retirement_concept'
+        WHEN at < published_date AND at < effective_date THEN 'committed_concept'
+        WHEN propose_retirement = true AND at < published_retire_date AND at < retire_date THEN 'committed_retirement_concept'
+        WHEN at > published_date AND at < effective_date THEN 'published'
+        WHEN propose_retirement = true AND at > published_retire_date AND at < retire_date THEN 'published_retirement'
+        WHEN (at > effective_date AND (at < retire_date OR retire_date IS NULL)) THEN 'active'
+        WHEN (at > retire_date) THEN 'archived'
+        ELSE 'error'
+    END
+$$;
+
+-- The phase only changes at one of the four dates, the first of them after at is the next transition.
+CREATE OR REPLACE FUNCTION zone_phase_until(
+    published_date TIMESTAMPTZ, effective_date TIMESTAMPTZ,
+    published_retire_date TIMESTAMPTZ, retire_date TIMESTAMPTZ, at TIMESTAMPTZ
+) RETURNS TIMESTAMPTZ
+LANGUAGE SQL IMMUTABLE PARALLEL SAFE AS $$
+    SELECT min(transition)
+    FROM unnest(ARRAY[published_date, effective_date, published_retire_date, retire_date]) AS transition
+    WHERE transition > at
+$$;
+
+ALTER TABLE geographies ADD COLUMN IF NOT EXISTS phase TEXT;
+ALTER TABLE geographies ADD COLUMN IF NOT EXISTS phase_until TIMESTAMPTZ;
+
+CREATE OR REPLACE FUNCTION set_zone_phase() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.phase := zone_phase(NEW.published_date, NEW.effective_date, NEW.propose_retirement,
+        NEW.published_retire_date, NEW.retire_date, now());
+    NEW.phase_until := zone_phase_until(NEW.published_date, NEW.effective_date,
+        NEW.published_retire_date, NEW.retire_date, now());
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS geographies_set_zone_phase ON geographies;
+CREATE TRIGGER geographies_set_zone_phase
+BEFORE INSERT OR UPDATE ON geographies
+FOR EACH ROW EXECUTE FUNCTION set_zone_phase();
+
+-- Backfill, the trigger sets the phase.
+UPDATE geographies SET phase = NULL;
+
+CREATE INDEX IF NOT EXISTS geographies_phase_idx ON geographies (phase);
+CREATE INDEX IF NOT EXISTS geographies_phase_until_idx ON geographies (phase_until);
@@ -0,0 +1,13 @@
+-- The bbox filter of the zone listings (zones.area && envelope) needs a GiST index on zones.area, create
+-- one unless the table already has one under another name.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_indexes
+        WHERE tablename = 'zones' AND indexdef ILIKE '%USING gist (area)%'
+    ) THEN
+        CREATE INDEX zones_area_idx ON zones USING GIST (area);
+    END IF;
+END
+$$;
@@ -0,0 +1,57 @@
+-- Stores simplified levels of detail of zones.area next to the full geometry, so that an overview map
+-- doesn't have to receive (and the api doesn't have to encode) every vertex of every zone.
+--
+-- A trigger simplifies the area whenever it's written, with ST_SimplifyPreserveTopology so that the
+-- simplified polygons stay valid. The tolerances (in degrees) should match the levels of zones/zone_detail.py.
+--
+-- Every zone is simplified on its own, so the levels are not topology-preserving across zones: a border
+-- that two zones share can be simplified differently in each of them, leaving small gaps and overlaps.
+-- ST_CoverageSimplify would simplify shared borders together, but it needs a coverage (polygons that
+-- don't overlap) and the zones of a municipality overlap, e.g. a concept and the zone it replaces.
+
+ALTER TABLE zones ADD COLUMN IF NOT EXISTS area_low GEOMETRY;
+ALTER TABLE zones ADD COLUMN IF NOT EXISTS area_medium GEOMETRY;
+ALTER TABLE zones ADD COLUMN IF NOT EXISTS area_high GEOMETRY;
+
+CREATE OR REPLACE FUNCTION set_zone_area_detail() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.area_low := ST_SimplifyPreserveTopology(NEW.area, 0.001);
+    NEW.area_medium := ST_SimplifyPreserveTopology(NEW.area, 0.0001);
+    NEW.area_high := ST_SimplifyPreserveTopology(NEW.area, 0.00001);
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS zones_set_zone_area_detail ON zones;
+CREATE TRIGGER zones_set_zone_area_detail
+BEFORE INSERT OR UPDATE OF area ON zones
+FOR EACH ROW EXECUTE FUNCTION set_zone_area_detail();
+
+-- Backfills the levels of existing zones a batch of zone_ids at a time, with a commit per batch so that
+-- the table isn't locked (and the WAL doesn't grow) for the whole table at once. It only writes the
+-- levels, so the trigger above and other triggers on the area don't fire. Run it after the migration,
+-- outside of a transaction:
+--
+--     CALL backfill_zone_area_detail();
+--
+-- Until a zone is backfilled its full area is returned at every level.
+CREATE OR REPLACE PROCEDURE backfill_zone_area_detail(batch_size int DEFAULT 1000)
+LANGUAGE plpgsql AS $$
+DECLARE
+    last_zone_id int := 0;
+    max_zone_id int;
+BEGIN
+    SELECT max(zone_id) INTO max_zone_id FROM zones;
+    WHILE last_zone_id < coalesce(max_zone_id, 0) LOOP
+        UPDATE zones
+        SET area_low = ST_SimplifyPreserveTopology(area, 0.001),
+        area_medium = ST_SimplifyPreserveTopology(area, 0.0001),
+        area_high = ST_SimplifyPreserveTopology(area, 0.00001)
+        WHERE zone_id > last_zone_id AND zone_id <= last_zone_id + batch_size
+        AND area_low IS NULL;
+        last_zone_id := last_zone_id + batch_size;
+        COMMIT;
+    END LOOP;
+END
+$$;
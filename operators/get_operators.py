@@ -3,7 +3,7 @@ from model.operator import Operator, OperatorResponse
 from fastapi import HTTPException
 
 def get_operators():
-    with db_helper.get_resource() as (cur, conn):
+    with db_helper.get_resource(readonly=True) as (cur, conn):
         try:
             query_rows = query_operators(cur)
             operators = convert_operators(query_rows)
@@ -1,27 +1,184 @@
 import redis
-from contextlib import contextmanager
+import redis.asyncio
+from contextlib import contextmanager, asynccontextmanager
+import threading
+import time
 import os
 
+from metrics import record_redis_commands
+
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error=True):
+        number_of_commands = len(self.command_stack)
+        start = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        finally:
+            record_redis_commands(number_of_commands, time.perf_counter() - start)
+
+
+class InstrumentedRedis(redis.Redis):
+    """Records the commands and the time spent in redis for the request metrics."""
+    def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            record_redis_commands(1, time.perf_counter() - start)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class InstrumentedAsyncPipeline(redis.asyncio.client.Pipeline):
+    async def execute(self, raise_on_error=True):
+        number_of_commands = len(self.command_stack)
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            record_redis_commands(number_of_commands, time.perf_counter() - start)
+
+
+class InstrumentedAsyncRedis(redis.asyncio.Redis):
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            record_redis_commands(1, time.perf_counter() - start)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
 
 class RedisHelper:
-    def __init__(self):
+    def __init__(self, max_connections=50, timeout=5.0, socket_timeout=5.0, socket_connect_timeout=2.0):
+        self.max_connections = max_connections
+        # Seconds to wait for a free connection when all max_connections are in use.
+        self.timeout = timeout
+        self.socket_timeout = socket_timeout
+        self.socket_connect_timeout = socket_connect_timeout
+        self._pool = None
         self._conn = None
+        self._async_pool = None
+        self._async_conn = None
+        self._lock = threading.Lock()
+        self._checkouts = 0
+        self._async_checkouts = 0
+        self._errors = 0
 
     def get_conn_str(self):
         # Initialisation
         conn_str = os.getenv("REDIS_URL", "localhost")
-
+        # REDIS_URL used to be a bare hostname, keep supporting that.
+        if "://" not in conn_str:
+            conn_str = f"redis://{conn_str}:6379/0"
         return conn_str
 
+    def get_pool_kwargs(self):
+        return {
+            "max_connections": self.max_connections,
+            "timeout": self.timeout,
+            "socket_timeout": self.socket_timeout,
+            "socket_connect_timeout": self.socket_connect_timeout,
+            "health_check_interval": 30,
+        }
+
     def initialize_connection(self):
-        conn_str = self.get_conn_str()
-        self._conn = redis.Redis(host=conn_str, port=6379, db=0)
+        with self._lock:
+            if self._conn is not None:
+                return
+            self._pool = redis.BlockingConnectionPool.from_url(self.get_conn_str(), **self.get_pool_kwargs())
+            self._conn = InstrumentedRedis(connection_pool=self._pool)
+
+    def initialize_async_connection(self):
+        # Runs on the event loop, no await between the check and the assignment.
+        if self._async_conn is not None:
+            return
+        self._async_pool = redis.asyncio.BlockingConnectionPool.from_url(self.get_conn_str(), **self.get_pool_kwargs())
+        self._async_conn = InstrumentedAsyncRedis(connection_pool=self._async_pool)
 
     @contextmanager
     def get_resource(self):
         if self._conn is None:
             self.initialize_connection()
-        yield self._conn
+        with self._lock:
+            self._checkouts += 1
+        try:
+            yield self._conn
+        except redis.RedisError:
+            with self._lock:
+                self._errors += 1
+            raise
+
+    @asynccontextmanager
+    async def get_async_resource(self):
+        if self._async_conn is None:
+            self.initialize_async_connection()
+        self._async_checkouts += 1
+        try:
+            yield self._async_conn
+        except redis.RedisError:
+            with self._lock:
+                self._errors += 1
+            raise
+
+    def open(self):
+        self.initialize_connection()
+        self._conn.ping()
+
+    async def open_async(self):
+        self.initialize_async_connection()
+        await self._async_conn.ping()
+
+    def get_pool_metrics(self):
+        sync_metrics = None
+        if self._pool is not None:
+            # The blocking pool fills its queue with None placeholders for connections that are not created yet.
+            idle = len([conn for conn in list(self._pool.pool.queue) if conn is not None])
+            created = len(self._pool._connections)
+            sync_metrics = {
+                "max_size": self.max_connections,
+                "created": created,
+                "idle": idle,
+                "in_use": created - idle,
+                "checkouts": self._checkouts,
+            }
+        async_metrics = None
+        if self._async_pool is not None:
+            idle = len(self._async_pool._available_connections)
+            in_use = len(self._async_pool._in_use_connections)
+            async_metrics = {
+                "max_size": self.max_connections,
+                "created": idle + in_use,
+                "idle": idle,
+                "in_use": in_use,
+                "checkouts": self._async_checkouts,
+            }
+        return {
+            "sync": sync_metrics,
+            "async": async_metrics,
+            "errors": self._errors,
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.disconnect()
+            self._pool = None
+            self._conn = None
+
+    async def close_async(self):
+        if self._async_pool is not None:
+            await self._async_pool.disconnect()
+            self._async_pool = None
+            self._async_conn = None
 
 
-redis_helper = RedisHelper()
\ No newline at end of file
+redis_helper = RedisHelper(
+    max_connections=int(os.getenv("REDIS_POOL_MAX_SIZE", 50)),
+    timeout=float(os.getenv("REDIS_POOL_TIMEOUT", 5)),
+    socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", 5)),
+    socket_connect_timeout=float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", 2)),
+)
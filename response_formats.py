@@ -0,0 +1,49 @@
+from fastapi.responses import Response
+
+from trusted_rows import TrustedJSONResponse
+
+geojson = "application/json"
+flatgeobuf = "application/flatgeobuf"
+topojson = "application/topo+json"
+
+# Media types that clients send for FlatGeobuf.
+flatgeobuf_media_types = {flatgeobuf, "application/vnd.flatgeobuf"}
+
+
+def get_response_format(accept: str | None):
+    """The format of the listings asked for in the Accept header, GeoJSON unless another format is accepted."""
+    if accept == None:
+        return geojson
+    media_types = {media_type.split(";")[0].strip().lower() for media_type in accept.split(",")}
+    if media_types & flatgeobuf_media_types:
+        return flatgeobuf
+    if topojson in media_types:
+        return topojson
+    return geojson
+
+
+def vary_on_accept(content, response: Response):
+    """Adds Vary: Accept to a listing whose format depends on the Accept header, so caches keep the formats apart.
+
+    response is the Response of the route, FastAPI adds its headers when content isn't a Response itself.
+    """
+    if isinstance(content, Response):
+        response = content
+    if "accept" not in response.headers.get("vary", "").lower():
+        response.headers.add_vary_header("Accept")
+    return content
+
+
+class FlatGeobufResponse(Response):
+    media_type = flatgeobuf
+
+    def __init__(self, content: bytes | None, **kwargs):
+        # ST_AsFlatGeobuf returns NULL without rows.
+        super().__init__(content=content or b"", headers={"Vary": "Accept"}, **kwargs)
+
+
+class TopoJSONResponse(TrustedJSONResponse):
+    media_type = topojson
+
+    def __init__(self, content, **kwargs):
+        super().__init__(content=content, headers={"Vary": "Accept"}, **kwargs)
@@ -7,7 +7,7 @@ class AvailableOperatorResponse(BaseModel):
     operators_with_service_area: list[str]
 
 def get_available_operators(municipalities):
-    with db_helper.get_resource() as (cur, conn):
+    with db_helper.get_resource(readonly=True) as (cur, conn):
         try:
             res = query_available_operators(cur, municipalities=municipalities)
             return AvailableOperatorResponse(operators_with_service_area=res["active_operators"])
@@ -11,7 +11,7 @@ from geojson_pydantic import FeatureCollection
 def get_service_area_delta(
     service_area_version_id: int
 ) -> ServiceAreaDelta:
-    with db_helper.get_resource() as (cur, conn):
+    with db_helper.get_resource(readonly=True) as (cur, conn):
         try:
             res = query_service_area_delta(cur, service_area_version_id)
             unchanged_geometries, added_geometries, removed_geometries = get_delta_geometries(cur, res["previous_geometries"], res["new_geometries"]) 
@@ -12,7 +12,7 @@ def get_service_area_history(
     start_date: date,
     end_date: date,
 ) -> list[str]:
-    with db_helper.get_resource() as (cur, conn):
+    with db_helper.get_resource(readonly=True) as (cur, conn):
         try:
             res = query_service_area_history(cur, municipalities=municipalities, operators=operators, start_date=start_date, end_date=end_date)
             response = []
@@ -4,15 +4,19 @@ import zones.zone as zone
 import zones.stop as stop
 
 from service_areas.service_area import ServiceArea
+from trusted_rows import validate_rows, get_trusted_response
 from geojson_pydantic import FeatureCollection
 
-def get_service_areas(municipalities, operators):
-    with db_helper.get_resource() as (cur, conn):
+async def get_service_areas(municipalities, operators):
+    async with db_helper.get_async_resource(readonly=True) as (cur, conn):
         try:
-            res = query_service_areas(cur, municipalities=municipalities, operators=operators)
+            res = await query_service_areas(cur, municipalities=municipalities, operators=operators)
             response = []
             for service_area in res:
-                geometries = query_service_area_geometries(cur, service_area["service_area_geometries"])
+                geometries = await query_service_area_geometries_async(cur, service_area["service_area_geometries"])
+                if not validate_rows:
+                    response.append(convert_service_area_row_trusted(service_area, geometries["feature_collection"]))
+                    continue
                 geometries_feature_collection = FeatureCollection.parse_obj(geometries["feature_collection"])
                 response.append(ServiceArea(
                     service_area_version_id=service_area["service_area_version_id"],
@@ -21,17 +25,27 @@ def get_service_areas(municipalities, operators):
                     valid_from=service_area["valid_from"],
                     geometries=geometries_feature_collection
                 ))
-            return response
+            return get_trusted_response(response)
         except HTTPException as e:
-            conn.rollback()
             raise e
         except Exception as e:
-            conn.rollback()
             print(e)
             raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
 
 
-def query_service_areas(cur, municipalities: list[str], operators: list[str]):
+def convert_service_area_row_trusted(service_area, feature_collection):
+    # Builds the same JSON as the ServiceArea model without validating the geometries, see trusted_rows.
+    return {
+        "service_area_version_id": service_area["service_area_version_id"],
+        "municipality": service_area["municipality"],
+        "operator": service_area["operator"],
+        "valid_from": service_area["valid_from"],
+        "valid_until": None,
+        "geometries": feature_collection
+    }
+
+
+async def query_service_areas(cur, municipalities: list[str], operators: list[str]):
 
     stmt = """
         SELECT service_area_version_id, municipality, operator, valid_from, service_area_geometries  
@@ -39,11 +53,21 @@ def query_service_areas(cur, municipalities: list[str], operators: list[str]):
         WHERE municipality = ANY(%s) AND operator = ANY(%s)
         AND valid_until IS NULL;
     """
-    cur.execute(stmt, (municipalities, operators))
+    await cur.execute(stmt, (municipalities, operators))
     return cur.fetchall()
 
+def get_query_service_area_geometries(geom_hashes: list[str]):
+    return query_service_area_geometries_stmt, (geom_hashes,)
+
 def query_service_area_geometries(cur, geom_hashes: list[str]):
-    stmt = """
+    cur.execute(*get_query_service_area_geometries(geom_hashes))
+    return cur.fetchone()
+
+async def query_service_area_geometries_async(cur, geom_hashes: list[str]):
+    await cur.execute(*get_query_service_area_geometries(geom_hashes))
+    return cur.fetchone()
+
+query_service_area_geometries_stmt = """
         SELECT json_build_object(
                 'type', 'FeatureCollection',
                 'features', json_agg(ST_AsGeoJSON(q1.*)::json)
@@ -55,7 +79,5 @@ def query_service_area_geometries(cur, geom_hashes: list[str]):
             WHERE geom_hash = ANY(%s)
         ) as q1;
     """
-    cur.execute(stmt, (geom_hashes,))
-    return cur.fetchone()
 
 
@@ -0,0 +1,21 @@
+import sys
+import time
+
+# Packages that only the export and import routes need, they should not be loaded when a worker starts.
+lazy_packages = ["simplekml", "fudgeo", "shapely", "fastkml", "numpy"]
+
+
+def get_startup_report(import_started: float):
+    loaded_lazy_packages = [package for package in lazy_packages if package in sys.modules]
+    return {
+        "import_seconds": time.perf_counter() - import_started,
+        "modules_loaded": len(sys.modules),
+        "lazy_packages_loaded": loaded_lazy_packages,
+    }
+
+
+def format_startup_report(report):
+    message = f"Startup: app imported in {report['import_seconds']:.2f}s, {report['modules_loaded']} modules loaded"
+    if report["lazy_packages_loaded"]:
+        message += f", loaded at startup although only needed for exports: {', '.join(report['lazy_packages_loaded'])}"
+    return message
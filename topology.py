@@ -0,0 +1,125 @@
+"""
+Encodes polygons as TopoJSON (https://github.com/topojson/topojson-specification). Borders that adjacent
+polygons share are stored once as an arc, the coordinates are quantised to integers on a grid and delta
+encoded.
+"""
+
+
+def build_topology(object_name: str, features: list[tuple[dict, dict, object]], scale: float):
+    """Builds a topology of (geometry, properties, id) features with a single GeometryCollection object.
+
+    The coordinates are quantised to multiples of scale degrees, only coordinates that are equal after
+    quantisation are shared.
+    """
+    bbox = get_bbox(geometry for geometry, _, _ in features)
+    translate = (bbox[0], bbox[1]) if bbox else (0, 0)
+    quantised = [quantise_polygons(geometry, translate, scale) for geometry, _, _ in features]
+    junctions = find_junctions(ring for polygons in quantised for polygon in polygons for ring in polygon)
+
+    arcs = []
+    arc_indexes = {}
+    geometries = []
+    for (geometry, properties, feature_id), polygons in zip(features, quantised):
+        polygon_arcs = [[add_ring(ring, junctions, arcs, arc_indexes) for ring in polygon] for polygon in polygons]
+        topology_geometry = {"properties": properties, "id": feature_id}
+        if geometry["type"] == "Polygon":
+            topology_geometry.update(type="Polygon", arcs=polygon_arcs[0])
+        else:
+            topology_geometry.update(type="MultiPolygon", arcs=polygon_arcs)
+        geometries.append(topology_geometry)
+
+    return {
+        "type": "Topology",
+        "bbox": bbox,
+        "transform": {"scale": [scale, scale], "translate": list(translate)},
+        "objects": {object_name: {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": [delta_encode(arc) for arc in arcs],
+    }
+
+
+def get_polygons(geometry):
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    return geometry["coordinates"]
+
+
+def get_bbox(geometries):
+    xs = []
+    ys = []
+    for geometry in geometries:
+        for polygon in get_polygons(geometry):
+            for ring in polygon:
+                xs.extend(x for x, _ in ring)
+                ys.extend(y for _, y in ring)
+    if not xs:
+        return None
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def quantise_polygons(geometry, translate, scale):
+    # Rings without the closing point and without points that became equal to their predecessor.
+    tx, ty = translate
+    polygons = []
+    for polygon in get_polygons(geometry):
+        rings = []
+        for ring in polygon:
+            points = []
+            for x, y in ring[:-1]:
+                point = (round((x - tx) / scale), round((y - ty) / scale))
+                if not points or points[-1] != point:
+                    points.append(point)
+            if len(points) > 1 and points[0] == points[-1]:
+                points.pop()
+            rings.append(points)
+        polygons.append(rings)
+    return polygons
+
+
+def find_junctions(rings):
+    """The points where rings meet or part, a point is a junction when it's reached from different neighbours."""
+    neighbours = {}
+    junctions = set()
+    for ring in rings:
+        n = len(ring)
+        for i, point in enumerate(ring):
+            pair = (ring[i - 1], ring[(i + 1) % n])
+            seen = neighbours.setdefault(point, pair)
+            if seen != pair and seen != (pair[1], pair[0]):
+                junctions.add(point)
+    return junctions
+
+
+def add_ring(ring, junctions, arcs, arc_indexes):
+    """Cuts the ring into arcs at its junctions, returns the indexes of its arcs (~index for reversed arcs)."""
+    starts = [i for i, point in enumerate(ring) if point in junctions]
+    if not starts:
+        # A ring that no other ring touches is a single arc, it starts at its smallest point so that
+        # equal rings share the arc.
+        start = ring.index(min(ring)) if ring else 0
+        ring = ring[start:] + ring[:start]
+        return [add_arc(ring + ring[:1], arcs, arc_indexes)]
+    ring = ring[starts[0]:] + ring[:starts[0]]
+    starts = [i - starts[0] for i in starts] + [len(ring)]
+    closed = ring + ring[:1]
+    return [add_arc(closed[start:end + 1], arcs, arc_indexes) for start, end in zip(starts, starts[1:])]
+
+
+def add_arc(points, arcs, arc_indexes):
+    key = tuple(points)
+    if key in arc_indexes:
+        return arc_indexes[key]
+    reversed_key = key[::-1]
+    if reversed_key in arc_indexes:
+        return ~arc_indexes[reversed_key]
+    arc_indexes[key] = len(arcs)
+    arcs.append(points)
+    return arc_indexes[key]
+
+
+def delta_encode(points):
+    encoded = []
+    previous_x, previous_y = 0, 0
+    for x, y in points:
+        encoded.append([x - previous_x, y - previous_y])
+        previous_x, previous_y = x, y
+    return encoded
@@ -0,0 +1,27 @@
+import os
+
+from fastapi.responses import Response
+from pydantic_core import to_json
+
+# Rows from our own database don't need to be validated again by the response models, the hot read
+# endpoints build the response from the rows directly. Set VALIDATE_DB_ROWS=true to build (and validate)
+# the response models again, e.g. to debug a response that doesn't look right.
+validate_rows = os.getenv("VALIDATE_DB_ROWS", "false").lower() == "true"
+
+
+class TrustedJSONResponse(Response):
+    """Serialises dicts and lists built from trusted rows, datetimes and UUIDs are encoded like pydantic does."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        # Already serialised, e.g. a cached feed.
+        if isinstance(content, bytes):
+            return content
+        return to_json(content)
+
+
+def get_trusted_response(content):
+    # With validate_rows the content is a model (or a list of them), FastAPI validates and serialises it.
+    if validate_rows:
+        return content
+    return TrustedJSONResponse(content)
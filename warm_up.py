@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from db_helper import db_helper, prepared_statements
+from redis_helper import redis_helper
+from mds import geographies, policies, stops
+from mds.feed_cache import feed_cache
+from zones.zone_detail import default_level
+
+
+class WarmUpState:
+    def __init__(self):
+        self.status = "starting"
+        self.steps = {}
+        self.errors = []
+        self.started_at = None
+        self.duration = None
+
+    @property
+    def is_ready(self):
+        return self.status == "ready"
+
+    def as_dict(self):
+        return {
+            "status": self.status,
+            "steps": self.steps,
+            "errors": self.errors,
+            "duration_seconds": self.duration,
+        }
+
+
+warm_up_state = WarmUpState()
+
+
+async def run_step(name, step):
+    start = time.perf_counter()
+    try:
+        errors = await step()
+        warm_up_state.errors.extend(f"{name}: {error}" for error in errors or [])
+        warm_up_state.steps[name] = round(time.perf_counter() - start, 3)
+    except Exception as e:
+        logging.exception(f"Warm-up step {name} failed")
+        warm_up_state.errors.append(f"{name}: {e}")
+        raise
+
+
+async def open_db_pools():
+    await run_in_threadpool(db_helper.open_connection_pools)
+    await db_helper.open_async_connection_pools()
+
+
+async def open_redis_pools():
+    await run_in_threadpool(redis_helper.open)
+    await redis_helper.open_async()
+
+
+async def prepare_statements():
+    statements = list(prepared_statements.statements.values())
+    errors = await run_in_threadpool(db_helper.prepare_statements, statements)
+    return errors + await db_helper.prepare_statements_async(statements)
+
+
+async def prebuild_mds_feeds():
+    async with db_helper.get_async_resource(readonly=True) as (cur, _):
+        municipalities = await geographies.query_published_municipalities(cur)
+    # Few at a time, the api is already accepting connections for the health check.
+    semaphore = asyncio.Semaphore(max(1, db_helper.min_size))
+
+    async def prebuild(municipality):
+        async with semaphore:
+            await feed_cache.prebuild(("geographies", municipality, default_level), lambda: geographies.build_geographies(municipality))
+            await feed_cache.prebuild(("policies", municipality), lambda: policies.build_policies(municipality))
+
+    await asyncio.gather(*(prebuild(municipality) for municipality in [None] + municipalities))
+
+
+async def warm_up():
+    """Opens the pools and fills the caches before the worker reports ready on /ready."""
+    warm_up_state.status = "warming_up"
+    warm_up_state.errors = []
+    warm_up_state.started_at = time.perf_counter()
+    try:
+        await run_step("open_db_pools", open_db_pools)
+        await run_step("open_redis_pools", open_redis_pools)
+        await run_step("prepare_statements", prepare_statements)
+        await run_step("register_stops_script", stops.register_stops_script)
+        await run_step("prebuild_mds_feeds", prebuild_mds_feeds)
+        warm_up_state.status = "ready"
+    except Exception:
+        warm_up_state.status = "failed"
+    warm_up_state.duration = round(time.perf_counter() - warm_up_state.started_at, 3)
+    return warm_up_state.is_ready
+
+
+async def warm_up_until_ready(retry_interval=10):
+    # A database or redis that is not reachable yet (e.g. during a deploy) shouldn't stop the worker from starting.
+    while not await warm_up():
+        logging.warning(f"Warm-up failed, retrying in {retry_interval} seconds")
+        await asyncio.sleep(retry_interval)
+    logging.info(f"Warm-up finished in {warm_up_state.duration}s: {warm_up_state.steps}")
+
+
+warm_up_timeout = float(os.getenv("WARM_UP_TIMEOUT", 60))
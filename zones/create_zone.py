@@ -1,9 +1,13 @@
 
 from db_helper import db_helper
 import json
+import os
+from psycopg2.extras import execute_values
 from fastapi import HTTPException
 from zones.zone import Zone, GeographyType
 from modalities import Modality
+from zones.public_zones_cache import public_zones_cache
+from mds.feed_cache import feed_cache
 
 def create_single_zone(cur, zone: Zone, user):
     check_if_user_has_access(zone.municipality, user.acl)
@@ -36,37 +40,119 @@ def derive_affected_modalities(zone: Zone):
     return affected_modalities
     
 def create_zones(zones, user):
-    result = []
+    """Creates the zones with a few statements for all zones, zones that can't be created are returned as errors."""
     errors = []
+    def add_error(zone, e: HTTPException):
+        errors.append({
+            "geography_id": zone.geography_id,
+            "error": "geography_id_create_error",
+            "detail": str(e)
+        })
+
+    to_create = []
+    for zone in zones:
+        try:
+            check_if_user_has_access(zone.municipality, user.acl)
+            if zone.geography_type == "stop" and zone.stop is None:
+                raise HTTPException(status_code=422, detail="Object that describes details of stop missing.")
+            to_create.append(zone)
+        except HTTPException as e:
+            add_error(zone, e)
+
     with db_helper.get_resource() as (cur, conn):
-        for zone in zones:
-            try:
-                result.append(create_single_zone(cur, zone, user))    
-            except HTTPException as e:
-                errors.append({
-                    "geography_id": zone.geography_id,
-                    "error": "geography_id_create_error",
-                    "detail": str(e)
-                })
-            except Exception as e:
-                print("It's going wrong here")
-                conn.rollback()
-                print(e)
-                raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
         try:
+            result = []
+            for zone, is_valid in zip(to_create, check_if_zones_are_valid(cur, to_create)):
+                if is_valid:
+                    result.append(zone)
+                else:
+                    add_error(zone, HTTPException(status_code=403, detail="Zone not completely within borders municipality."))
+            create_zones_query(cur, result, user.email)
             conn.commit()
         except Exception as e:
-            print(e)
             conn.rollback()
+            print(e)
             raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
 
+    if result:
+        public_zones_cache.invalidate([zone.municipality for zone in result])
+        feed_cache.invalidate()
     return result, errors
 
+def check_if_zones_are_valid(cur, zones: list[Zone]):
+    # Like check_if_zone_is_valid, the border of every municipality is buffered once for all its zones.
+    if len(zones) == 0:
+        return []
+    stmt = """
+        WITH borders AS (
+            SELECT DISTINCT ON (municipality) municipality, st_buffer(area, 0.02) as border
+            FROM zones
+            WHERE municipality = ANY(%s)
+            AND zone_type = 'municipality'
+        )
+        SELECT COALESCE(ST_WITHIN(ST_SetSRID(ST_MakeValid(ST_GeomFromGeoJSON(candidates.geometry)), 4326), borders.border), false) as is_valid
+        FROM unnest(%s::text[], %s::text[]) WITH ORDINALITY as candidates(geometry, municipality, index)
+        LEFT JOIN borders
+        USING (municipality)
+        ORDER BY candidates.index
+    """
+    municipalities = [zone.municipality for zone in zones]
+    cur.execute(stmt, (list(set(municipalities)), [zone.area.geometry.model_dump_json() for zone in zones], municipalities))
+    return [row["is_valid"] for row in cur.fetchall()]
+
+def create_zones_query(cur, zones: list[Zone], email: str):
+    # One multi-row INSERT per table, the zone_ids are taken from the sequence first so that the geographies can refer to them.
+    if len(zones) == 0:
+        return
+    cur.execute("SELECT nextval(pg_get_serial_sequence('zones', 'zone_id')) as zone_id FROM generate_series(1, %s)", (len(zones),))
+    for zone, row in zip(zones, cur.fetchall()):
+        zone.zone_id = row["zone_id"]
+        zone.affected_modalities = derive_affected_modalities(zone)
+
+    execute_values(cur, """
+        INSERT INTO zones
+        (zone_id, area, name, municipality, zone_type)
+        VALUES %s
+    """, [(zone.zone_id, zone.area.geometry.model_dump_json(), zone.name, zone.municipality) for zone in zones],
+        template="(%s, ST_SetSRID(ST_MakeValid(ST_GeomFromGeoJSON(%s)), 4326), %s, %s, 'custom')", page_size=bulk_page_size)
+
+    # created_at and modified_at are NOW(), the start of the transaction, for every row.
+    rows = execute_values(cur, """
+        INSERT INTO geographies
+        (geography_id, internal_id, zone_id, name, description, geography_type, effective_date, published_date, prev_geographies, created_at, modified_at, created_by, last_modified_by, affected_modalities)
+        VALUES %s
+        RETURNING created_at, modified_at
+    """, [(str(zone.geography_id), zone.internal_id, zone.zone_id, zone.name, zone.description, zone.geography_type,
+        zone.effective_date, zone.published_date, zone.prev_geographies, email, email, zone.affected_modalities) for zone in zones],
+        template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW(), %s, %s, %s)", page_size=bulk_page_size, fetch=True)
+    for zone in zones:
+        zone.created_at = rows[0]["created_at"]
+        zone.modified_at = rows[0]["modified_at"]
+        zone.last_modified_by = email
+        zone.created_by = email
+        zone.phase = "concept"
+
+    create_stops(cur, [zone for zone in zones if zone.geography_type == "stop"])
+
+def create_stops(cur, stop_zones: list[Zone]):
+    # create_stop for many zones with multi-row INSERTs.
+    if len(stop_zones) == 0:
+        return
+    execute_values(cur, """
+        INSERT INTO stops
+        (stop_id, name, location, status, capacity, geography_id, is_virtual)
+        VALUES %s
+    """, [(str(zone.stop.stop_id), zone.name, zone.stop.location.geometry.model_dump_json(), json.dumps(zone.stop.status),
+        json.dumps(zone.stop.capacity), str(zone.geography_id), zone.stop.is_virtual) for zone in stop_zones],
+        template="(%s, %s, ST_SetSRID(ST_GeomFromGeoJSON(%s), 4326), %s, %s, %s, %s)", page_size=bulk_page_size)
+
 def create_zone(zone, user):
     with db_helper.get_resource() as (cur, conn):
         try:
             zone = create_single_zone(cur, zone, user)
             conn.commit()
+            public_zones_cache.invalidate([zone.municipality])
+            feed_cache.invalidate()
             return zone
         except HTTPException as e:
             conn.rollback()
@@ -150,4 +236,6 @@ def check_if_user_has_access(municipality, acl):
     if municipality in acl.municipalities:
         return True
     raise HTTPException(status_code=403, detail="User is not allowed to create or modify zones in this municipality, check ACL.")
-    
+
+
+bulk_page_size = int(os.getenv("BULK_PAGE_SIZE", 1000))
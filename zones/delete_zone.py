@@ -3,6 +3,8 @@ from db_helper import db_helper
 import traceback
 import zones.get_zones as get_zones
 from uuid import UUID
+from zones.public_zones_cache import public_zones_cache
+from mds.feed_cache import feed_cache
 
 from pydantic import BaseModel
 
@@ -12,9 +14,10 @@ class DeleteZonesRequest(BaseModel):
 def delete_zones(request: DeleteZonesRequest, user):
     with db_helper.get_resource() as (cur, conn):
         try:
-            for geography_id in request.geography_ids:
-                delete_single_zone(cur, geography_id, user)
+            municipalities = delete_many_zones(cur, request.geography_ids, user)
             conn.commit()
+            public_zones_cache.invalidate(municipalities)
+            feed_cache.invalidate()
             return
         except HTTPException as e:
             conn.rollback()
@@ -28,8 +31,10 @@ def delete_zones(request: DeleteZonesRequest, user):
 def delete_zone(geography_uuid, user):
     with db_helper.get_resource() as (cur, conn):
         try:
-            delete_single_zone(cur, geography_uuid, user)
+            municipality = delete_single_zone(cur, geography_uuid, user)
             conn.commit()
+            public_zones_cache.invalidate([municipality])
+            feed_cache.invalidate()
             return
         except HTTPException as e:
             conn.rollback()
@@ -49,6 +54,22 @@ def delete_single_zone(cur, geography_uuid: UUID, user):
         delete_geography(cur, geography_uuid=geography_uuid)
     else:
         raise HTTPException(status_code=400, detail=f"It's not possible to delete a zone that is in another phase then concept, geography_id: {geography_uuid}")
+    return zone.municipality
+
+def delete_many_zones(cur, geography_uuids: list[UUID], user):
+    # All zones are loaded with one query and checked in memory, after that they are deleted with three statements.
+    geography_uuids = list(dict.fromkeys(geography_uuids))
+    zones = {zone.geography_id: zone for zone in get_zones.get_zones_by_ids(cur, geography_uuids)}
+    for geography_uuid in geography_uuids:
+        zone = zones.get(geography_uuid)
+        if zone == None:
+            raise HTTPException(status_code=404, detail=f"Geography {geography_uuid} doesn't exist.")
+        check_if_user_has_access(municipality=zone.municipality, acl=user.acl)
+        if zone.phase != "concept":
+            raise HTTPException(status_code=400, detail=f"It's not possible to delete a zone that is in another phase then concept, geography_id: {geography_uuid}")
+    delete_stops_of_geographies(cur, geography_uuids)
+    delete_geographies(cur, geography_uuids)
+    return [zone.municipality for zone in zones.values()]
 
 def delete_stops(cur, geography_uuid):
     stmt = """
@@ -76,6 +97,34 @@ def delete_geography(cur, geography_uuid):
     cur.execute(stmt2, (zone_id,))
     return
 
+def delete_stops_of_geographies(cur, geography_uuids: list[UUID]):
+    if len(geography_uuids) == 0:
+        return
+    stmt = """
+        DELETE
+        FROM stops
+        WHERE geography_id = ANY(%s)
+    """
+    cur.execute(stmt, (geography_uuids,))
+
+def delete_geographies(cur, geography_uuids: list[UUID]):
+    if len(geography_uuids) == 0:
+        return
+    stmt = """
+        DELETE 
+        FROM geographies
+        WHERE geography_id = ANY(%s)
+        RETURNING zone_id
+    """
+    cur.execute(stmt, (geography_uuids,))
+    zone_ids = [row["zone_id"] for row in cur.fetchall()]
+    stmt2 = """
+        DELETE 
+        FROM zones
+        WHERE zone_id = ANY(%s)
+    """
+    cur.execute(stmt2, (zone_ids,))
+
 def check_if_user_has_access(municipality, acl):
     if acl.is_admin:
         return True
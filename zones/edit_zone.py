@@ -1,20 +1,22 @@
 from fastapi import HTTPException
 from db_helper import db_helper
 from mds import geography
-from zones.create_zone import check_if_zone_is_valid, create_stop
-from zones.delete_zone import delete_stops
-from zones.get_zones import get_zone_by_id
+from zones.create_zone import check_if_zone_is_valid, create_stop, create_stops, bulk_page_size
+from zones.delete_zone import delete_stops, delete_stops_of_geographies
+from zones.get_zones import get_zone_by_id, get_zones_by_ids
 from zones.zone import Zone, EditZone, BulkEditZone, convert_to_edit_zone, GeographyType
 from zones.stop import Stop, PointFeatureModel
 from authorization import access_control
 from uuid import uuid1
 import json
 import traceback
+from psycopg2.extras import execute_values
 from pydantic import BaseModel, Field
 from fastapi import HTTPException
 from uuid import UUID
-import shapely
 from modalities import Modality
+from zones.public_zones_cache import public_zones_cache
+from mds.feed_cache import feed_cache
 
 class BulkEditZonesRequest(BaseModel):
     geography_ids: list[UUID]
@@ -24,12 +26,10 @@ class BulkEditZonesRequest(BaseModel):
 def edit_zones(edit_zone_request: BulkEditZonesRequest,  user: access_control.User):
     with db_helper.get_resource() as (cur, conn):
         try:
-            merged_zones = []
-            for geography_id in edit_zone_request.geography_ids:
-                new_zone = convert_to_edit_zone(edit_zone_request.bulk_edit, geography_id=geography_id)
-                merged_zone = edit_single_zone(cur, new_zone=new_zone, user=user)
-                merged_zones.append(merged_zone)
+            merged_zones = edit_many_zones(cur, edit_zone_request, user)
             conn.commit()
+            public_zones_cache.invalidate([zone.municipality for zone in merged_zones])
+            feed_cache.invalidate()
             return merged_zones
         except HTTPException as e:
             conn.rollback()
@@ -45,6 +45,8 @@ def edit_zone(new_zone: EditZone, user: access_control.User):
         try:
             merged_zone = edit_single_zone(cur, new_zone=new_zone, user=user)
             conn.commit()
+            public_zones_cache.invalidate([merged_zone.municipality])
+            feed_cache.invalidate()
             return merged_zone
         except HTTPException as e:
             conn.rollback()
@@ -59,6 +61,32 @@ def edit_single_zone(cur, new_zone: EditZone, user: access_control.User):
     old_zone = get_zone_by_id(cur, new_zone.geography_id)
     return edit_old_zone(cur, old_zone, new_zone, user)
 
+def edit_many_zones(cur, edit_zone_request: BulkEditZonesRequest, user: access_control.User):
+    # All zones are loaded with one query and merged in memory, the changes are written with a few statements
+    # for all zones. A bulk edit doesn't change the area or the name, so the zones table is left alone.
+    geography_ids = list(dict.fromkeys(edit_zone_request.geography_ids))
+    old_zones = {zone.geography_id: zone for zone in get_zones_by_ids(cur, geography_ids)}
+    merged_zones = []
+    new_stop_zones = []
+    for geography_id in geography_ids:
+        old_zone = old_zones.get(geography_id)
+        if old_zone == None:
+            raise HTTPException(status_code=404, detail=f"Geography {geography_id} doesn't exist.")
+        new_zone = convert_to_edit_zone(edit_zone_request.bulk_edit, geography_id=geography_id)
+        check_if_edit_is_allowed(old_zone=old_zone, new_zone=new_zone)
+        check_if_user_has_access(old_zone.municipality, user.acl)
+        merged_zone, is_new_geography_type = merge_zone(old_zone, new_zone, user.email)
+        merged_zones.append(merged_zone)
+        if merged_zone.geography_type == "stop" and is_new_geography_type:
+            new_stop_zones.append(merged_zone)
+
+    update_geography_records(cur, merged_zones)
+    create_stops(cur, new_stop_zones)
+    new_stop_ids = {zone.geography_id for zone in new_stop_zones}
+    update_stops(cur, [zone for zone in merged_zones if zone.geography_type == "stop" and zone.geography_id not in new_stop_ids])
+    delete_stops_of_geographies(cur, [zone.geography_id for zone in merged_zones if zone.geography_type != "stop"])
+    return merged_zones
+
 def edit_old_zone(cur, old_zone, new_zone: EditZone, user: access_control.User):
     check_if_edit_is_allowed(old_zone=old_zone, new_zone=new_zone)
     check_if_user_has_access(old_zone.municipality, user.acl)
@@ -104,6 +132,49 @@ def derive_affected_modalities_edit(old_zone: Zone, new_zone: EditZone):
     return affected_modalities
 
 def update_zone(cur, old_zone: Zone, new_zone: EditZone, email: str):
+    # Only the tables with changed columns are written, the border is only checked again for a changed area.
+    old_values = get_stored_values(old_zone)
+    had_stop = old_zone.stop != None
+    last_modified_by = old_zone.last_modified_by
+    merged_zone, is_new_geography_type = merge_zone(old_zone, new_zone, email)
+    new_values = get_stored_values(merged_zone)
+    if new_values == old_values:
+        merged_zone.last_modified_by = last_modified_by
+        return merged_zone
+
+    if new_values["area"] != old_values["area"]:
+        update_classic_zone(cur, merged_zone)
+    elif new_values["zone_name"] != old_values["zone_name"]:
+        update_zone_name(cur, merged_zone)
+    if new_values["geography"] != old_values["geography"]:
+        merged_zone.modified_at = update_geography_record(cur, merged_zone)
+    else:
+        # Still a change of the zone.
+        merged_zone.modified_at = touch_geography_record(cur, merged_zone)
+
+    if merged_zone.geography_type == "stop" and is_new_geography_type:
+        create_stop(cur, merged_zone)
+    elif merged_zone.geography_type == "stop":
+        if new_values["stop"] != old_values["stop"]:
+            update_stop(cur, merged_zone)
+    elif had_stop:
+        delete_stops(cur, merged_zone.geography_id)
+    return merged_zone
+
+def get_stored_values(zone: Zone):
+    # The values of the zone that update_classic_zone (or update_zone_name), update_geography_record and update_stop write.
+    stop = None
+    if zone.stop:
+        stop = (zone.stop.location.geometry.model_dump_json(), zone.stop.status, zone.stop.capacity, zone.stop.is_virtual)
+    return {
+        "area": zone.area.geometry.model_dump_json(),
+        "zone_name": zone.name,
+        "geography": (zone.name, zone.description, zone.geography_type, zone.internal_id, list(zone.affected_modalities or [])),
+        "stop": (zone.name, stop),
+    }
+
+def merge_zone(old_zone: Zone, new_zone: EditZone, email: str):
+    # Applies the changes to old_zone in memory, returns the merged zone and whether it became a stop.
     is_new_geography_type = new_zone.geography_type and new_zone.geography_type == "stop" and old_zone.geography_type != "stop"
     if (is_new_geography_type and (new_zone.stop == None or new_zone.stop.is_virtual == None or
           new_zone.stop.status == None or new_zone.stop.capacity == None)):
@@ -127,6 +198,8 @@ def update_zone(cur, old_zone: Zone, new_zone: EditZone, email: str):
     if new_zone.stop and not old_zone.stop:
         location = new_zone.stop.location
         if not location:
+            # shapely (and numpy) are only needed here, importing them at startup is slow.
+            import shapely
             point = shapely.centroid(
                     shapely.from_geojson(
                         old_zone.area.geometry.model_dump_json()
@@ -155,17 +228,9 @@ def update_zone(cur, old_zone: Zone, new_zone: EditZone, email: str):
 
     merged_zone = old_zone
     merged_zone.last_modified_by = email
-
-    merged_zone.modified_at = update_geography(cur, merged_zone)
-    update_classic_zone(cur, merged_zone)
-    if merged_zone.geography_type == "stop" and is_new_geography_type:
-        create_stop(cur, merged_zone)
-    elif merged_zone.geography_type == "stop":
-        update_stop(cur, merged_zone)
-    else: 
+    if merged_zone.geography_type != "stop":
         merged_zone.stop = None
-        delete_stops(cur, merged_zone.geography_id)
-    return merged_zone
+    return merged_zone, is_new_geography_type
 
 def update_stop(cur, merged_zone: Zone):
     stop = merged_zone.stop
@@ -185,6 +250,25 @@ def update_stop(cur, merged_zone: Zone):
         raise HTTPException(status_code=404, detail="No stop with this stop_id exists.")
 
 
+def update_stops(cur, stop_zones: list[Zone]):
+    # update_stop for many zones with one UPDATE per page of zones.
+    if len(stop_zones) == 0:
+        return
+    rows = execute_values(cur, """
+        UPDATE stops
+        SET name = changes.name,
+        location = ST_SetSRID(ST_GeomFromGeoJSON(changes.location), 4326),
+        status = changes.status::jsonb,
+        capacity = changes.capacity::jsonb,
+        is_virtual = changes.is_virtual
+        FROM (VALUES %s) as changes(geography_id, name, location, status, capacity, is_virtual)
+        WHERE stops.geography_id = changes.geography_id::uuid
+        RETURNING stops.geography_id
+    """, [(str(zone.geography_id), zone.name, zone.stop.location.geometry.model_dump_json(), json.dumps(zone.stop.status),
+        json.dumps(zone.stop.capacity), zone.stop.is_virtual) for zone in stop_zones], page_size=bulk_page_size, fetch=True)
+    if len(rows) < len(stop_zones):
+        raise HTTPException(status_code=404, detail="No stop with this stop_id exists.")
+
 def check_if_user_has_access(municipality, acl):
     if acl.is_admin:
         return True
@@ -194,9 +278,29 @@ def check_if_user_has_access(municipality, acl):
         raise HTTPException(status_code=403, detail="User is not allowed to edit zones.")
     return True
 
-def update_geography(cur, merged_zone: Zone):
-    update_classic_zone(cur, merged_zone)
-    return update_geography_record(cur, merged_zone)
+def update_geography_records(cur, zones: list[Zone]):
+    # update_geography_record for many zones with one UPDATE per page of zones.
+    if len(zones) == 0:
+        return
+    rows = execute_values(cur, """
+        UPDATE geographies
+        SET name = changes.name,
+        description = changes.description,
+        geography_type = changes.geography_type,
+        internal_id = changes.internal_id,
+        modified_at = NOW(),
+        last_modified_by = changes.last_modified_by,
+        affected_modalities = changes.affected_modalities::text[]
+        FROM (VALUES %s) as changes(geography_id, name, description, geography_type, internal_id, last_modified_by, affected_modalities)
+        WHERE geographies.geography_id = changes.geography_id::uuid
+        RETURNING geographies.geography_id, geographies.modified_at
+    """, [(str(zone.geography_id), zone.name, zone.description, zone.geography_type, zone.internal_id, zone.last_modified_by,
+        zone.affected_modalities) for zone in zones], page_size=bulk_page_size, fetch=True)
+    modified_at = {row["geography_id"]: row["modified_at"] for row in rows}
+    for zone in zones:
+        if zone.geography_id not in modified_at:
+            raise HTTPException(status_code=404, detail="No zone for this geography_id.")
+        zone.modified_at = modified_at[zone.geography_id]
 
 def update_classic_zone(cur, zone: Zone):
     if not check_if_zone_is_valid(cur, zone.area.geometry.model_dump_json(), zone.municipality):
@@ -213,6 +317,19 @@ def update_classic_zone(cur, zone: Zone):
     if cur.rowcount == 0:
         raise HTTPException(status_code=404, detail="No zone for this geography_id.")
 
+def update_zone_name(cur, zone: Zone):
+    # Without the area, so the area isn't parsed again and its trigger doesn't simplify it again.
+    stmt = """
+        UPDATE zones
+        SET name = %s
+        FROM geographies
+        WHERE zones.zone_id = geographies.zone_id
+        AND geographies.geography_id = %s
+    """
+    cur.execute(stmt, (zone.name, str(zone.geography_id)))
+    if cur.rowcount == 0:
+        raise HTTPException(status_code=404, detail="No zone for this geography_id.")
+
 def update_geography_record(cur, zone: Zone):
     stmt = """
         UPDATE geographies
@@ -231,4 +348,15 @@ def update_geography_record(cur, zone: Zone):
         raise HTTPException(status_code=404, detail="No zone for this geography_id.")
     return cur.fetchone()["modified_at"]
 
-
+def touch_geography_record(cur, zone: Zone):
+    stmt = """
+        UPDATE geographies
+        SET modified_at = NOW(),
+        last_modified_by = %s
+        WHERE geography_id = %s
+        RETURNING modified_at
+    """
+    cur.execute(stmt, (zone.last_modified_by, str(zone.geography_id)))
+    if cur.rowcount == 0:
+        raise HTTPException(status_code=404, detail="No zone for this geography_id.")
+    return cur.fetchone()["modified_at"]
@@ -1,7 +1,20 @@
-from click import pass_context
-from db_helper import db_helper
+from db_helper import db_helper, prepared_statements, fetch_in_batches, fetch_in_batches_async, PoolTimeoutError
+from trusted_rows import validate_rows, TrustedJSONResponse, get_trusted_response
+from zones.zone_phase import phase_column, phase_filter, query_next_transition_async
+from zones.public_zones_cache import public_zones_cache
+from zones.zone_detail import area_at_level, area_geojson, get_area_geojson_params, default_level, levels
+import response_formats
+from response_formats import FlatGeobufResponse, TopoJSONResponse
+import topology
+import itertools
 import json
+import os
+from datetime import datetime, timezone
 from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from pydantic_core import to_json
 import zones.zone as zone_mod
 import zones.stop as stop_mod
 import zones.no_parking as no_parking
@@ -9,13 +22,20 @@ from geojson_pydantic import Feature, Polygon
 from uuid import UUID
 
 
-def get_private_zones(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list):
-    with db_helper.get_resource() as (cur, conn):
+def get_private_zones(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list, bbox=None, limit=None, cursor=None, level=default_level,
+        response_format=response_formats.geojson):
+    check_cursor_has_limit(limit, cursor)
+    if response_format == response_formats.flatgeobuf:
+        check_is_not_paged(limit, "FlatGeobuf")
+        check_has_municipality_or_bbox(municipality, bbox, "FlatGeobuf")
+        return get_private_zones_flatgeobuf(municipality, geography_types, phases, affected_modalities, bbox, level)
+    if municipality == None and limit == None:
+        return stream_private_zones(municipality, geography_types, phases, affected_modalities, bbox, level)
+    with db_helper.get_resource(readonly=True) as (cur, conn):
         try:
-            zone_rows = query_zones(cur, municipality=municipality, geography_types=geography_types, phases=phases, affected_modalities=affected_modalities)
-            zones = zone_mod.convert_zones(zone_rows, include_private_data=True)
-            zones_with_realtime_data = zone_mod.look_up_realtime_data(zones)
-            return zones_with_realtime_data
+            zone_rows = query_zones(cur, municipality=municipality, geography_types=geography_types, phases=phases, affected_modalities=affected_modalities, bbox=bbox, limit=limit, cursor=cursor, level=level)
+            zones_with_realtime_data = convert_zones_with_realtime_data(zone_rows, include_private_data=True)
+            return get_zones_response(zones_with_realtime_data, zone_rows, limit)
         except HTTPException as e:
             conn.rollback()
             raise e
@@ -24,68 +44,371 @@ def get_private_zones(municipality, geography_types, phases: list[zone_mod.Phase
             print(e)
             raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
 
-def get_public_zones(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list):
-    with db_helper.get_resource() as (cur, conn):
+async def get_public_zones(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list, bbox=None, limit=None, cursor=None, level=default_level,
+        response_format=response_formats.geojson):
+    check_cursor_has_limit(limit, cursor)
+    if response_format == response_formats.flatgeobuf:
+        check_is_not_paged(limit, "FlatGeobuf")
+        check_has_municipality_or_bbox(municipality, bbox, "FlatGeobuf")
+        return await get_public_zones_flatgeobuf(municipality, geography_types, phases, affected_modalities, bbox, level)
+    if response_format == response_formats.topojson:
+        check_is_not_paged(limit, "TopoJSON")
+        check_has_municipality(municipality, "TopoJSON")
+        return await get_public_zones_topojson(municipality, geography_types, phases, affected_modalities, bbox, level)
+    if municipality == None and limit == None:
+        return await stream_public_zones(municipality, geography_types, phases, affected_modalities, bbox, level)
+    # Viewports and pages differ per request, only whole municipalities are cached.
+    if public_zones_cache.ttl <= 0 or bbox != None or limit != None:
+        return await get_public_zones_uncached(municipality, geography_types, phases, affected_modalities, bbox, limit, cursor, level)
+    key = public_zones_cache.get_key(municipality, geography_types, phases, affected_modalities, level)
+    body = await public_zones_cache.get_or_build(municipality, key, lambda: build_public_zones(municipality, geography_types, phases, affected_modalities, level))
+    return TrustedJSONResponse(await splice_realtime_data(body))
+
+async def get_public_zones_uncached(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list, bbox=None, limit=None, cursor=None, level=default_level):
+    async with db_helper.get_async_resource(readonly=True) as (cur, conn):
         try:
-            zone_rows = query_zones(cur, municipality=municipality, geography_types=geography_types, phases=phases, affected_modalities=affected_modalities)
-            zones = zone_mod.convert_zones(zone_rows, include_private_data=False)
-            zones_with_realtime_data = zone_mod.look_up_realtime_data(zones)
-            return zones_with_realtime_data
+            zone_rows = await query_zones_async(cur, municipality=municipality, geography_types=geography_types, phases=phases, affected_modalities=affected_modalities, bbox=bbox, limit=limit, cursor=cursor, level=level)
+            zones_with_realtime_data = await convert_zones_with_realtime_data_async(zone_rows, include_private_data=False)
+            return get_zones_response(zones_with_realtime_data, zone_rows, limit)
         except HTTPException as e:
-            conn.rollback()
             raise e
         except Exception as e:
-            conn.rollback()
             print(e)
             raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
 
-def query_zones(cur, municipality, geography_types, phases, affected_modalities: list):
-    stmt = """
-        SELECT *
+async def build_public_zones(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list, level=default_level):
+    # The serialised zones with placeholders for the realtime data (see splice_realtime_data) and the
+    # seconds until a zone of the municipality changes phase.
+    zone_rows, expires_in = await query_public_zones_until_transition(municipality, geography_types, phases, affected_modalities, level=level)
+    if validate_rows:
+        zones = jsonable_encoder(zone_mod.convert_zones(zone_rows, include_private_data=False))
+    else:
+        zones = zone_mod.convert_zone_rows_trusted(zone_rows, include_private_data=False)
+    stop_ids = set_realtime_data_placeholders(zones)
+    return to_json(stop_ids) + b"\n" + to_json(zones), expires_in
+
+async def query_public_zones_until_transition(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list, bbox=None, level=default_level):
+    # From the primary, the cached bodies are built right after a change raises the generation of the cache.
+    async with db_helper.get_async_resource() as (cur, conn):
+        try:
+            zone_rows = await query_zones_async(cur, municipality=municipality, geography_types=geography_types, phases=phases, affected_modalities=affected_modalities, bbox=bbox, level=level)
+            next_transition = await query_next_transition_async(cur, municipality)
+        except HTTPException as e:
+            raise e
+        except Exception as e:
+            print(e)
+            raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
+    expires_in = None
+    if next_transition is not None:
+        expires_in = (next_transition - datetime.now(timezone.utc)).total_seconds()
+    return zone_rows, expires_in
+
+# The cached bodies don't contain the realtime data of the stops, every stop has a placeholder for its
+# realtime data instead. The body starts with a line with the stop_ids in the order of the placeholders,
+# so a request only splices in the realtime data and doesn't parse and serialise the zones again.
+def set_realtime_data_placeholders(zones: list[dict]):
+    stop_ids = []
+    for zone in zones:
+        if zone["stop"] != None:
+            zone["stop"]["realtime_data"] = realtime_data_placeholder_value
+            stop_ids.append(str(zone["stop"]["stop_id"]))
+    return stop_ids
+
+async def splice_realtime_data(body: bytes):
+    stop_ids, serialised = body.split(b"\n", 1)
+    realtime_data = await zone_mod.look_up_realtime_data_json_async(json.loads(stop_ids))
+    parts = serialised.split(realtime_data_placeholder)
+    return b"".join(itertools.chain.from_iterable(zip(parts, realtime_data + [b""])))
+
+# Text in the database can't contain a NUL character, so no zone property is serialised the same.
+realtime_data_placeholder_value = "\x00realtime_data"
+realtime_data_placeholder = to_json(realtime_data_placeholder_value)
+
+# TopoJSON of the zones, the zones without their area are the properties of the geometries. Like the
+# /public/zones body the topology is cached with placeholders for the realtime data of the stops.
+async def get_public_zones_topojson(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list, bbox=None, level=default_level):
+    if public_zones_cache.ttl <= 0 or bbox != None:
+        body, _ = await build_public_zones_topojson(municipality, geography_types, phases, affected_modalities, bbox, level)
+    else:
+        key = public_zones_cache.get_key(municipality, geography_types, phases, affected_modalities, f"topojson:{level}")
+        body = await public_zones_cache.get_or_build(municipality, key, lambda: build_public_zones_topojson(municipality, geography_types, phases, affected_modalities, level=level))
+    return TopoJSONResponse(await splice_realtime_data(body))
+
+async def build_public_zones_topojson(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list, bbox=None, level=default_level):
+    zone_rows, expires_in = await query_public_zones_until_transition(municipality, geography_types, phases, affected_modalities, bbox, level)
+    # Encoding the topology takes a while, it doesn't block the event loop.
+    body = await run_in_threadpool(encode_public_zones_topojson, zone_rows, level)
+    return body, expires_in
+
+def encode_public_zones_topojson(zone_rows, level):
+    zones = zone_mod.convert_zone_rows_trusted(zone_rows, include_private_data=False)
+    stop_ids = set_realtime_data_placeholders(zones)
+    features = [(zone.pop("area")["geometry"], zone, zone["geography_id"]) for zone in zones]
+    # Quantised to the precision of the level of detail.
+    return to_json(stop_ids) + b"\n" + to_json(topology.build_topology("zones", features, scale=10 ** -levels[level][1]))
+
+# FlatGeobuf is built by the database from the rows, with a spatial index. The stops have no realtime data.
+def get_private_zones_flatgeobuf(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list, bbox=None, level=default_level):
+    with db_helper.get_resource(readonly=True) as (cur, conn):
+        try:
+            query_zones_flatgeobuf_private_stmts[bbox != None].execute(cur, get_query_zones_flatgeobuf_params(municipality, geography_types, phases, affected_modalities, bbox, level))
+            return FlatGeobufResponse(cur.fetchone()["flatgeobuf"])
+        except Exception as e:
+            print(e)
+            raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
+
+async def get_public_zones_flatgeobuf(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list, bbox=None, level=default_level):
+    async with db_helper.get_async_resource(readonly=True) as (cur, conn):
+        try:
+            await query_zones_flatgeobuf_public_stmts[bbox != None].execute_async(cur, get_query_zones_flatgeobuf_params(municipality, geography_types, phases, affected_modalities, bbox, level))
+            return FlatGeobufResponse(cur.fetchone()["flatgeobuf"])
+        except Exception as e:
+            print(e)
+            raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
+
+def check_cursor_has_limit(limit, cursor):
+    if cursor != None and limit == None:
+        raise HTTPException(status_code=400, detail="cursor can only be used together with limit.")
+
+def check_has_municipality(municipality, format_name):
+    # The topology of every zone in the country is too big to build within a request.
+    if municipality == None:
+        raise HTTPException(status_code=400, detail=f"{format_name} responses are only available per municipality, add municipality.")
+
+def check_has_municipality_or_bbox(municipality, bbox, format_name):
+    # The database builds the file as one value, a file of every zone in the country would be held in memory.
+    if municipality == None and bbox == None:
+        raise HTTPException(status_code=400, detail=f"{format_name} responses are only available per municipality or bbox, add municipality or bbox.")
+
+def check_is_not_paged(limit, format_name):
+    # A FlatGeobuf spatial index and the arcs of a topology cover all features, clients use a bbox instead.
+    if limit != None:
+        raise HTTPException(status_code=400, detail=f"{format_name} responses can't be paged, remove limit.")
+
+# Zones are built from the rows without validating them, unless validate_rows is set (see trusted_rows).
+def convert_zones_with_realtime_data(zone_rows, include_private_data):
+    if validate_rows:
+        return zone_mod.look_up_realtime_data(zone_mod.convert_zones(zone_rows, include_private_data))
+    return zone_mod.look_up_realtime_data_for_dicts(zone_mod.convert_zone_rows_trusted(zone_rows, include_private_data))
+
+async def convert_zones_with_realtime_data_async(zone_rows, include_private_data):
+    if validate_rows:
+        return await zone_mod.look_up_realtime_data_async(zone_mod.convert_zones(zone_rows, include_private_data))
+    return await zone_mod.look_up_realtime_data_for_dicts_async(zone_mod.convert_zone_rows_trusted(zone_rows, include_private_data))
+
+def get_zones_response(zones, zone_rows, limit):
+    response = get_trusted_response(zones)
+    if limit == None:
+        return response
+    # A page has the same body as a whole listing, the cursor of the next page is sent in a header.
+    if validate_rows:
+        response = JSONResponse(jsonable_encoder(zones))
+    if len(zone_rows) == limit:
+        response.headers["X-Next-Cursor"] = str(zone_rows[-1]["geography_id"])
+    return response
+
+def parse_bbox(bbox: str | None):
+    # min_lon,min_lat,max_lon,max_lat in WGS84, like the bbox of OGC API Features.
+    if bbox == None:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox should be min_lon,min_lat,max_lon,max_lat.")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="bbox should be min_lon,min_lat,max_lon,max_lat.")
+    return (min_lon, min_lat, max_lon, max_lat)
+
+def serialise_zones(zones):
+    # The zones separated by commas, without the brackets of the array.
+    if validate_rows:
+        return ",".join(json.dumps(zone, separators=(",", ":")) for zone in jsonable_encoder(zones))
+    return to_json(zones).decode()[1:-1]
+
+# Listings of all zones in the country are streamed as a JSON array, a batch of rows at a time, so that
+# the memory use of a worker doesn't grow with the number of zones.
+def stream_private_zones(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list, bbox=None, level=default_level):
+    chunks = generate_private_zones(municipality, geography_types, phases, affected_modalities, bbox, level)
+    try:
+        # Start the query before the response, so a database problem is still reported with a 500.
+        first_chunk = next(chunks)
+    except (HTTPException, PoolTimeoutError) as e:
+        raise e
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
+
+    async def chain():
+        # Closing the generator when the client disconnects returns its connection to the pool right away.
+        try:
+            yield first_chunk
+            async for chunk in iterate_in_threadpool(chunks):
+                yield chunk
+        finally:
+            await run_in_threadpool(chunks.close)
+    return StreamingResponse(chain(), media_type="application/json")
+
+def generate_private_zones(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list, bbox=None, level=default_level):
+    stmt, params = get_query_zones(municipality, geography_types, phases, affected_modalities, bbox, level=level)
+    separator = "["
+    with db_helper.get_resource(readonly=True) as (cur, conn):
+        for zone_rows in fetch_in_batches(cur, stmt.stmt, params, stream_batch_size):
+            zones_with_realtime_data = convert_zones_with_realtime_data(zone_rows, include_private_data=True)
+            yield separator + serialise_zones(zones_with_realtime_data)
+            separator = ","
+    yield "[]" if separator == "[" else "]"
+
+async def stream_public_zones(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list, bbox=None, level=default_level):
+    chunks = generate_public_zones(municipality, geography_types, phases, affected_modalities, bbox, level)
+    try:
+        first_chunk = await anext(chunks)
+    except (HTTPException, PoolTimeoutError) as e:
+        raise e
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
+
+    async def chain():
+        try:
+            yield first_chunk
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+    return StreamingResponse(chain(), media_type="application/json")
+
+async def generate_public_zones(municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list, bbox=None, level=default_level):
+    stmt, params = get_query_zones(municipality, geography_types, phases, affected_modalities, bbox, level=level)
+    separator = "["
+    async with db_helper.get_async_resource(readonly=True) as (cur, conn):
+        async for zone_rows in fetch_in_batches_async(cur, stmt.stmt, params, stream_batch_size):
+            zones_with_realtime_data = await convert_zones_with_realtime_data_async(zone_rows, include_private_data=False)
+            yield separator + serialise_zones(zones_with_realtime_data)
+            separator = ","
+    yield "[]" if separator == "[" else "]"
+
+def get_query_zones_params(municipality, geography_types, phases, affected_modalities: list, bbox=None, level=default_level):
+    return get_area_geojson_params(level) + get_query_zones_filter_params(municipality, geography_types, phases, affected_modalities, bbox)
+
+def get_query_zones_flatgeobuf_params(municipality, geography_types, phases, affected_modalities: list, bbox=None, level=default_level):
+    return (level,) + get_query_zones_filter_params(municipality, geography_types, phases, affected_modalities, bbox)
+
+def get_query_zones_filter_params(municipality, geography_types, phases, affected_modalities: list, bbox=None):
+    return (municipality == None, municipality, len(geography_types) == 0, geography_types, affected_modalities,
+        *(bbox or ()), phases, phases)
+
+def get_query_zones_page_params(cursor, limit):
+    # Keyset pagination, the page starts after the geography_id of the last zone of the previous page.
+    return (cursor or UUID(int=0), limit)
+
+def get_query_zones(municipality, geography_types, phases, affected_modalities: list, bbox=None, limit=None, cursor=None, level=default_level):
+    # The prepared statement and its parameters, shared by query_zones and query_zones_async.
+    params = get_query_zones_params(municipality, geography_types, phases, affected_modalities, bbox, level)
+    if limit == None:
+        return query_zones_stmts[bbox != None], params
+    return query_zones_page_stmts[bbox != None], params + get_query_zones_page_params(cursor, limit)
+
+def query_zones(cur, municipality, geography_types, phases, affected_modalities: list, bbox=None, limit=None, cursor=None, level=default_level):
+    stmt, params = get_query_zones(municipality, geography_types, phases, affected_modalities, bbox, limit, cursor, level)
+    stmt.execute(cur, params)
+    return cur.fetchall()
+
+async def query_zones_async(cur, municipality, geography_types, phases, affected_modalities: list, bbox=None, limit=None, cursor=None, level=default_level):
+    stmt, params = get_query_zones(municipality, geography_types, phases, affected_modalities, bbox, limit, cursor, level)
+    await stmt.execute_async(cur, params)
+    return cur.fetchall()
+
+# The filters of the zone listings, takes the parameters of get_query_zones_filter_params. The statements
+# with a viewport are prepared separately: in a generic plan the spatial index can't be used for a
+# condition that is switched off with a parameter.
+def get_query_zones_filter(bbox):
+    return """
+        ((true = %s) or (zones.municipality = %s))
+        AND
+        ((true = %s) or (geography_type = ANY(%s)))
+        AND
+        (geographies.affected_modalities && %s)
+        AND
+        """ + ("""zones.area && ST_MakeEnvelope(%s, %s, %s, %s, 4326)
+        AND
+        """ if bbox else "") + phase_filter
+
+def get_query_zones_base_stmt(bbox):
+    return """
+        SELECT geographies.geography_id, internal_id, geographies.name, description, geography_type, 
+        effective_date, published_date, propose_retirement, published_retire_date, retire_date, prev_geographies,
+        zones.zone_id, zones.municipality, geographies.affected_modalities,
+        json_build_object(
+            'type',       'Feature',
+            'geometry',   """ + area_geojson + """::json,
+            'properties',  json_build_object()
+        ) as area,
+        created_at, modified_at, created_by, last_modified_by,
+        """ + phase_column + """,
+        stops.stop_id, 
+        json_build_object(
+            'type',       'Feature',
+            'geometry',   ST_AsGeoJSON( stops.location)::json,
+            'properties',  json_build_object()
+        ) as location,
+        stops.status, stops.capacity, stops.is_virtual
+        FROM geographies
+        JOIN zones
+        USING (zone_id)
+        LEFT JOIN stops
+        USING (geography_id)
+        WHERE 
+        """ + get_query_zones_filter(bbox)
+
+def get_query_zones_page_stmt(bbox):
+    return get_query_zones_base_stmt(bbox) + """
+        AND geographies.geography_id > %s
+        ORDER BY geographies.geography_id
+        LIMIT %s
+    """
+
+# The statements without and with a viewport, by bbox != None.
+query_zones_stmts = {
+    False: prepared_statements.register("query_zones", get_query_zones_base_stmt(bbox=False)),
+    True: prepared_statements.register("query_zones_bbox", get_query_zones_base_stmt(bbox=True)),
+}
+query_zones_page_stmts = {
+    False: prepared_statements.register("query_zones_page", get_query_zones_page_stmt(bbox=False)),
+    True: prepared_statements.register("query_zones_page_bbox", get_query_zones_page_stmt(bbox=True)),
+}
+
+# FlatGeobuf has no nested objects, the stop is flattened into the properties of the zone. ST_Multi makes
+# all geometries MultiPolygons, a FlatGeobuf file has one geometry type.
+def get_query_zones_flatgeobuf_stmt(include_private_data, bbox):
+    return """
+        SELECT ST_AsFlatGeobuf(zone_rows, true, 'geom') as flatgeobuf
         FROM (
-            SELECT geographies.geography_id, internal_id, geographies.name, description, geography_type, 
-            effective_date, published_date, propose_retirement, published_retire_date, retire_date, prev_geographies,
-            zones.zone_id, zones.municipality, geographies.affected_modalities,
-            json_build_object(
-                'type',       'Feature',
-                'geometry',   ST_AsGeoJSON(zones.area)::json,
-                'properties',  json_build_object()
-            ) as area,
-            created_at, modified_at, created_by, last_modified_by,
-            CASE 
-                WHEN (published_date IS NULL) THEN 'concept'
-                WHEN (propose_retirement = true AND published_retire_date IS NULL) THEN 'retirement_concept' 
-                WHEN NOW() < published_date AND NOW() < effective_date THEN 'committed_concept'
-                WHEN propose_retirement = true AND NOW() < published_retire_date AND NOW() < retire_date THEN 'committed_retirement_concept'
-                WHEN NOW() > published_date AND NOW() < effective_date THEN 'published'
-                WHEN propose_retirement = true AND NOW() > published_retire_date AND NOW() < retire_date THEN 'published_retirement'
-                WHEN (NOW() > effective_date AND (NOW() < retire_date OR retire_date IS NULL)) THEN 'active'
-                WHEN (NOW() > retire_date) THEN 'archived'
-                ELSE 'error'
-            END as phase,
-            stops.stop_id, 
-            json_build_object(
-                'type',       'Feature',
-                'geometry',   ST_AsGeoJSON( stops.location)::json,
-                'properties',  json_build_object()
-            ) as location,
-            stops.status, stops.capacity, stops.is_virtual
+            SELECT ST_Multi(""" + area_at_level + """) as geom,
+            geographies.geography_id::text, internal_id, geographies.name, description, geography_type,
+            effective_date, published_date, propose_retirement, published_retire_date, retire_date,
+            zones.zone_id, zones.municipality, array_to_string(geographies.affected_modalities, ',') as affected_modalities,
+            created_at, modified_at,""" + (" created_by, last_modified_by," if include_private_data else "") + """
+            """ + phase_column + """,
+            stops.stop_id::text, ST_X(stops.location) as stop_lon, ST_Y(stops.location) as stop_lat,
+            stops.status::text as stop_status, stops.capacity::text as stop_capacity, stops.is_virtual
             FROM geographies
             JOIN zones
             USING (zone_id)
             LEFT JOIN stops
             USING (geography_id)
-            WHERE 
-            ((true = %s) or (zones.municipality = %s))
-            AND
-            ((true = %s) or (geography_type = ANY(%s)))
-            AND
-            (geographies.affected_modalities && %s)
-        ) as all_zones
-        WHERE phase = ANY(%s);
+            WHERE
+            """ + get_query_zones_filter(bbox) + """
+        ) as zone_rows
     """
-    cur.execute(stmt, (municipality == None, municipality, len(geography_types) == 0, geography_types, affected_modalities, phases))
-    return cur.fetchall()
+
+query_zones_flatgeobuf_private_stmts = {
+    False: prepared_statements.register("query_zones_flatgeobuf_private", get_query_zones_flatgeobuf_stmt(include_private_data=True, bbox=False)),
+    True: prepared_statements.register("query_zones_flatgeobuf_private_bbox", get_query_zones_flatgeobuf_stmt(include_private_data=True, bbox=True)),
+}
+query_zones_flatgeobuf_public_stmts = {
+    False: prepared_statements.register("query_zones_flatgeobuf_public", get_query_zones_flatgeobuf_stmt(include_private_data=False, bbox=False)),
+    True: prepared_statements.register("query_zones_flatgeobuf_public_bbox", get_query_zones_flatgeobuf_stmt(include_private_data=False, bbox=True)),
+}
 
 def get_zone_by_id(cur, geography_uuid: UUID) -> zone_mod.Zone:
     result = query_zone_by_id(cur, geography_uuid)
@@ -94,7 +417,10 @@ def get_zone_by_id(cur, geography_uuid: UUID) -> zone_mod.Zone:
     return zone_mod.convert_zone(result, include_private_data=True)
 
 def query_zone_by_id(cur, geography_uuid: UUID):
-    stmt = """
+    query_zone_by_id_stmt.execute(cur, (str(geography_uuid),))
+    return cur.fetchone()
+
+query_zone_by_id_stmt = prepared_statements.register("query_zone_by_id", """
         SELECT geographies.geography_id, internal_id, geographies.name, description, geography_type, 
         effective_date, published_date, propose_retirement, published_retire_date, retire_date, prev_geographies,
         zones.zone_id, zones.municipality, geographies.affected_modalities,
@@ -104,17 +430,7 @@ def query_zone_by_id(cur, geography_uuid: UUID):
             'properties',  json_build_object()
         ) as area,
         created_at, modified_at, created_by, last_modified_by,
-        CASE 
-            WHEN (published_date IS NULL) THEN 'concept'
-            WHEN (propose_retirement = true AND published_retire_date IS NULL) THEN 'retirement_concept' 
-            WHEN NOW() < published_date AND NOW() < effective_date THEN 'committed_concept'
-            WHEN propose_retirement = true AND NOW() < published_retire_date AND NOW() < retire_date THEN 'committed_retirement_concept'
-            WHEN NOW() > published_date AND NOW() < effective_date THEN 'published'
-            WHEN propose_retirement = true AND NOW() > published_retire_date AND NOW() < retire_date THEN 'published_retirement'
-            WHEN (NOW() > effective_date AND (NOW() < retire_date OR retire_date IS NULL)) THEN 'active'
-            WHEN (NOW() > retire_date) THEN 'archived'
-            ELSE 'error'
-        END as phase,
+        """ + phase_column + """,
         stops.stop_id, 
         json_build_object(
             'type',       'Feature',
@@ -129,9 +445,7 @@ def query_zone_by_id(cur, geography_uuid: UUID):
         USING (geography_id)
         WHERE 
         geographies.geography_id = %s
-    """
-    cur.execute(stmt, (str(geography_uuid),))
-    return cur.fetchone()
+    """)
 
 
 def get_zones_by_ids(cur, geography_uuids: list[UUID]):
@@ -152,17 +466,7 @@ def query_zones_by_ids(cur, geography_uuids: list[UUID]):
             'properties',  json_build_object()
         ) as area,
         created_at, modified_at, created_by, last_modified_by,
-        CASE 
-            WHEN (published_date IS NULL) THEN 'concept'
-            WHEN (propose_retirement = true AND published_retire_date IS NULL) THEN 'retirement_concept' 
-            WHEN NOW() < published_date AND NOW() < effective_date THEN 'committed_concept'
-            WHEN propose_retirement = true AND NOW() < published_retire_date AND NOW() < retire_date THEN 'committed_retirement_concept'
-            WHEN NOW() > published_date AND NOW() < effective_date THEN 'published'
-            WHEN propose_retirement = true AND NOW() > published_retire_date AND NOW() < retire_date THEN 'published_retirement'
-            WHEN (NOW() > effective_date AND (NOW() < retire_date OR retire_date IS NULL)) THEN 'active'
-            WHEN (NOW() > retire_date) THEN 'archived'
-            ELSE 'error'
-        END as phase,
+        """ + phase_column + """,
         stops.stop_id, 
         json_build_object(
             'type',       'Feature',
@@ -180,3 +484,6 @@ def query_zones_by_ids(cur, geography_uuids: list[UUID]):
     """
     cur.execute(stmt, (geography_uuids,))
     return cur.fetchall()
+
+
+stream_batch_size = int(os.getenv("ZONES_STREAM_BATCH_SIZE", 500))
@@ -0,0 +1,95 @@
+from uuid import UUID, uuid1
+
+from fastapi import HTTPException
+
+from authorization import access_control
+from zones.get_zones import query_zones_by_ids
+from zones.zone import Zone, convert_zone, check_if_user_has_access_to_zone_based_on_municipality
+
+# The phase transitions of publish_zones, make_concept and propose_retirement. The zones of a request are
+# loaded with one query and checked in memory, after that every kind of transition is one UPDATE of all
+# its zones. Takes the parameters of the transition, the email of the user and the geography_ids.
+transitions = {
+    "publish": "effective_date = %s, published_date = %s",
+    "publish_retirement": "retire_date = %s, published_retire_date = %s",
+    "back_to_concept": "effective_date = null, published_date = null",
+    "retirement_back_to_concept": "retire_date = null, published_retire_date = null",
+    "propose_retirement": "retire_date = null, published_retire_date = null, propose_retirement = true",
+    "undo_propose_retirement": "retire_date = null, published_retire_date = null, propose_retirement = false",
+}
+
+
+def load_zones(cur, geography_ids: list[UUID], user: access_control.User) -> list[Zone]:
+    """The zones in the order of geography_ids (without duplicates), after checking that the user has access to them."""
+    geography_ids = list(dict.fromkeys(geography_ids))
+    zones = {row["geography_id"]: convert_zone(row, include_private_data=True) for row in query_zones_by_ids(cur, geography_ids)}
+    result = []
+    for geography_id in geography_ids:
+        zone = zones.get(geography_id)
+        if zone == None:
+            raise HTTPException(status_code=404, detail=f"Geography {geography_id} doesn't exist.")
+        check_if_user_has_access_to_zone_based_on_municipality(zone.municipality, user.acl)
+        result.append(zone)
+    return result
+
+
+def apply_transition(cur, transition: str, zones: list[Zone], user: access_control.User, params=()):
+    if len(zones) == 0:
+        return
+    stmt = """
+        UPDATE geographies
+        SET """ + transitions[transition] + """,
+        modified_at = NOW(),
+        last_modified_by = %s
+        WHERE geography_id = ANY(%s)
+    """
+    cur.execute(stmt, params + (user.email, [zone.geography_id for zone in zones]))
+
+
+def copy_to_concepts(cur, zones: list[Zone], user: access_control.User):
+    """Copies published zones to new concepts with the zone as previous geography, and proposes the retirement of the zones."""
+    if len(zones) == 0:
+        return
+    # The zone_ids are taken from the sequence first, so that the geographies can refer to the copied zones.
+    stmt = """
+        WITH copies AS (
+            SELECT copies.*, nextval(pg_get_serial_sequence('zones', 'zone_id')) as new_zone_id
+            FROM unnest(%s::uuid[], %s::uuid[], %s::uuid[]) as copies(geography_id, new_geography_id, new_stop_id)
+        ),
+        new_zones AS (
+            INSERT INTO zones
+            (zone_id, area, name, municipality, zone_type)
+            SELECT copies.new_zone_id, zones.area, zones.name, zones.municipality, 'custom'
+            FROM copies
+            JOIN geographies
+            USING (geography_id)
+            JOIN zones
+            ON zones.zone_id = geographies.zone_id
+        ),
+        new_geographies AS (
+            INSERT INTO geographies
+            (geography_id, internal_id, zone_id, name, description, geography_type, effective_date, published_date, prev_geographies, created_at, modified_at, created_by, last_modified_by, affected_modalities)
+            SELECT copies.new_geography_id, internal_id, copies.new_zone_id, name, description, geography_type, null, null, ARRAY[geography_id], NOW(), NOW(), %s, %s, affected_modalities
+            FROM copies
+            JOIN geographies
+            USING (geography_id)
+        ),
+        new_stops AS (
+            INSERT INTO stops
+            (stop_id, name, location, status, capacity, geography_id, is_virtual)
+            SELECT copies.new_stop_id, geographies.name, stops.location, stops.status, stops.capacity, copies.new_geography_id, stops.is_virtual
+            FROM copies
+            JOIN geographies
+            USING (geography_id)
+            JOIN stops
+            USING (geography_id)
+            WHERE geographies.geography_type = 'stop'
+        )
+        UPDATE geographies
+        SET propose_retirement = true,
+        modified_at = NOW(),
+        last_modified_by = %s
+        WHERE geography_id IN (SELECT geography_id FROM copies)
+    """
+    cur.execute(stmt, ([zone.geography_id for zone in zones], [uuid1() for _ in zones], [uuid1() for _ in zones],
+        user.email, user.email, user.email))
@@ -5,8 +5,9 @@ from pydantic import BaseModel
 
 from authorization import access_control
 from db_helper import db_helper
-from zones.get_zones import get_zone_by_id
-from zones.zone import check_if_user_has_access_to_zone_based_on_municipality
+from zones.phase_transitions import load_zones, apply_transition
+from zones.public_zones_cache import public_zones_cache
+from mds.feed_cache import feed_cache
 
 
 class ProposeRetirementRequest(BaseModel):
@@ -15,60 +16,33 @@ class ProposeRetirementRequest(BaseModel):
 
 
 def undo_propose_retirement(cur, geography_ids: list[UUID], user: access_control.User):
-    for geography_id in geography_ids:
-        zone = get_zone_by_id(cur, geography_id)
-
-        check_if_user_has_access_to_zone_based_on_municipality(zone.municipality, user.acl)
-
+    zones = load_zones(cur, geography_ids, user)
+    for zone in zones:
         if zone.phase not in ["retirement_concept", "committed_retirement_concept"]:
-            raise HTTPException(400, f"it's not possible to undo a propose retirement for zone, {geography_id} should be in retirement_concept or committed_retirement_concept")
-
-        undo_propose_retirement_query(cur, zone.geography_id, user)
-
+            raise HTTPException(400, f"it's not possible to undo a propose retirement for zone, {zone.geography_id} should be in retirement_concept or committed_retirement_concept")
 
-def undo_propose_retirement_query(cur, geography_id, user: access_control.User):
-    stmt = """
-        UPDATE geographies
-        SET retire_date = null,
-        published_retire_date = null,
-        modified_at = NOW(),
-        propose_retirement = false,
-        last_modified_by = %s
-        WHERE geography_id = %s
-    """
-    cur.execute(stmt, (user.email, geography_id))
+    apply_transition(cur, "undo_propose_retirement", zones, user)
+    return {zone.municipality for zone in zones}
 
 def propose_retirement(cur, geography_ids: list[UUID], user: access_control.User):
-    for geography_id in geography_ids:
-        zone = get_zone_by_id(cur, geography_id)
-
-        check_if_user_has_access_to_zone_based_on_municipality(zone.municipality, user.acl)
-
+    zones = load_zones(cur, geography_ids, user)
+    for zone in zones:
         if zone.phase not in ["published", "active"]:
-            raise HTTPException(400, f"it's not possible to propose retirement for zone, {geography_id} should be in published or active phase.")
-
-        propose_retirement_query(cur, zone.geography_id, user)
+            raise HTTPException(400, f"it's not possible to propose retirement for zone, {zone.geography_id} should be in published or active phase.")
 
-def propose_retirement_query(cur, geography_id, user: access_control.User):
-    stmt = """
-        UPDATE geographies
-        SET retire_date = null,
-        published_retire_date = null,
-        modified_at = NOW(),
-        propose_retirement = true,
-        last_modified_by = %s
-        WHERE geography_id = %s
-    """
-    cur.execute(stmt, (user.email, geography_id))
+    apply_transition(cur, "propose_retirement", zones, user)
+    return {zone.municipality for zone in zones}
 
 def propose_retirement_route(propose_retirement_request: ProposeRetirementRequest, current_user: access_control.User):
      with db_helper.get_resource() as (cur, conn):
         try:
             if not propose_retirement_request.undo:
-                propose_retirement(cur, propose_retirement_request.geography_ids, current_user)
+                municipalities = propose_retirement(cur, propose_retirement_request.geography_ids, current_user)
             else:
-                undo_propose_retirement(cur, propose_retirement_request.geography_ids, current_user)
+                municipalities = undo_propose_retirement(cur, propose_retirement_request.geography_ids, current_user)
             conn.commit()
+            public_zones_cache.invalidate(municipalities)
+            feed_cache.invalidate()
             return
         except HTTPException as e:
             conn.rollback()
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import weakref
+
+from redis_helper import redis_helper
+
+
+class PublicZonesCache:
+    """Keeps the serialised /public/zones body and the vector tiles of the zones in redis, shared between workers.
+
+    The body is stored without the realtime data of the stops, that is added on every request. Entries
+    expire after ttl seconds or at the next phase transition of a zone in the municipality, whichever
+    comes first. The keys contain the generation of the municipality, which is raised when zones of the
+    municipality change, so the entries of an older generation are never read again.
+    """
+    redis_key_prefix = "policy_api:public_zones:"
+    generation_key = "policy_api:public_zones_generation"
+    all_municipalities = "all"
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        # A lock only lives while a request holds or waits for it, keys of old generations don't pile up.
+        self._locks = weakref.WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.invalidations = 0
+
+    def get_key(self, municipality, geography_types, phases, affected_modalities, variant):
+        # variant is the level of detail of a body or the z/x/y of a tile.
+        # The query filters with = ANY, so the order of the query parameters doesn't matter.
+        def join(values):
+            return ",".join(sorted(str(getattr(value, "value", value)) for value in values))
+        return self.redis_key_prefix + ":".join([
+            municipality or self.all_municipalities, join(geography_types), join(phases), join(affected_modalities), variant
+        ])
+
+    async def get_or_build(self, municipality, key, build):
+        """Returns the cached body, or builds it with build(), which returns the body and the seconds it stays valid.
+
+        build() should read from the primary, a replica that lags might not have the change that raised
+        the generation yet.
+        """
+        generation = await self._get_generation(municipality)
+        if generation is None:
+            body, _ = await build()
+            return body
+        key = key + ":" + generation
+        body = await self._get(key)
+        if body is not None:
+            self.hits += 1
+            return body
+
+        # Concurrent requests for the same missing body within a worker wait for one build.
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        async with lock:
+            body = await self._get(key)
+            if body is not None:
+                self.hits += 1
+                return body
+            self.misses += 1
+            # A build that is still running when the zones change stores its body under the old generation.
+            body, expires_in = await build()
+            await self._set(key, body, expires_in)
+            return body
+
+    async def _get_generation(self, municipality):
+        # The generation of all municipalities and of the municipality, both start at 0.
+        keys = [self.generation_key, self.generation_key + ":" + (municipality or self.all_municipalities)]
+        try:
+            async with redis_helper.get_async_resource() as r:
+                values = await r.mget(keys)
+        except Exception:
+            self.errors += 1
+            logging.exception("Error while retrieving the generation of public zones from redis")
+            return None
+        return ".".join(str(int(value or 0)) for value in values)
+
+    async def _get(self, key):
+        try:
+            async with redis_helper.get_async_resource() as r:
+                return await r.get(key)
+        except Exception:
+            # Redis is only a cache, fall back to the database.
+            self.errors += 1
+            logging.exception("Error while retrieving public zones from redis")
+            return None
+
+    async def _set(self, key, body, expires_in):
+        if expires_in is not None and expires_in < 1:
+            return
+        ttl = self.ttl if expires_in is None else min(self.ttl, expires_in)
+        try:
+            async with redis_helper.get_async_resource() as r:
+                await r.set(key, body, ex=int(ttl))
+        except Exception:
+            self.errors += 1
+            logging.exception("Error while storing public zones in redis")
+
+    def invalidate(self, municipalities=None):
+        """Raises the generation of the municipalities, or of all municipalities when no municipalities are given.
+
+        The bodies of requests without a municipality contain every municipality, their generation is
+        always raised. Call it after the change is committed.
+        """
+        if municipalities is None:
+            keys = [self.generation_key]
+        else:
+            keys = [self.generation_key + ":" + municipality for municipality in set(municipalities) | {self.all_municipalities}]
+        self.invalidations += 1
+        try:
+            with redis_helper.get_resource() as r:
+                pipe = r.pipeline(transaction=False)
+                for key in keys:
+                    pipe.incr(key)
+                pipe.execute()
+        except Exception:
+            # The change is committed already, the cached body expires after at most ttl seconds.
+            self.errors += 1
+            logging.exception("Error while invalidating public zones in redis")
+
+    def get_metrics(self):
+        lookups = self.hits + self.misses
+        return {
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "errors": self.errors,
+            "invalidations": self.invalidations,
+        }
+
+
+public_zones_cache = PublicZonesCache(ttl=float(os.getenv("PUBLIC_ZONES_CACHE_TTL", 600)))
@@ -4,10 +4,11 @@ from uuid import UUID, uuid1
 from datetime import datetime, timezone
 from pydantic import AwareDatetime
 from fastapi import HTTPException
-from zones.get_zones import get_zone_by_id
 from authorization import access_control
 from db_helper import db_helper
-from zones.zone import check_if_user_has_access_to_zone_based_on_municipality
+from zones.phase_transitions import load_zones, apply_transition
+from zones.public_zones_cache import public_zones_cache
+from mds.feed_cache import feed_cache
 
 class PublishZoneRequest(BaseModel):
     geography_ids: list[UUID]
@@ -15,39 +16,13 @@ class PublishZoneRequest(BaseModel):
     effective_on: AwareDatetime
 
 
-def publish_zones_query(cur, publish_zones_request: PublishZoneRequest, geography_ids, email: str):
-    if len(geography_ids) == 0:
-        return
-    stmt = """
-        UPDATE geographies
-        SET effective_date = %s,
-        published_date = %s,
-        modified_at = NOW(),
-        last_modified_by = %s
-        WHERE geography_id = ANY(%s)
-    """
-
-    cur.execute(stmt, (publish_zones_request.effective_on, publish_zones_request.publish_on, email, geography_ids))
-
-def publish_retire_zones_query(cur, publish_zones_request: PublishZoneRequest, geography_ids, email: str):
-    if len(geography_ids) == 0:
-        return
-    stmt = """
-        UPDATE geographies
-        SET retire_date = %s,
-        published_retire_date = %s,
-        modified_at = NOW(),
-        last_modified_by = %s
-        WHERE geography_id = ANY(%s)
-    """
-    cur.execute(stmt, (publish_zones_request.effective_on, publish_zones_request.publish_on, email, geography_ids))
-
-
 def publish_zones_route(publish_zone_request: PublishZoneRequest, current_user: access_control.User):
      with db_helper.get_resource() as (cur, conn):
         try:
-            publish_zones(cur, publish_zone_request, current_user)
+            municipalities = publish_zones(cur, publish_zone_request, current_user)
             conn.commit()
+            public_zones_cache.invalidate(municipalities)
+            feed_cache.invalidate()
             return
         except HTTPException as e:
             conn.rollback()
@@ -67,20 +42,17 @@ def publish_zones(cur, publish_zones_request: PublishZoneRequest, user: access_c
 
     to_publish = []
     to_retire = []
-    # This code could be optimized
-    for geography_id in publish_zones_request.geography_ids:
-        zone = get_zone_by_id(cur, geography_id)
+    for zone in load_zones(cur, publish_zones_request.geography_ids, user):
         if zone.geography_type == "monitoring":
-            raise HTTPException(400, detail=f"It's not possible to publish a monitoring zone: {geography_id}")
-        check_if_user_has_access_to_zone_based_on_municipality(zone.municipality, user.acl)
-        if zone == None:
-            raise HTTPException(404, f"zone {geography_id} doesn't exists, try again.")
+            raise HTTPException(400, detail=f"It's not possible to publish a monitoring zone: {zone.geography_id}")
         if zone.phase not in ["concept", "committed_concept", "retirement_concept", "committed_retirement_concept"]:
-            raise HTTPException(400, f"it's not possible to publish (or update the publication date of this zone) because {geography_id} is not a concept or committed_concept")
+            raise HTTPException(400, f"it's not possible to publish (or update the publication date of this zone) because {zone.geography_id} is not a concept or committed_concept")
         if zone.phase in ["retirement_concept", "committed_retirement_concept"]:
-            to_retire.append(geography_id)
+            to_retire.append(zone)
         else:
-            to_publish.append(geography_id)
-    
-    publish_zones_query(cur, publish_zones_request, to_publish, user.email)
-    publish_retire_zones_query(cur, publish_zones_request, to_retire, user.email)
+            to_publish.append(zone)
+
+    dates = (publish_zones_request.effective_on, publish_zones_request.publish_on)
+    apply_transition(cur, "publish", to_publish, user, dates)
+    apply_transition(cur, "publish_retirement", to_retire, user, dates)
+    return {zone.municipality for zone in to_publish + to_retire}
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from fastapi import HTTPException
 from typing import Dict, Union
 from geojson_pydantic import Feature, Polygon, MultiPolygon
 import zones.stop as stop_mod
@@ -7,6 +8,7 @@ from enum import Enum
 from datetime import datetime
 from redis_helper import redis_helper
 import json
+from pydantic_core import to_json
 from mds.stop import MDSStop
 from modalities import Modality, DefaultModes
 
@@ -118,6 +120,45 @@ def convert_zone(zone_row, include_private_data=False):
         result.last_modified_by=zone_row["last_modified_by"]
     return result
 
+def convert_zone_rows_trusted(zone_rows, include_private_data=False):
+    return [convert_zone_row_trusted(zone_row, include_private_data) for zone_row in zone_rows]
+
+def convert_zone_row_trusted(zone_row, include_private_data=False):
+    # Builds the same JSON as convert_zone without validating the row, see trusted_rows.
+    stop = None
+    if zone_row["geography_type"] == "stop":
+        stop = {
+            "stop_id": zone_row["stop_id"],
+            "location": zone_row["location"],
+            "status": zone_row["status"],
+            "capacity": zone_row["capacity"],
+            "realtime_data": None,
+            "is_virtual": zone_row["is_virtual"],
+        }
+    return {
+        "zone_id": zone_row["zone_id"],
+        "area": zone_row["area"],
+        "name": zone_row["name"],
+        "municipality": zone_row["municipality"],
+        "geography_id": zone_row["geography_id"],
+        "internal_id": zone_row["internal_id"],
+        "description": zone_row["description"],
+        "geography_type": zone_row["geography_type"],
+        "prev_geographies": zone_row["prev_geographies"] or [],
+        "effective_date": zone_row["effective_date"],
+        "propose_retirement": False,
+        "published_date": zone_row["published_date"],
+        "published_retire_date": zone_row["published_retire_date"],
+        "retire_date": zone_row["retire_date"],
+        "stop": stop,
+        "created_at": zone_row["created_at"],
+        "modified_at": zone_row["modified_at"],
+        "created_by": zone_row["created_by"] if include_private_data else None,
+        "last_modified_by": zone_row["last_modified_by"] if include_private_data else None,
+        "phase": zone_row["phase"],
+        "affected_modalities": zone_row["affected_modalities"],
+    }
+
 def convert_stop(stop_row):
     return stop_mod.Stop(
         stop_id=stop_row["stop_id"],
@@ -127,33 +168,87 @@ def convert_stop(stop_row):
         is_virtual=stop_row["is_virtual"],
     )
 
-def set_realtime_data(result, zone):
-    if result == None:
-        return zone
+def convert_realtime_data(result):
     stop_dict = json.loads(result)
     mdsStop = MDSStop(**stop_dict)
-    zone.stop.realtime_data = stop_mod.RealtimeStopData(
+    return stop_mod.RealtimeStopData(
         last_reported = mdsStop.last_reported,
         status = mdsStop.status,
         num_vehicles_available = mdsStop.num_vehicles_available,
         num_vehicles_disabled = mdsStop.num_vehicles_disabled,
         num_places_available = mdsStop.num_places_available
     )
+
+def set_realtime_data(result, zone):
+    if result == None:
+        return zone
+    zone.stop.realtime_data = convert_realtime_data(result)
     return zone
 
 def look_up_realtime_data(zones: list[Zone]):
     with redis_helper.get_resource() as r:
-        pipe = r.pipeline()
+        pipe = r.pipeline(transaction=False)
         for zone in zones:
             if zone.stop != None: 
                 pipe.get("stop:" + str(zone.stop.stop_id))
         results = pipe.execute()
+    return set_realtime_data_for_zones(results, zones)
+
+async def look_up_realtime_data_async(zones: list[Zone]):
+    async with redis_helper.get_async_resource() as r:
+        pipe = r.pipeline(transaction=False)
+        for zone in zones:
+            if zone.stop != None: 
+                pipe.get("stop:" + str(zone.stop.stop_id))
+        results = await pipe.execute()
+    return set_realtime_data_for_zones(results, zones)
+
+def set_realtime_data_for_zones(results, zones: list[Zone]):
+    result_index = 0
+    for zone_index, zone in enumerate(zones):
+        if zone.stop != None:
+            zones[zone_index] = set_realtime_data(results[result_index], zone)
+            result_index += 1
+    return zones
+
+# The realtime data of stops for zones that are dicts, e.g. built from trusted rows or a cached body.
+def look_up_realtime_data_for_dicts(zones: list[dict]):
+    stop_zones = [zone for zone in zones if zone["stop"] != None]
+    if len(stop_zones) == 0:
+        return zones
+    with redis_helper.get_resource() as r:
+        pipe = r.pipeline(transaction=False)
+        for zone in stop_zones:
+            pipe.get("stop:" + str(zone["stop"]["stop_id"]))
+        results = pipe.execute()
+    return set_realtime_data_for_dicts(results, stop_zones, zones)
+
+async def look_up_realtime_data_for_dicts_async(zones: list[dict]):
+    stop_zones = [zone for zone in zones if zone["stop"] != None]
+    if len(stop_zones) == 0:
+        return zones
+    async with redis_helper.get_async_resource() as r:
+        pipe = r.pipeline(transaction=False)
+        for zone in stop_zones:
+            pipe.get("stop:" + str(zone["stop"]["stop_id"]))
+        results = await pipe.execute()
+    return set_realtime_data_for_dicts(results, stop_zones, zones)
+
+# The realtime data of stops as JSON, in the order of stop_ids and null for stops without realtime data.
+async def look_up_realtime_data_json_async(stop_ids: list[str]):
+    if len(stop_ids) == 0:
+        return []
+    async with redis_helper.get_async_resource() as r:
+        pipe = r.pipeline(transaction=False)
+        for stop_id in stop_ids:
+            pipe.get("stop:" + stop_id)
+        results = await pipe.execute()
+    return [b"null" if result == None else to_json(convert_realtime_data(result)) for result in results]
 
-        result_index = 0
-        for zone_index, zone in enumerate(zones):
-            if zone.stop != None:
-                zones[zone_index] = set_realtime_data(results[result_index], zone)
-                result_index += 1
+def set_realtime_data_for_dicts(results, stop_zones: list[dict], zones: list[dict]):
+    for zone, result in zip(stop_zones, results):
+        if result != None:
+            zone["stop"]["realtime_data"] = convert_realtime_data(result).model_dump(mode="json")
     return zones
 
 def check_if_user_has_access_to_zone_based_on_municipality(municipality, acl):
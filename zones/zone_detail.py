@@ -0,0 +1,46 @@
+from fastapi import HTTPException
+
+# The levels of detail of zones.area, the simplified areas are stored by the trigger of
+# migrations/003_zone_area_detail.sql. Per level the tolerance of the simplification in degrees and the
+# number of decimals of the coordinates in the GeoJSON, more decimals than the tolerance only add bytes.
+levels = {
+    "low": (0.001, 4),
+    "medium": (0.0001, 5),
+    "high": (0.00001, 6),
+    # ST_AsGeoJSON writes 9 decimals by default.
+    "full": (0, 9),
+}
+default_level = "full"
+
+# The area at a level of detail, takes the level. Zones that backfill_zone_area_detail() didn't reach yet
+# have no levels, their full area is used.
+area_at_level = """
+    CASE %s::text
+        WHEN 'low' THEN COALESCE(zones.area_low, zones.area)
+        WHEN 'medium' THEN COALESCE(zones.area_medium, zones.area)
+        WHEN 'high' THEN COALESCE(zones.area_high, zones.area)
+        ELSE zones.area
+    END
+"""
+
+# GeoJSON geometry of the area at a level of detail, takes the level and the decimals.
+area_geojson = "ST_AsGeoJSON(" + area_at_level + ", %s::int)"
+
+
+def get_level(zoom=None, tolerance=None):
+    """The coarsest level that is simplified less than tolerance (in degrees), or than half a pixel at zoom."""
+    if zoom != None and tolerance != None:
+        raise HTTPException(status_code=400, detail="Specify either zoom or tolerance, not both.")
+    if zoom != None:
+        # The width of a pixel of a 256 pixel web mercator tile in degrees longitude.
+        tolerance = 360 / (256 * 2 ** zoom) / 2
+    if tolerance == None:
+        return default_level
+    for level, (level_tolerance, _) in sorted(levels.items(), key=lambda item: -item[1][0]):
+        if level_tolerance <= tolerance:
+            return level
+    return default_level
+
+
+def get_area_geojson_params(level):
+    return (level, levels[level][1])
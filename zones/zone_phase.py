@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+
+from starlette.concurrency import run_in_threadpool
+
+from db_helper import db_helper
+
+# The phase is derived by the zone_phase() function of migrations/001_zone_phase.sql, geographies.phase
+# holds its value at the moment the row was written and geographies.phase_until the next transition.
+phase_column = """
+    zone_phase(published_date, effective_date, propose_retirement, published_retire_date, retire_date, NOW()) as phase
+"""
+
+# Rows with a phase_until in the future are filtered on the index on phase, only the rows that passed a
+# transition since they were written or refreshed have their phase evaluated. Takes the phases twice.
+phase_filter = """
+    (
+        (geographies.phase = ANY(%s) AND (geographies.phase_until IS NULL OR geographies.phase_until > NOW()))
+        OR
+        (geographies.phase_until <= NOW() AND zone_phase(published_date, effective_date, propose_retirement,
+            published_retire_date, retire_date, NOW()) = ANY(%s))
+    )
+"""
+
+# The first phase transition of a zone in a municipality (or in all municipalities), rows that passed a
+# transition but weren't refreshed yet have their next transition evaluated.
+next_transition_stmt = """
+    SELECT min(next_transition) as next_transition
+    FROM (
+        SELECT min(phase_until) as next_transition
+        FROM geographies
+        JOIN zones
+        USING (zone_id)
+        WHERE ((true = %s) or (zones.municipality = %s))
+        AND phase_until > NOW()
+        UNION ALL
+        SELECT min(zone_phase_until(published_date, effective_date, published_retire_date, retire_date, NOW()))
+        FROM geographies
+        JOIN zones
+        USING (zone_id)
+        WHERE ((true = %s) or (zones.municipality = %s))
+        AND phase_until <= NOW()
+    ) as transitions
+"""
+
+
+async def query_next_transition_async(cur, municipality):
+    await cur.execute(next_transition_stmt, (municipality == None, municipality, municipality == None, municipality))
+    return cur.fetchone()["next_transition"]
+
+
+def refresh_zone_phases():
+    # The trigger on geographies recomputes phase and phase_until of every updated row. Every worker runs
+    # the refresh, the transaction level advisory lock lets one worker at a time update the rows, the
+    # others skip it. A worker that comes later finds no rows that passed a transition.
+    stmt = """
+        UPDATE geographies
+        SET phase = NULL
+        WHERE phase_until <= NOW()
+    """
+    with db_helper.get_resource() as (cur, conn):
+        try:
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s) as locked", (refresh_lock_id,))
+            if not cur.fetchone()["locked"]:
+                conn.rollback()
+                return 0
+            cur.execute(stmt)
+            conn.commit()
+            return cur.rowcount
+        except Exception as e:
+            conn.rollback()
+            print(e)
+            raise
+
+
+async def refresh_zone_phases_periodically(interval):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            refreshed = await run_in_threadpool(refresh_zone_phases)
+            if refreshed:
+                logging.info(f"Refreshed the phase of {refreshed} zones")
+        except Exception:
+            logging.exception("Refreshing the zone phases failed")
+
+
+# Key of the advisory lock of refresh_zone_phases, any number that no other advisory lock uses.
+refresh_lock_id = 7218340501
+
+refresh_interval = float(os.getenv("ZONE_PHASE_REFRESH_INTERVAL", 300))
@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from db_helper import db_helper, prepared_statements
+from zones.public_zones_cache import public_zones_cache
+from zones.zone_detail import area_at_level, get_level
+from zones.zone_phase import phase_column, phase_filter, query_next_transition_async
+import zones.zone as zone_mod
+
+# Zones and stops of a web mercator tile as a Mapbox Vector Tile, with a "zones" and a "stops" layer. The
+# stops don't have realtime data, tiles are cached and the realtime data of a stop changes all the time.
+query_zone_tile_stmt = prepared_statements.register("query_zone_tile", """
+    WITH bounds AS (
+        SELECT ST_TileEnvelope(%s, %s, %s) AS geom
+    ),
+    filtered_zones AS (
+        SELECT geographies.geography_id, geographies.name, geography_type, zones.municipality,
+        array_to_string(geographies.affected_modalities, ',') as affected_modalities,
+        """ + area_at_level + """ as area,
+        """ + phase_column + """
+        FROM geographies
+        JOIN zones
+        USING (zone_id)
+        WHERE
+        zones.area && (SELECT ST_Transform(geom, 4326) FROM bounds)
+        AND
+        ((true = %s) or (zones.municipality = %s))
+        AND
+        ((true = %s) or (geography_type = ANY(%s)))
+        AND
+        (geographies.affected_modalities && %s)
+        AND
+        """ + phase_filter + """
+    ),
+    zones_layer AS (
+        SELECT ST_AsMVTGeom(ST_Transform(area, 3857), (SELECT geom FROM bounds)) as geom,
+        geography_id::text, name, geography_type, municipality, affected_modalities, phase
+        FROM filtered_zones
+    ),
+    stops_layer AS (
+        SELECT ST_AsMVTGeom(ST_Transform(stops.location, 3857), (SELECT geom FROM bounds)) as geom,
+        stops.stop_id::text, filtered_zones.geography_id::text, filtered_zones.name,
+        stops.status::text, stops.capacity::text, stops.is_virtual
+        FROM filtered_zones
+        JOIN stops
+        USING (geography_id)
+        WHERE stops.location && (SELECT ST_Transform(geom, 4326) FROM bounds)
+    )
+    SELECT
+        COALESCE((SELECT ST_AsMVT(zones_layer, 'zones', 4096, 'geom') FROM zones_layer), ''::bytea) ||
+        COALESCE((SELECT ST_AsMVT(stops_layer, 'stops', 4096, 'geom') FROM stops_layer), ''::bytea) as tile
+""")
+
+
+async def get_zone_tile(z: int, x: int, y: int, municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list):
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=400, detail=f"Tile {z}/{x}/{y} doesn't exist.")
+    if public_zones_cache.ttl <= 0:
+        tile, _ = await build_zone_tile(z, x, y, municipality, geography_types, phases, affected_modalities)
+    else:
+        key = public_zones_cache.get_key(municipality, geography_types, phases, affected_modalities, f"tile:{z}/{x}/{y}")
+        tile = await public_zones_cache.get_or_build(municipality, key, lambda: build_zone_tile(z, x, y, municipality, geography_types, phases, affected_modalities))
+    return Response(content=tile, media_type="application/vnd.mapbox-vector-tile")
+
+async def build_zone_tile(z: int, x: int, y: int, municipality, geography_types, phases: list[zone_mod.Phase], affected_modalities: list):
+    # The tile and the seconds until a zone of the municipality changes phase, like build_public_zones
+    # built from the primary. The generation of the key is raised right after the commit, a replica that
+    # lags would store the tile as it was before the change under the new generation until it expires.
+    async with db_helper.get_async_resource() as (cur, conn):
+        try:
+            await query_zone_tile_stmt.execute_async(cur, (z, x, y, get_level(zoom=z), municipality == None, municipality,
+                len(geography_types) == 0, geography_types, affected_modalities, phases, phases))
+            tile = bytes(cur.fetchone()["tile"])
+            next_transition = await query_next_transition_async(cur, municipality)
+        except HTTPException as e:
+            raise e
+        except Exception as e:
+            print(e)
+            raise HTTPException(status_code=500, detail="DB problem, check server log for details.")
+    expires_in = None
+    if next_transition is not None:
+        expires_in = (next_transition - datetime.now(timezone.utc)).total_seconds()
+    return tile, expires_in